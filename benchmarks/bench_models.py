@@ -0,0 +1,116 @@
+"""Measure model memory use and codec throughput.
+
+Run with ``python -m benchmarks.bench_models --tasks 100000``. The slotted
+``Task`` with compiled codecs is compared with an equivalent plain dataclass
+using hand-written ``to_dict``/``from_dict``, as the models were before.
+"""
+import argparse
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Optional
+
+from ia_manager.models.task import Task
+
+from .datagen import generate_projects
+
+
+@dataclass
+class PlainTask:
+    id: int
+    name: str
+    estimated: Optional[int] = None
+    deadline: Optional[str] = None
+    importance: int = 3
+    status: str = "todo"
+    description: str = ""
+    started: Optional[str] = None
+    time_spent: int = 0
+    planned_start: Optional[str] = None
+    planned_end: Optional[str] = None
+    planned_hours: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "estimated": self.estimated,
+            "deadline": self.deadline,
+            "importance": self.importance,
+            "status": self.status,
+            "description": self.description,
+            "started": self.started,
+            "time_spent": self.time_spent,
+            "planned_start": self.planned_start,
+            "planned_end": self.planned_end,
+            "planned_hours": self.planned_hours,
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "PlainTask":
+        return PlainTask(
+            id=data["id"],
+            name=data["name"],
+            estimated=data.get("estimated"),
+            deadline=data.get("deadline"),
+            importance=data.get("importance", 3),
+            status=data.get("status", "todo"),
+            description=data.get("description", ""),
+            started=data.get("started"),
+            time_spent=data.get("time_spent", 0),
+            planned_start=data.get("planned_start"),
+            planned_end=data.get("planned_end"),
+            planned_hours=data.get("planned_hours"),
+        )
+
+
+def _memory(cls, dicts) -> int:
+    """Bytes allocated by the objects alone; the field values are shared with ``dicts``."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [cls.from_dict(d) for d in dicts]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del objects
+    return size
+
+
+def _rate(fn, items, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return len(items) / best
+
+
+def run(n_tasks: int, repeat: int = 3) -> list:
+    projects = generate_projects(max(1, n_tasks // 50), 50)
+    dicts = [t.to_dict() for p in projects for t in p.tasks][:n_tasks]
+    results = []
+    for label, cls in (("slots + compiled codec", Task), ("plain dataclass", PlainTask)):
+        objects = [cls.from_dict(d) for d in dicts]
+        results.append({
+            "model": label,
+            "bytes_per_100k": _memory(cls, dicts) * 100_000 // len(dicts),
+            "from_dict_per_s": _rate(cls.from_dict, dicts, repeat),
+            "to_dict_per_s": _rate(cls.to_dict, objects, repeat),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    for r in run(args.tasks, args.repeat):
+        print(
+            f"{r['model']:<24} {r['bytes_per_100k'] / 1e6:7.2f} MB/100k tasks  "
+            f"from_dict {r['from_dict_per_s'] / 1e6:5.2f} M/s  to_dict {r['to_dict_per_s'] / 1e6:5.2f} M/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Compare the BM25 inverted index with the token-overlap scan it replaced.
+
+Run with ``python -m benchmarks.bench_search --notes 100000 --history 20000``.
+Both search the same generated notes and messages held in memory; the index
+is also timed for a full build, one incremental append and a reload of its
+snapshot. With NumPy the n-gram vector index used for semantic recall is
+timed as well, and the trigram index behind the ``search_notes`` command is
+compared with the substring scan it replaced.
+"""
+import argparse
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from ia_manager.models.note import Note
+from ia_manager.services import vector_index
+from ia_manager.services.note_index import NoteIndex
+from ia_manager.services.search_index import BM25Index, MemoryIndex
+
+from .bench_suite import QUERIES
+from .datagen import generate_history, generate_notes
+
+
+def _score(text: str, tokens: list) -> float:
+    words = set(re.findall(r"\w+", text.lower()))
+    if not words:
+        return 0.0
+    matched = sum(1 for t in tokens if t in words)
+    return matched / len(tokens) if tokens else 0.0
+
+
+def scan(texts: list, query: str, limit: int = 3) -> list:
+    """The search as it was: tokenize and score every text on each query."""
+    tokens = re.findall(r"\w+", query.lower())
+    scored = []
+    for i, text in enumerate(texts):
+        score = _score(text, tokens)
+        if score:
+            scored.append((score, i))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return scored[:limit]
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def substring_scan(notes: list, query: str) -> list:
+    """The ``search_notes`` command as it was."""
+    q = query.lower()
+    return [n for n in notes if q in n.text.lower() or any(q in t.lower() for t in n.tags)]
+
+
+def run(n_notes: int, n_history: int, repeat: int = 3, seed: int = 0) -> list:
+    note_dicts = generate_notes(n_notes, 100, seed)
+    notes = [n["text"] + " " + " ".join(n["tags"]) for n in note_dicts]
+    history = [h["text"] for h in generate_history(n_history, seed)]
+    rows = []
+    for name, texts in (("notes", notes), ("history", history)):
+        index = BM25Index()
+
+        def build():
+            index.__init__()
+            for i, text in enumerate(texts):
+                index.add(i, text)
+
+        rows.append((f"{name}: build index ({len(texts)} docs)", _best(build, 1)))
+        rows.append((f"{name}: append one", _best(lambda: index.add(len(index), "late storage review"), repeat)))
+        for query in QUERIES:
+            rows.append((f"{name}: scan {query!r}", _best(lambda: scan(texts, query), repeat)))
+            rows.append((f"{name}: bm25 {query!r}", _best(lambda: index.search(query, 3), repeat)))
+        if vector_index.available():
+            vectors = vector_index.VectorIndex()
+            rows.append((f"{name}: build vectors", _best(lambda: vectors.rebuild(dict(enumerate(texts))), 1)))
+            for query in QUERIES:
+                rows.append((f"{name}: vectors {query!r}", _best(lambda: vectors.search(query, 3), repeat)))
+
+    note_objects = [Note.from_dict(n) for n in note_dicts]
+    trigrams = NoteIndex()
+    rows.append(("notes: build trigram index", _best(lambda: trigrams.sync(note_objects), 1)))
+    queries = (("storag", "substring"), ("budget deploy test", "substring"), ("release dra", "prefix"), ("storgae", "fuzzy"))
+    for query, mode in queries:
+        rows.append((f"notes: substring scan {query!r}", _best(lambda: substring_scan(note_objects, query), repeat)))
+        rows.append((f"notes: trigram {mode} {query!r}", _best(lambda: trigrams.search(query, mode), repeat)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stored = MemoryIndex(Path(tmp) / "search_index.json")
+        stored.rebuild(["bench"], dict(enumerate(notes)), dict(enumerate(history)))
+
+        def reload():
+            fresh = MemoryIndex(stored.path)
+            fresh.current(["bench"])
+
+        rows.append(("load snapshot", _best(reload, repeat)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--history", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for name, seconds in run(args.notes, args.history, args.repeat, args.seed):
+        print(f"{name:<48} {seconds * 1000:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
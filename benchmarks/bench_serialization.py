@@ -0,0 +1,61 @@
+"""Compare load/save time and size of the storage formats.
+
+Run with ``python -m benchmarks.bench_serialization --projects 1000 --tasks 50``.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from ia_manager.services import serialization
+from ia_manager.services.storage import ProjectRepository
+
+from .datagen import generate_projects
+
+
+def _bench_format(projects, fmt: str, directory: Path, repeat: int) -> dict:
+    repo = ProjectRepository(directory / f"projects-{fmt}.json", binary_path=directory / f"projects-{fmt}.bin")
+    repo.configure({"format": fmt})
+    save = load = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        repo.save(projects)
+        save = min(save, time.perf_counter() - start)
+        start = time.perf_counter()
+        repo.invalidate()
+        repo.view()
+        load = min(load, time.perf_counter() - start)
+    return {"format": fmt, "save_s": save, "load_s": load, "bytes": repo.path.stat().st_size}
+
+
+def run(n_projects: int, tasks_per_project: int, repeat: int = 3) -> list:
+    projects = generate_projects(n_projects, tasks_per_project)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        for fmt in serialization.FORMATS:
+            results.append(_bench_format(projects, fmt, directory, repeat))
+        if serialization.orjson is not None:
+            fast = serialization.orjson
+            serialization.orjson = None
+            try:
+                res = _bench_format(projects, "compact", directory, repeat)
+            finally:
+                serialization.orjson = fast
+            res["format"] = "compact (stdlib)"
+            results.append(res)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--projects", type=int, default=1000)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    for r in run(args.projects, args.tasks, args.repeat):
+        print(f"{r['format']:<18} save {r['save_s'] * 1000:8.1f} ms  load {r['load_s'] * 1000:8.1f} ms  {r['bytes'] / 1e6:8.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
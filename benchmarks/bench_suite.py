@@ -0,0 +1,194 @@
+"""Time storage, planner, memory search and web endpoints on generated data.
+
+Run with ``python -m benchmarks.bench_suite --output report.json``. The
+defaults build 10k projects, 500k tasks and 100k notes in a temporary data
+directory; use ``--projects``/``--tasks``/``--notes`` for a quicker run and
+``--compare old.json`` to print the ratio against an earlier report.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+from .datagen import generate_history, generate_notes, generate_projects
+
+QUERIES = ("review storage bug", "client meeting budget", "deploy release docs")
+CALENDAR_DAY = date(2025, 6, 2)
+
+
+def _time(fn, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return {"min_s": min(runs), "median_s": statistics.median(runs), "runs": len(runs)}
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+        )
+    except OSError:
+        return ""
+    return out.stdout.strip()
+
+
+def _storage_config(args) -> dict:
+    config = {"backend": args.backend, "format": args.format}
+    if args.layout != "single":
+        config["layout"] = args.layout
+    if args.journal:
+        config["journal"] = True
+    if args.lazy:
+        config["lazy"] = True
+    return config
+
+
+def run(args) -> dict:
+    """Build the data set in a temporary directory and time each operation."""
+    with tempfile.TemporaryDirectory() as tmp:
+        # the data directory is fixed when the storage module is imported
+        os.environ["IA_MANAGER_DATA"] = tmp
+        from ia_manager.models.note import Note
+        from ia_manager.services import memory, planner, recommendations, storage
+        from ia_manager.web.server import app
+        if storage.DATA_DIR != Path(tmp):
+            raise RuntimeError("ia_manager was imported before the benchmark set IA_MANAGER_DATA")
+
+        storage.save_config({"availability": {}, "storage": _storage_config(args)})
+        results = {}
+
+        tasks_per_project = max(1, args.tasks // args.projects)
+        projects = generate_projects(args.projects, tasks_per_project, seed=args.seed)
+        results["storage.save_projects (initial)"] = _time(lambda: storage.save_projects(projects), 1)
+        del projects
+
+        repo = storage.get_repository()
+
+        def load_cold():
+            repo.invalidate()
+            storage.load_projects()
+
+        results["storage.load_projects (cold)"] = _time(load_cold, args.repeat)
+        results["storage.load_projects (cached)"] = _time(storage.load_projects, args.repeat)
+
+        def save_one_change():
+            projects = storage.load_projects()
+            project = projects.edit(projects[len(projects) // 2])
+            task = project.tasks[0]
+            project.update_task(task, time_spent=task.time_spent + 1)
+            storage.save_projects(projects)
+
+        results["storage.save_projects (one task changed)"] = _time(save_one_change, args.repeat)
+
+        view = storage.view_projects()
+        results["planner.suggest_tasks"] = _time(lambda: planner.suggest_tasks(view), args.repeat)
+        results["planner.suggest_tasks (k=5)"] = _time(lambda: planner.suggest_tasks(view, k=5), args.repeat)
+        results["recommendations.recommend(5) (build)"] = _time(lambda: recommendations.recommend(5), 1)
+        results["recommendations.recommend(5) (cached)"] = _time(lambda: recommendations.recommend(5), args.repeat)
+
+        def recommend_after_change():
+            save_one_change()
+            recommendations.recommend(5)
+
+        results["recommendations.recommend(5) (one task changed)"] = _time(recommend_after_change, args.repeat)
+        results["planner.schedule (4 weeks)"] = _time(
+            lambda: planner.schedule(view, date.today(), 28, None, datetime.now()), args.repeat
+        )
+
+        memory.save_notes([Note.from_dict(n) for n in generate_notes(args.notes, args.projects, args.seed)])
+        memory.save_history(generate_history(args.history, args.seed))
+        for query in QUERIES:
+            results[f"memory.search_notes {query!r}"] = _time(lambda: memory.search_notes(query), args.repeat)
+            results[f"memory.search_history {query!r}"] = _time(lambda: memory.search_history(query), args.repeat)
+            results[f"memory.get_context {query!r}"] = _time(
+                lambda: memory.get_context(query, max_chars=500, include_internal=True), args.repeat
+            )
+
+        results["memory.append_history"] = _time(lambda: memory.append_history("user", "bench message"), args.repeat)
+
+        client = app.test_client()
+        for url in (
+            f"/api/calendar/{CALENDAR_DAY.isoformat()}",
+            f"/api/calendar/week?start={CALENDAR_DAY.isoformat()}",
+            "/api/deadlines",
+        ):
+            def get(url=url):
+                response = client.get(url)
+                if response.status_code != 200:
+                    raise RuntimeError(f"GET {url} returned {response.status_code}")
+            results[f"GET {url}"] = _time(get, args.repeat)
+
+        repo.invalidate()
+        os.environ.pop("IA_MANAGER_DATA", None)
+
+    return {
+        "commit": _git_commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "projects": args.projects,
+            "tasks": args.tasks,
+            "notes": args.notes,
+            "history": args.history,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "storage": _storage_config(args),
+        },
+        "results": results,
+    }
+
+
+def _print(report: dict, baseline: dict = None):
+    old = (baseline or {}).get("results", {})
+    for name, res in report["results"].items():
+        line = f"{name:<58} {res['median_s'] * 1000:10.1f} ms"
+        if name in old and old[name]["median_s"]:
+            line += f"  x{res['median_s'] / old[name]['median_s']:.2f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--projects", type=int, default=10_000)
+    parser.add_argument("--tasks", type=int, default=500_000)
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--history", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--layout", choices=["single", "sharded"], default="single")
+    parser.add_argument("--format", choices=["pretty", "compact", "binary"], default="pretty")
+    parser.add_argument("--journal", action="store_true")
+    parser.add_argument("--lazy", action="store_true")
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+
+    report = run(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    _print(report, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import random
+from datetime import datetime, timedelta
+from typing import List
+
+from ia_manager.models.project import Project
+from ia_manager.models.task import Task
+
+WORDS = (
+    "review design api storage planner note sync bug fix release draft client "
+    "meeting report budget deploy test refactor docs ui schedule backup"
+).split()
+STATUSES = ("todo", "todo", "todo", "planned", "in_progress", "done")
+
+
+def _words(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def generate_projects(n_projects: int, tasks_per_project: int, seed: int = 0) -> List[Project]:
+    """Return reproducible projects with globally unique task ids."""
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    projects = []
+    task_id = 0
+    for pid in range(1, n_projects + 1):
+        tasks = []
+        for _ in range(tasks_per_project):
+            task_id += 1
+            deadline = base + timedelta(days=rng.randrange(365))
+            planned = None
+            if rng.random() < 0.3:
+                planned = (deadline - timedelta(days=rng.randrange(10), hours=-rng.randrange(9, 17))).isoformat()
+            tasks.append(Task(
+                id=task_id,
+                name=_words(rng, 3),
+                estimated=rng.randrange(1, 9),
+                deadline=deadline.date().isoformat(),
+                importance=rng.randrange(1, 6),
+                status=rng.choice(STATUSES),
+                description=_words(rng, 12),
+                time_spent=rng.randrange(0, 36000),
+                planned_start=planned,
+            ))
+        projects.append(Project(
+            id=pid,
+            name=f"Project {pid} {_words(rng, 2)}",
+            description=_words(rng, 10),
+            priority=rng.randrange(1, 6),
+            deadline=(base + timedelta(days=rng.randrange(365))).date().isoformat(),
+            tasks=tasks,
+        ))
+    return projects
+
+
+def generate_notes(n_notes: int, n_projects: int = 0, seed: int = 0) -> List[dict]:
+    """Return reproducible note dicts as stored in memory.json."""
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    notes = []
+    for nid in range(1, n_notes + 1):
+        notes.append({
+            "id": nid,
+            "text": _words(rng, rng.randrange(5, 30)),
+            "tags": rng.sample(WORDS, rng.randrange(0, 3)),
+            "project_id": rng.randrange(1, n_projects + 1) if n_projects and rng.random() < 0.5 else None,
+            "internal": rng.random() < 0.1,
+            "created": (base + timedelta(minutes=nid)).isoformat(),
+        })
+    return notes
+
+
+def generate_history(n_messages: int, seed: int = 0) -> List[dict]:
+    """Return reproducible conversation history entries."""
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    return [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "text": _words(rng, rng.randrange(3, 40)),
+            "ts": (base + timedelta(seconds=30 * i)).isoformat(),
+        }
+        for i in range(n_messages)
+    ]
@@ -8,7 +8,7 @@ import io
 import sys
 
 from .cli import commands
-from .services import memory, logger
+from .services import memory, logger, storage
 
 SYSTEM_PROMPT = (
     "Vous êtes \u00ab IA Manager \u00bb, un assistant destiné \u00e0 organiser mes projets et mes tâches.\n"
@@ -176,7 +176,12 @@ def _execute(func_name: str, params: dict) -> str:
 def send_message(message: str) -> str:
     _ensure_client()
     user = memory.load_user()
-    context = memory.get_context(message, max_chars=user.context_chars, include_internal=True)
+    context = memory.get_context(
+        message,
+        max_chars=user.context_chars,
+        include_internal=True,
+        semantic_weight=user.semantic_weight,
+    )
     if context:
         print(f"[CONTEXT] {context}")
         logger.log(f"context: {context}")
@@ -224,15 +229,17 @@ def send_message(message: str) -> str:
             calls = action.submit_tool_outputs.tool_calls
 
             outputs = []
-            for call in calls:
-                name = call.function.name
-                try:
-                    args = json.loads(call.function.arguments)
-                except json.JSONDecodeError:
-                    args = {}
-                print(f"[DEBUG] Appel de la fonction: {name} avec args: {args}")
-                result = _execute(name, args)
-                outputs.append({"tool_call_id": call.id, "output": result})
+            # one load and one save of the projects for the whole batch
+            with logger.buffered(), storage.session():
+                for call in calls:
+                    name = call.function.name
+                    try:
+                        args = json.loads(call.function.arguments)
+                    except json.JSONDecodeError:
+                        args = {}
+                    print(f"[DEBUG] Appel de la fonction: {name} avec args: {args}")
+                    result = _execute(name, args)
+                    outputs.append({"tool_call_id": call.id, "output": result})
             try:
                 print("[DEBUG] Envoi des résultats des outils à l'assistant...")
                 _client.beta.threads.runs.submit_tool_outputs(
@@ -288,7 +295,12 @@ def send_message_events(message: str):
     """Yield events while processing the message."""
     _ensure_client()
     user = memory.load_user()
-    context = memory.get_context(message, max_chars=user.context_chars, include_internal=True)
+    context = memory.get_context(
+        message,
+        max_chars=user.context_chars,
+        include_internal=True,
+        semantic_weight=user.semantic_weight,
+    )
     if context:
         print(f"[CONTEXT] {context}")
         logger.log(f"context: {context}")
@@ -337,16 +349,21 @@ def send_message_events(message: str):
                 return
             calls = action.submit_tool_outputs.tool_calls
             outputs = []
-            for call in calls:
-                name = call.function.name
-                try:
-                    args = json.loads(call.function.arguments)
-                except json.JSONDecodeError:
-                    args = {}
-                print(f"[DEBUG] Appel de la fonction: {name} avec args: {args}")
-                yield {"action": f"En train de {name.replace('_', ' ')}..."}
-                result = _execute(name, args)
-                outputs.append({"tool_call_id": call.id, "output": result})
+            events = []
+            # the events are sent once the session has saved: yielding inside it
+            # would hold the storage lock while the client reads the stream
+            with logger.buffered(), storage.session():
+                for call in calls:
+                    name = call.function.name
+                    try:
+                        args = json.loads(call.function.arguments)
+                    except json.JSONDecodeError:
+                        args = {}
+                    print(f"[DEBUG] Appel de la fonction: {name} avec args: {args}")
+                    events.append({"action": f"En train de {name.replace('_', ' ')}..."})
+                    result = _execute(name, args)
+                    outputs.append({"tool_call_id": call.id, "output": result})
+            yield from events
             try:
                 print("[DEBUG] Envoi des résultats des outils à l'assistant...")
                 _client.beta.threads.runs.submit_tool_outputs(
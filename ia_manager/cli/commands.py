@@ -1,130 +1,125 @@
 import argparse
-from typing import List, Optional
+import json
+import shlex
+import sys
+from typing import Optional
 from ..models.project import Project
 from ..models.task import Task
-from ..services import storage, logger, planner, memory
+from ..services import storage, logger, planner, memory, note_index, recommendations, scenarios
 from ..models.note import Note
 from ..models.user import User
 from ..utils import color, Fore
 import calendar
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 
 
-def _find_project(projects: List[Project], ident) -> Optional[Project]:
+def _find_project(projects: storage.ProjectList, ident) -> Optional[Project]:
     """Return project by id or name"""
-    for p in projects:
-        if p.id == ident or p.name == ident:
-            return p
-    return None
+    return projects.find_project(ident)
 
 
 def add_project(args):
-    projects = storage.load_projects()
-    project_id = max([p.id for p in projects], default=0) + 1
-    project = Project(
-        id=project_id,
-        name=args.name,
-        description=args.description,
-        priority=args.priority,
-        deadline=args.deadline,
-    )
-    projects.append(project)
-    storage.save_projects(projects)
+    with storage.transaction() as projects:
+        project_id = projects.next_project_id()
+        project = Project(
+            id=project_id,
+            name=args.name,
+            description=args.description,
+            priority=args.priority,
+            deadline=args.deadline,
+        )
+        projects.add_project(project)
     logger.log(f"Added project {project.name}")
     print(f"Project '{project.name}' added with id {project.id}")
 
 
 def list_projects(_args):
-    projects = storage.load_projects()
+    projects = storage.view_projects()
     for p in projects:
         status_text = color(f"[{p.status}]", Fore.GREEN if p.status == "termine" else Fore.YELLOW if p.status == "en pause" else Fore.CYAN)
-        bar = "█" * (p.progress() // 10)
-        print(f"{p.id}: {p.name} {status_text} priority:{p.priority} {bar:<10} {p.progress()}%")
+        progress = p.progress()
+        bar = "█" * (progress // 10)
+        print(f"{p.id}: {p.name} {status_text} priority:{p.priority} {bar:<10} {progress}%")
 
 
 def update_project(args):
-    projects = storage.load_projects()
-    project = _find_project(projects, args.id)
-    if not project:
-        print("Project not found")
-        return
-    if args.description is not None:
-        project.description = args.description
-    if args.deadline is not None:
-        project.deadline = args.deadline
-    if args.priority is not None:
-        project.priority = args.priority
-    storage.save_projects(projects)
+    with storage.transaction() as projects:
+        project = _find_project(projects, args.id)
+        if not project:
+            print("Project not found")
+            return
+        if args.description is not None:
+            project.description = args.description
+        if args.deadline is not None:
+            project.deadline = args.deadline
+        if args.priority is not None:
+            project.priority = args.priority
     logger.log(f"Updated project {project.name}")
     print("Project updated")
 
 
 def delete_project(args):
-    projects = storage.load_projects()
-    proj = _find_project(projects, args.project)
-    if not proj:
-        print("Project not found")
-        return
-    projects = [p for p in projects if p.id != proj.id]
-    storage.save_projects(projects)
+    with storage.transaction() as projects:
+        proj = _find_project(projects, args.project)
+        if not proj:
+            print("Project not found")
+            return
+        projects.remove_project(proj)
     logger.log(f"Deleted project {proj.id}")
     print("Project deleted")
 
 
 def rename_project(args):
-    projects = storage.load_projects()
-    proj = _find_project(projects, args.project)
-    if not proj:
-        print("Project not found")
-        return
-    proj.name = args.new_name
-    storage.save_projects(projects)
+    with storage.transaction() as projects:
+        proj = _find_project(projects, args.project)
+        if not proj:
+            print("Project not found")
+            return
+        projects.rename_project(proj, args.new_name)
     logger.log(f"Renamed project {proj.id} to {proj.name}")
     print("Project renamed")
 
 
 def archive_project(args):
-    projects = storage.load_projects()
-    proj = _find_project(projects, args.project)
-    if not proj:
-        print("Project not found")
-        return
-    proj.status = "archive"
-    storage.save_projects(projects)
+    with storage.transaction() as projects:
+        proj = _find_project(projects, args.project)
+        if not proj:
+            print("Project not found")
+            return
+        proj.status = "archive"
     logger.log(f"Archived project {proj.id}")
     print("Project archived")
 
 
 def add_task(args):
-    projects = storage.load_projects()
-    project = _find_project(projects, args.project)
-    if not project:
-        print("Project not found")
-        return
-    task_id = max([t.id for t in project.tasks], default=0) + 1
-    due_iso = None
-    if args.due:
-        try:
-            due_iso = datetime.strptime(args.due, "%d/%m").replace(year=date.today().year).date().isoformat()
-        except ValueError:
-            print("Invalid due date format. Use JJ/MM")
+    with storage.transaction() as projects:
+        project = _find_project(projects, args.project)
+        if not project:
+            print("Project not found")
             return
-    task = Task(
-        id=task_id,
-        name=args.name,
-        estimated=args.estimated,
-        deadline=due_iso,
-        importance=args.importance,
-        description=args.description or "",
-    )
-    project.tasks.append(task)
-    storage.save_projects(projects)
+        task_id = projects.next_task_id()
+        due_iso = None
+        if args.due:
+            try:
+                due_iso = datetime.strptime(args.due, "%d/%m").replace(year=date.today().year).date().isoformat()
+            except ValueError:
+                print("Invalid due date format. Use JJ/MM")
+                return
+        task = Task(
+            id=task_id,
+            name=args.name,
+            estimated=args.estimated,
+            deadline=due_iso,
+            importance=args.importance,
+            description=args.description or "",
+        )
+        projects.add_task(project, task)
     logger.log(f"Added task {task.name} to project {project.name}")
     print(f"Task '{task.name}' added with id {task.id}")
 
 
 def list_tasks(args):
-    projects = storage.load_projects()
+    projects = storage.view_projects()
     project = _find_project(projects, args.project)
     if not project:
         print("Project not found")
@@ -145,115 +140,165 @@ def list_tasks(args):
 
 
 def update_task(args):
-    projects = storage.load_projects()
-    project = None
-    task = None
-    for p in projects:
-        for t in p.tasks:
-            if t.id == args.task_id:
-                project = p
-                task = t
-                break
-        if task:
-            break
-    if not task:
-        print("Task not found")
-        return
-    if args.status:
-        task.status = args.status
-    if args.title:
-        task.name = args.title
-    if args.estimated is not None:
-        task.estimated = args.estimated
+    due_iso = None
     if args.due is not None:
         try:
-            task.deadline = datetime.strptime(args.due, "%d/%m").replace(year=date.today().year).date().isoformat()
+            due_iso = datetime.strptime(args.due, "%d/%m").replace(year=date.today().year).date().isoformat()
         except ValueError:
             print("Invalid due date format")
             return
-    if args.importance is not None:
-        task.importance = args.importance
-    if args.desc is not None:
-        task.description = args.desc
-    if args.planned_start is not None:
-        task.planned_start = args.planned_start
-    if args.planned_end is not None:
-        task.planned_end = args.planned_end
-    if args.planned_hours is not None:
-        task.planned_hours = args.planned_hours
-    storage.save_projects(projects)
+    with storage.transaction() as projects:
+        found = projects.find_task(args.task_id)
+        if not found:
+            print("Task not found")
+            return
+        project, task = found
+        counted = {}
+        if args.status:
+            counted["status"] = args.status
+        if args.estimated is not None:
+            counted["estimated"] = args.estimated
+        project.update_task(task, **counted)
+        if args.title:
+            task.name = args.title
+        if due_iso is not None:
+            task.deadline = due_iso
+        if args.importance is not None:
+            task.importance = args.importance
+        if args.desc is not None:
+            task.description = args.desc
+        if args.planned_start is not None:
+            task.planned_start = args.planned_start
+        if args.planned_end is not None:
+            task.planned_end = args.planned_end
+        if args.planned_hours is not None:
+            task.planned_hours = args.planned_hours
     logger.log(f"Updated task {task.id} in project {project.name}")
     print("Task updated")
 
 
 def delete_task(args):
-    projects = storage.load_projects()
-    for p in projects:
-        for t in list(p.tasks):
-            if t.id == args.task_id:
-                p.tasks.remove(t)
-                storage.save_projects(projects)
-                logger.log(f"Deleted task {args.task_id} from project {p.name}")
-                print("Task deleted")
-                return
-    print("Task not found")
+    with storage.transaction() as projects:
+        found = projects.remove_task(args.task_id)
+        if not found:
+            print("Task not found")
+            return
+    logger.log(f"Deleted task {args.task_id} from project {found[0].name}")
+    print("Task deleted")
 
 
 def mark_done(args):
-    projects = storage.load_projects()
-    for p in projects:
-        for t in p.tasks:
-            if t.id == args.task_id:
-                t.status = "done"
-                storage.save_projects(projects)
-                logger.log(f"Marked task {t.id} as done")
-                print("Task marked as done")
-                return
-    print("Task not found")
+    with storage.transaction() as projects:
+        found = projects.find_task(args.task_id)
+        if not found:
+            print("Task not found")
+            return
+        p, t = found
+        p.update_task(t, status="done")
+    logger.log(f"Marked task {t.id} as done")
+    print("Task marked as done")
 
 
 def schedule_task(args):
     """Plan start/end dates or duration for a task."""
-    projects = storage.load_projects()
-    for p in projects:
-        for t in p.tasks:
-            if t.id == args.task_id:
-                if args.start:
-                    t.planned_start = args.start
-                if args.end:
-                    t.planned_end = args.end
-                if args.hours is not None:
-                    t.planned_hours = args.hours
-                if args.start or args.end or args.hours is not None:
-                    t.status = 'planned'
-                storage.save_projects(projects)
-                logger.log(f"Scheduled task {t.id}")
-                print("Task scheduled")
-                return
-    print("Task not found")
+    with storage.transaction() as projects:
+        found = projects.find_task(args.task_id)
+        if not found:
+            print("Task not found")
+            return
+        p, t = found
+        if args.start:
+            t.planned_start = args.start
+        if args.end:
+            t.planned_end = args.end
+        if args.hours is not None:
+            t.planned_hours = args.hours
+        if args.start or args.end or args.hours is not None:
+            p.update_task(t, status='planned')
+        block = planner.planned_block(p, t)
+        # the index holds the schedule as it was before this change
+        conflicts = planner.schedule_index().conflicts(block) if block else []
+        warnings = [_conflict_warning(projects, b) for b in conflicts]
+    logger.log(f"Scheduled task {t.id}")
+    print("Task scheduled")
+    for warning in warnings:
+        print(color(warning, Fore.YELLOW))
+
+
+def _conflict_warning(projects: storage.ProjectList, b: planner.Block) -> str:
+    # read by iterating: a lookup would copy the project for writing
+    proj = next((p for p in projects if p.id == b.project_id), None)
+    task = next((t for t in proj.tasks if t.id == b.task_id), None) if proj else None
+    label = f"{proj.name}: {task.name}" if task else f"task {b.task_id}"
+    return f"Warning: overlaps {label} ({b.start:%Y-%m-%d %H:%M} -> {b.end:%H:%M})"
 
 
 def list_schedule(_args):
-    projects = storage.load_projects()
+    projects = storage.view_projects()
     entries = []
     for p in projects:
         for t in p.tasks:
             if t.planned_start:
-                entries.append((t.planned_start, p.name, t))
+                block = planner.planned_block(p, t)
+                # parsed starts sort by time, the others by their text as before
+                entries.append((block.start.isoformat() if block else t.planned_start, p.name, t, block))
     entries.sort(key=lambda x: x[0])
-    for start, pname, t in entries:
+    # the index only holds the pending tasks, so only those are checked for overlaps
+    index = planner.schedule_index()
+    for _key, pname, t, block in entries:
         end = f" -> {t.planned_end}" if t.planned_end else ""
         dur = f" ({t.planned_hours}h)" if t.planned_hours else ""
-        print(f"{start}{end} {pname}: {t.name}{dur}")
+        conflict = block is not None and t.status != "done" and index.conflicts(block)
+        mark = color(" (conflict)", Fore.YELLOW) if conflict else ""
+        print(f"{t.planned_start}{end} {pname}: {t.name}{dur}{mark}")
+
+
+def find_slot(args):
+    after = datetime.now()
+    if args.after:
+        try:
+            after = datetime.fromisoformat(args.after)
+        except ValueError:
+            print("Invalid date format")
+            return
+    start = planner.schedule_index().free_slot(after, args.hours)
+    end = start + timedelta(hours=args.hours)
+    print(f"Free from {start:%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M}")
 
 
 def show_status(_args):
-    projects = storage.load_projects()
+    # progress() reads the project's counters, no task is visited
+    projects = storage.view_projects()
     for p in projects:
         status_text = color(f"[{p.status}]", Fore.GREEN if p.status == "termine" else Fore.YELLOW if p.status == "en pause" else Fore.CYAN)
         print(f"{p.name} {status_text} {p.progress()}% done")
 
 
+def _plan(start: date, days: int, write: bool, shown: Optional[date] = None) -> planner.Schedule:
+    """Schedule ``days`` days from ``start``; with ``write`` store the blocks shown."""
+    now = datetime.now() if start <= date.today() else None
+    availability = storage.load_config().get("availability")
+    if not write:
+        return planner.schedule(storage.view_projects(), start, days, availability, now)
+    with storage.transaction() as projects:
+        plan = planner.schedule(projects, start, days, availability, now)
+        written = plan if shown is None else planner.Schedule(plan.on(shown), [], [])
+        planner.apply_schedule(projects, written)
+    logger.log(f"Planned {start} (+{days} days)")
+    return plan
+
+
+def _print_blocks(blocks: list, names: dict):
+    for b in blocks:
+        pname, tname = names.get((b.project_id, b.task_id), ("?", "?"))
+        mark = "" if b.fixed else " *"
+        print(f"  {b.start:%H:%M}-{b.end:%H:%M} {pname}: {tname}{mark}")
+
+
+def _task_names() -> dict:
+    return {(p.id, t.id): (p.name, t.name) for p in storage.view_projects() for t in p.tasks}
+
+
 def plan_day(args):
     target = date.today()
     if args.date:
@@ -262,14 +307,40 @@ def plan_day(args):
         except ValueError:
             print("Invalid date format")
             return
-    suggestions = planner.suggest_tasks(storage.load_projects())
+    # the days before the target take the most urgent tasks first
+    start = min(target, date.today())
+    plan = _plan(start, (target - start).days + 1, args.write, target)
     print(f"Plan for {target}:")
-    for s in suggestions[:5]:
-        print(f"- {s}")
+    blocks = plan.on(target)
+    if not blocks:
+        print("  Nothing planned")
+    _print_blocks(blocks, _task_names())
+
+
+def plan_week(args):
+    start = date.today()
+    if args.start:
+        try:
+            start = datetime.strptime(args.start, "%d/%m").replace(year=date.today().year).date()
+        except ValueError:
+            print("Invalid date format")
+            return
+    plan = _plan(start, args.days, args.write)
+    names = _task_names()
+    for offset in range(args.days):
+        day = start + timedelta(days=offset)
+        blocks = plan.on(day)
+        if blocks:
+            print(f"{day:%A} {day}:")
+            _print_blocks(blocks, names)
+    if plan.late:
+        print(color(f"{len(plan.late)} task(s) finish after their deadline", Fore.YELLOW))
+    if plan.unscheduled:
+        print(color(f"{len(plan.unscheduled)} task(s) do not fit in the period", Fore.YELLOW))
 
 
 def doc_update(args):
-    projects = storage.load_projects()
+    projects = storage.view_projects()
     proj = _find_project(projects, args.project)
     if not proj:
         print("Project not found")
@@ -311,27 +382,22 @@ def plan_self_update(_args):
     print("Self update planned")
 
 
-def recommend_task(_args):
-    projects = storage.load_projects()
-    suggestions = planner.suggest_tasks(projects)
+def recommend_task(args):
+    suggestions = recommendations.recommend(getattr(args, "limit", 5))
     print("Suggested tasks:")
     for s in suggestions:
         print(color(f"- {s}", Fore.MAGENTA))
 
 
 def show_calendar(_args):
-    projects = storage.load_projects()
+    projects = storage.view_projects()
     today = date.today()
     tasks_by_day = {}
     for proj in projects:
         for task in proj.tasks:
-            if task.deadline:
-                try:
-                    d = datetime.fromisoformat(task.deadline)
-                except ValueError:
-                    continue
-                if d.year == today.year and d.month == today.month:
-                    tasks_by_day.setdefault(d.day, []).append(f"{proj.name}: {task.name}")
+            d = task.deadline_at
+            if d and d.year == today.year and d.month == today.month:
+                tasks_by_day.setdefault(d.day, []).append(f"{proj.name}: {task.name}")
     cal = calendar.Calendar().monthdayscalendar(today.year, today.month)
     print(f"{calendar.month_name[today.month]} {today.year}")
     print("Mo Tu We Th Fr Sa Su")
@@ -361,39 +427,35 @@ def assistant_chat(_args):
 
 
 def add_note(args):
-    notes = memory.load_notes()
-    note_id = max([n.id for n in notes], default=0) + 1
     tags = [t.strip() for t in args.tags.split(',')] if args.tags else []
-    note = Note(id=note_id, text=args.text, tags=tags, project_id=args.project)
-    notes.append(note)
-    memory.save_notes(notes)
+    with storage.file_lock(storage.MEMORY_LOCK).locked():
+        notes = memory.load_notes()
+        note_id = max([n.id for n in notes], default=0) + 1
+        note = Note(id=note_id, text=args.text, tags=tags, project_id=args.project)
+        notes.append(note)
+        memory.save_notes(notes)
     print("Note added")
 
 
 def list_notes(args):
-    notes = memory.load_notes()
+    notes = memory.notes_with_tag(args.tag) if args.tag else memory.load_notes()
     for n in notes:
         if n.internal:
             continue
         if args.project and n.project_id != args.project:
             continue
-        if args.tag and args.tag not in n.tags:
-            continue
         tg = f" [{', '.join(n.tags)}]" if n.tags else ""
         proj = f" (proj {n.project_id})" if n.project_id else ""
         print(f"{n.id}: {n.text}{tg}{proj}")
 
 
 def search_notes(args):
-    notes = memory.load_notes()
-    q = args.query.lower()
-    for n in notes:
-        if n.internal:
-            continue
-        if q in n.text.lower() or any(q in t.lower() for t in n.tags):
-            tg = f" [{', '.join(n.tags)}]" if n.tags else ""
-            proj = f" (proj {n.project_id})" if n.project_id else ""
-            print(f"{n.id}: {n.text}{tg}{proj}")
+    hits = memory.find_notes(args.query, mode=args.mode, max_edits=args.max_edits)
+    for n, kind, edits in hits[:args.limit]:
+        tg = f" [{', '.join(n.tags)}]" if n.tags else ""
+        proj = f" (proj {n.project_id})" if n.project_id else ""
+        fuzzy = f" ~{edits}" if kind == note_index.FUZZY else ""
+        print(f"{n.id}: {n.text}{tg}{proj}{fuzzy}")
 
 
 def add_internal_note_cmd(args):
@@ -407,6 +469,8 @@ def set_personality(args):
         user.sarcasm = max(0.0, min(1.0, args.sarcasm))
     if args.context_chars is not None:
         user.context_chars = max(100, min(1000, args.context_chars))
+    if args.semantic_weight is not None:
+        user.semantic_weight = max(0.0, min(1.0, args.semantic_weight))
     memory.save_user(user)
     print("Personality updated")
 
@@ -414,7 +478,8 @@ def set_personality(args):
 def show_personality(_args):
     user = memory.load_user()
     print(
-        f"User: {user.name}, sarcasm: {user.sarcasm}, context chars: {user.context_chars}"
+        f"User: {user.name}, sarcasm: {user.sarcasm}, context chars: {user.context_chars}, "
+        f"semantic weight: {user.semantic_weight}"
     )
 
 
@@ -423,6 +488,111 @@ def set_session_note(args):
     print("Session note saved")
 
 
+def migrate_sqlite(_args):
+    """Import the JSON data files into SQLite and switch the storage backend."""
+    try:
+        count = storage.migrate_to_sqlite()
+    except RuntimeError as exc:
+        print(str(exc))
+        return
+    logger.log(f"Migrated {count} projects to SQLite")
+    print(f"Migrated {count} projects to {storage.DB_FILE}")
+
+
+def convert_storage(args):
+    """Rewrite the data files in another format (pretty, compact or binary)."""
+    try:
+        storage.convert_format(args.format)
+    except (RuntimeError, ValueError) as exc:
+        print(str(exc))
+        return
+    logger.log(f"Converted storage to {args.format}")
+    print(f"Storage converted to {args.format}")
+
+
+def check_counters(_args):
+    """Recount the tasks of every project and repair counters that drifted."""
+    fixed = storage.repair_counters()
+    for p in fixed:
+        print(f"Fixed counters of project {p.id}: {p.name}")
+    if fixed:
+        logger.log(f"Fixed counters of {len(fixed)} projects")
+    else:
+        print("All counters are up to date")
+
+
+def rebuild_index(_args):
+    """Rebuild the notes and history search index from scratch."""
+    index = memory.rebuild_search_index()
+    logger.log("Rebuilt search index")
+    print(f"Indexed {len(index.notes)} notes and {len(index.history)} messages")
+
+
+def plan_scenarios(args):
+    """Compare what-if scenarios read from a JSON file (a list of scenario objects)."""
+    start = date.today()
+    if args.start:
+        try:
+            start = datetime.strptime(args.start, "%d/%m").replace(year=date.today().year).date()
+        except ValueError:
+            print("Invalid date format")
+            return
+    try:
+        if args.file == "-":
+            data = json.load(sys.stdin)
+        else:
+            with open(args.file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+    except OSError as e:
+        print(f"Cannot read {args.file}: {e.strerror}")
+        return
+    except json.JSONDecodeError as e:
+        print(f"Invalid JSON in {args.file}: {e}")
+        return
+    try:
+        items = scenarios.from_list(data)
+    except ValueError as e:
+        print(f"Invalid scenarios: {e}")
+        return
+    if not any(s.name == "baseline" for s in items):
+        items.insert(0, scenarios.Scenario("baseline"))
+    projects = storage.view_projects()
+    now = datetime.now() if start <= date.today() else None
+    availability = storage.load_config().get("availability")
+    try:
+        outcomes = scenarios.run(projects, items, start, args.days, availability, now, args.workers)
+    except ValueError as e:
+        print(e)
+        return
+    names = {p.id: p.name for p in projects}
+    baseline = next(o for o in outcomes if o.name == "baseline")
+    for o in outcomes:
+        print(f"{o.name}: {o.tasks_late} late, {o.hours_overbooked}h overbooked")
+        for pid, day in o.completion.items():
+            before = baseline.completion.get(pid)
+            delta = ""
+            if day and before and o is not baseline:
+                diff = (date.fromisoformat(day) - date.fromisoformat(before)).days
+                delta = f" ({diff:+d} days)" if diff else ""
+            print(f"  {names.get(pid, pid)}: {day or 'not within ' + str(args.days) + ' days'}{delta}")
+
+
+def run_batch(args):
+    """Run one command per line of a file (``-`` for stdin) with a single save."""
+    parser = build_parser()
+    f = sys.stdin if args.file == "-" else open(args.file, "r", encoding="utf-8")
+    with f:
+        lines = [line.strip() for line in f]
+    parsed = []
+    for line in lines:
+        if not line or line.startswith("#"):
+            continue
+        parsed.append(parser.parse_args(shlex.split(line)))
+    with logger.buffered(), storage.session():
+        for cmd in parsed:
+            cmd.func(cmd)
+
+
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(prog="ia_manager")
     sub = parser.add_subparsers(dest="command")
@@ -497,13 +667,27 @@ def build_parser() -> argparse.ArgumentParser:
 
     sub.add_parser("list_schedule").set_defaults(func=list_schedule)
 
+    slot = sub.add_parser("find_slot")
+    slot.add_argument("hours", type=float)
+    slot.add_argument("--after")
+    slot.set_defaults(func=find_slot)
+
     sub.add_parser("show_status").set_defaults(func=show_status)
 
     p_day = sub.add_parser("plan_day")
     p_day.add_argument("date", nargs="?")
+    p_day.add_argument("--write", action="store_true")
     p_day.set_defaults(func=plan_day)
 
-    sub.add_parser("recommend_task").set_defaults(func=recommend_task)
+    p_week = sub.add_parser("plan_week")
+    p_week.add_argument("--start")
+    p_week.add_argument("--days", type=int, default=7)
+    p_week.add_argument("--write", action="store_true")
+    p_week.set_defaults(func=plan_week)
+
+    rec = sub.add_parser("recommend_task")
+    rec.add_argument("--limit", type=int, default=5)
+    rec.set_defaults(func=recommend_task)
 
     doc_upd = sub.add_parser("doc_update")
     doc_upd.add_argument("project")
@@ -538,6 +722,9 @@ def build_parser() -> argparse.ArgumentParser:
 
     n_search = sub.add_parser("search_notes")
     n_search.add_argument("query")
+    n_search.add_argument("--mode", choices=note_index.MODES, default="auto")
+    n_search.add_argument("--max_edits", type=int)
+    n_search.add_argument("--limit", type=int, default=20)
     n_search.set_defaults(func=search_notes)
 
     priv = sub.add_parser("remember_note")
@@ -547,6 +734,7 @@ def build_parser() -> argparse.ArgumentParser:
     pers = sub.add_parser("set_personality")
     pers.add_argument("--sarcasm", type=float)
     pers.add_argument("--context_chars", type=int)
+    pers.add_argument("--semantic_weight", type=float)
     pers.set_defaults(func=set_personality)
 
     sub.add_parser("show_personality").set_defaults(func=show_personality)
@@ -555,4 +743,25 @@ def build_parser() -> argparse.ArgumentParser:
     s_note.add_argument("text")
     s_note.set_defaults(func=set_session_note)
 
+    sub.add_parser("migrate_sqlite").set_defaults(func=migrate_sqlite)
+
+    conv = sub.add_parser("convert_storage")
+    conv.add_argument("format", choices=["pretty", "compact", "binary"])
+    conv.set_defaults(func=convert_storage)
+
+    sub.add_parser("check_counters").set_defaults(func=check_counters)
+
+    sub.add_parser("rebuild_index").set_defaults(func=rebuild_index)
+
+    scen = sub.add_parser("plan_scenarios")
+    scen.add_argument("file")
+    scen.add_argument("--start")
+    scen.add_argument("--days", type=int, default=56)
+    scen.add_argument("--workers", type=int)
+    scen.set_defaults(func=plan_scenarios)
+
+    batch = sub.add_parser("batch")
+    batch.add_argument("file")
+    batch.set_defaults(func=run_batch)
+
     return parser
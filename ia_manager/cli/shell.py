@@ -24,8 +24,11 @@ COMMAND_HELP = """Available commands:
                        --planned_start TS --planned_end TS --planned_hours H]
   schedule_task TASK_ID [--start TS --end TS --hours H]
   list_schedule
+  find_slot HOURS [--after TS]
   show_status
-  plan_day [JJ/MM]
+  plan_day [JJ/MM] [--write]
+  plan_week [--start JJ/MM --days N --write]
+  plan_scenarios FILE [--start JJ/MM --days N --workers N]
   recommend_task
   calendar
   assistant
@@ -36,7 +39,7 @@ COMMAND_HELP = """Available commands:
 def interactive_loop():
     parser = build_parser()
     user = memory.load_user()
-    projects = storage.load_projects()
+    projects = storage.view_projects()
     notes = memory.load_notes()
     custom = memory.load_custom_session_note()
     note = custom or memory.generate_session_note(projects, notes, user)
@@ -0,0 +1,62 @@
+"""Compile ``to_dict``/``from_dict`` for the model dataclasses.
+
+The codecs are generated once per class from its fields, so encoding is a
+single dict display and decoding a single positional constructor call
+instead of field-by-field Python.
+"""
+from dataclasses import MISSING, fields
+from typing import Dict, Iterable, Optional
+
+
+def codec(
+    required: Iterable[str] = (),
+    encode: Optional[Dict[str, str]] = None,
+    decode: Optional[Dict[str, str]] = None,
+    namespace: Optional[dict] = None,
+):
+    """Class decorator adding compiled ``to_dict`` and ``from_dict`` to a dataclass.
+
+    ``required`` fields are read with ``data[name]``, the others fall back to
+    their default; fields declared with ``init=False`` are internal and
+    skipped. ``encode``/``decode`` override the expression used for a field;
+    they can use ``self``, ``data``, ``get`` (``data.get``) and the names in
+    ``namespace``.
+    """
+    required = set(required)
+    encode = encode or {}
+    decode = decode or {}
+
+    def wrap(cls):
+        ns = {"__cls": cls, **(namespace or {})}
+        items = []
+        args = []
+        for f in fields(cls):
+            if not f.init:
+                continue
+            name = f.name
+            items.append(f"{name!r}: {encode.get(name, f'self.{name}')}")
+            if name in decode:
+                args.append(decode[name])
+            elif name in required:
+                args.append(f"data[{name!r}]")
+            elif f.default is not MISSING:
+                ns[f"__d_{name}"] = f.default
+                args.append(f"get({name!r}, __d_{name})")
+            else:
+                ns[f"__f_{name}"] = f.default_factory
+                args.append(f"data[{name!r}] if {name!r} in data else __f_{name}()")
+        source = (
+            "def to_dict(self):\n"
+            f"    return {{{', '.join(items)}}}\n"
+            "def from_dict(data):\n"
+            "    get = data.get\n"
+            f"    return __cls({', '.join(args)})\n"
+        )
+        exec(compile(source, f"<codec {cls.__name__}>", "exec"), ns)
+        ns["to_dict"].__qualname__ = f"{cls.__name__}.to_dict"
+        ns["from_dict"].__qualname__ = f"{cls.__name__}.from_dict"
+        cls.to_dict = ns["to_dict"]
+        cls.from_dict = staticmethod(ns["from_dict"])
+        return cls
+
+    return wrap
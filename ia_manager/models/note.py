@@ -2,7 +2,11 @@ from dataclasses import dataclass, field
 from typing import List, Optional
 from datetime import datetime
 
-@dataclass
+from .codec import codec
+
+
+@codec(required=("id",), decode={"tags": "list(get('tags', ()))", "text": "get('text', '')"})
+@dataclass(slots=True)
 class Note:
     id: int
     text: str
@@ -10,24 +14,3 @@ class Note:
     project_id: Optional[int] = None
     internal: bool = False
     created: str = field(default_factory=lambda: datetime.utcnow().isoformat())
-
-    def to_dict(self) -> dict:
-        return {
-            "id": self.id,
-            "text": self.text,
-            "tags": self.tags,
-            "project_id": self.project_id,
-            "internal": self.internal,
-            "created": self.created,
-        }
-
-    @staticmethod
-    def from_dict(data: dict) -> "Note":
-        return Note(
-            id=data["id"],
-            text=data.get("text", ""),
-            tags=list(data.get("tags", [])),
-            project_id=data.get("project_id"),
-            internal=data.get("internal", False),
-            created=data.get("created", datetime.utcnow().isoformat()),
-        )
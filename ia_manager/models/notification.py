@@ -1,7 +1,11 @@
 from dataclasses import dataclass
 from typing import Optional
 
-@dataclass
+from .codec import codec
+
+
+@codec(required=("id", "message"))
+@dataclass(slots=True)
 class Notification:
     id: int
     message: str
@@ -1,8 +1,53 @@
-from dataclasses import dataclass, field
-from typing import List, Optional
+from dataclasses import dataclass, field, replace
+from typing import Iterable, List, Optional
+
+from .codec import codec
 from .task import Task
 
-@dataclass
+
+@codec()
+@dataclass(slots=True)
+class TaskCounters:
+    """Running totals over the tasks of a project."""
+
+    total: int = 0
+    done: int = 0
+    in_progress: int = 0
+    planned: int = 0
+    time_spent: int = 0  # seconds
+    estimated: float = 0  # hours
+
+    def add(self, task: Task, sign: int = 1):
+        """Count ``task`` in (``sign=1``) or out (``sign=-1``)."""
+        self.total += sign
+        if task.status == "done":
+            self.done += sign
+        elif task.status == "in_progress":
+            self.in_progress += sign
+        elif task.status == "planned":
+            self.planned += sign
+        self.time_spent += sign * (task.time_spent or 0)
+        self.estimated += sign * (task.estimated or 0)
+
+    @staticmethod
+    def of(tasks: Iterable[Task]) -> "TaskCounters":
+        counters = TaskCounters()
+        for t in tasks:
+            counters.add(t)
+        return counters
+
+    def copy(self) -> "TaskCounters":
+        return replace(self)
+
+
+@codec(
+    required=("id", "name"),
+    encode={"tasks": "[t.to_dict() for t in self.tasks]", "counters": "self.counters.to_dict()"},
+    # counters are always recounted from the tasks on load
+    decode={"tasks": "[task_from_dict(t) for t in get('tasks', ())]", "counters": "None"},
+    namespace={"task_from_dict": Task.from_dict},
+)
+@dataclass(slots=True)
 class Project:
     id: int
     name: str
@@ -11,33 +56,50 @@ class Project:
     deadline: Optional[str] = None  # YYYY-MM-DD
     status: str = "en cours"
     tasks: List[Task] = field(default_factory=list)
+    counters: Optional[TaskCounters] = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.counters is None:
+            self.counters = TaskCounters.of(self.tasks)
 
     def progress(self) -> int:
-        if not self.tasks:
+        c = self.counters
+        if not c.total:
             return 0
-        done = sum(1 for t in self.tasks if t.status == "done")
-        return int(done / len(self.tasks) * 100)
-
-    def to_dict(self) -> dict:
-        return {
-            "id": self.id,
-            "name": self.name,
-            "description": self.description,
-            "priority": self.priority,
-            "deadline": self.deadline,
-            "status": self.status,
-            "tasks": [t.to_dict() for t in self.tasks],
-        }
+        return int(c.done / c.total * 100)
 
-    @staticmethod
-    def from_dict(data: dict) -> "Project":
-        tasks = [Task.from_dict(td) for td in data.get("tasks", [])]
-        return Project(
-            id=data["id"],
-            name=data["name"],
-            description=data.get("description", ""),
-            priority=data.get("priority", 3),
-            deadline=data.get("deadline"),
-            status=data.get("status", "en cours"),
-            tasks=tasks,
-        )
+    def max_task_id(self) -> int:
+        return max((t.id for t in self.tasks), default=0)
+
+    def copy(self) -> "Project":
+        return replace(self, tasks=[t.copy() for t in self.tasks], counters=self.counters.copy())
+
+    # Changes to the task list, or to the status, time_spent or estimated of a
+    # task, go through these methods so the counters stay in step.
+
+    def add_task(self, task: Task):
+        self.tasks.append(task)
+        self.counters.add(task)
+
+    def remove_task(self, task: Task):
+        self.tasks.remove(task)
+        self.counters.add(task, -1)
+
+    def update_task(self, task: Task, **changes):
+        """Set attributes of ``task`` and adjust the counters."""
+        self.counters.add(task, -1)
+        for name, value in changes.items():
+            setattr(task, name, value)
+        self.counters.add(task)
+
+    def recount(self):
+        self.counters = TaskCounters.of(self.tasks)
+
+    def check_counters(self) -> bool:
+        """Recount the tasks; return False (and fix the counters) if they had drifted."""
+        counters = self.counters
+        fresh = TaskCounters.of(self.tasks)
+        if fresh == counters:
+            return True
+        self.counters = fresh
+        return False
@@ -1,7 +1,29 @@
-from dataclasses import dataclass, field
-from typing import Optional
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Optional, Union
 
-@dataclass
+from .codec import codec
+
+
+class _Invalid:
+    """Parsed value of a malformed date string. It is falsy, like a missing date."""
+
+    __slots__ = ()
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __repr__(self) -> str:
+        return "INVALID"
+
+
+INVALID = _Invalid()
+
+ParsedDate = Union[datetime, None, _Invalid]
+
+
+@codec(required=("id", "name"))
+@dataclass(slots=True)
 class Task:
     id: int
     name: str
@@ -15,36 +37,69 @@ class Task:
     planned_start: Optional[str] = None  # ISO timestamp planned start
     planned_end: Optional[str] = None    # ISO timestamp planned end
     planned_hours: Optional[float] = None
+    # (string, parsed value) caches for the *_at accessors; not serialized or compared
+    _deadline_at: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+    _planned_start_at: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+    _planned_end_at: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+    _started_at: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+
+    # to_dict() and from_dict() are compiled by @codec
+
+    def copy(self) -> "Task":
+        clone = replace(self)
+        # the caches are immutable tuples checked against the field, safe to share
+        clone._deadline_at = self._deadline_at
+        clone._planned_start_at = self._planned_start_at
+        clone._planned_end_at = self._planned_end_at
+        clone._started_at = self._started_at
+        return clone
+
+    def _parse(self, name: str) -> ParsedDate:
+        """Parse the string field ``name`` and cache the result next to the string.
+
+        The cache holds the string it was parsed from, so assigning a new
+        value to the field invalidates it. Empty fields give None and
+        malformed ones INVALID.
+        """
+        raw = getattr(self, name)
+        if not raw:
+            value = None
+        else:
+            try:
+                value = datetime.fromisoformat(raw)
+            except (TypeError, ValueError):
+                value = INVALID
+        setattr(self, f"_{name}_at", (raw, value))
+        return value
+
+    @property
+    def deadline_at(self) -> ParsedDate:
+        cached = self._deadline_at
+        if cached is not None and cached[0] is self.deadline:
+            return cached[1]
+        return self._parse("deadline")
+
+    @property
+    def planned_start_at(self) -> ParsedDate:
+        cached = self._planned_start_at
+        if cached is not None and cached[0] is self.planned_start:
+            return cached[1]
+        return self._parse("planned_start")
+
+    @property
+    def planned_end_at(self) -> ParsedDate:
+        cached = self._planned_end_at
+        if cached is not None and cached[0] is self.planned_end:
+            return cached[1]
+        return self._parse("planned_end")
+
+    @property
+    def started_at(self) -> ParsedDate:
+        cached = self._started_at
+        if cached is not None and cached[0] is self.started:
+            return cached[1]
+        return self._parse("started")
 
-    def to_dict(self) -> dict:
-        return {
-            "id": self.id,
-            "name": self.name,
-            "estimated": self.estimated,
-            "deadline": self.deadline,
-            "importance": self.importance,
-            "status": self.status,
-            "description": self.description,
-            "started": self.started,
-            "time_spent": self.time_spent,
-            "planned_start": self.planned_start,
-            "planned_end": self.planned_end,
-            "planned_hours": self.planned_hours,
-        }
-
-    @staticmethod
-    def from_dict(data: dict) -> "Task":
-        return Task(
-            id=data["id"],
-            name=data["name"],
-            estimated=data.get("estimated"),
-            deadline=data.get("deadline"),
-            importance=data.get("importance", 3),
-            status=data.get("status", "todo"),
-            description=data.get("description", ""),
-            started=data.get("started"),
-            time_spent=data.get("time_spent", 0),
-            planned_start=data.get("planned_start"),
-            planned_end=data.get("planned_end"),
-            planned_hours=data.get("planned_hours"),
-        )
+    def scheduled_at(self) -> ParsedDate:
+        """Planned start if set, otherwise the deadline, as used by the calendar."""
+        return self.planned_start_at if self.planned_start else self.deadline_at
@@ -0,0 +1,204 @@
+"""Column-oriented view of every task for vectorized queries.
+
+Requires NumPy; without it ``task_table()`` returns None and callers fall back
+to looping over ``Project.tasks``. The table is built from
+``storage.view_projects()`` and rebuilt when the storage cache is reloaded.
+"""
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+from ..models.project import Project
+from ..models.task import Task
+from . import storage
+
+STATUS_CODES = {"todo": 0, "planned": 1, "in_progress": 2, "done": 3}
+DONE = STATUS_CODES["done"]
+NAT = "NaT"
+
+
+def _has_offset(value: str) -> bool:
+    time_part = value[10:]
+    return "Z" in time_part or "+" in time_part or "-" in time_part
+
+
+def _datetime64_column(values: List[Optional[str]], tasks: List[Task], field: str):
+    """Parse ISO strings into a datetime64[s] array, NaT where missing or malformed.
+
+    A value with a UTC offset keeps its wall-clock time, as the string
+    comparisons of ``storage.scheduled_between`` do; NumPy would convert it
+    to UTC, so those go through the task's cached parser.
+    """
+    aware = [i for i, v in enumerate(values) if v and _has_offset(v)]
+    strings = [v or NAT for v in values]
+    for i in aware:
+        strings[i] = NAT
+    try:
+        column = np.array(strings, dtype="datetime64[s]")
+        rows = aware
+    except ValueError:
+        # some values are malformed
+        column = np.full(len(tasks), np.datetime64(NAT), dtype="datetime64[s]")
+        rows = range(len(tasks))
+    for i in rows:
+        d = getattr(tasks[i], field)
+        if d:
+            column[i] = np.datetime64(d.replace(tzinfo=None), "s")
+    return column
+
+
+class TaskTable:
+    """All tasks as parallel arrays, one row per task.
+
+    Columns: ``ids``, ``project_ids``, ``status`` (codes from ``statuses``),
+    ``importance``, ``deadline`` and ``planned_start`` (datetime64, NaT when
+    unset), ``scheduled`` (planned start, else deadline), ``time_spent``
+    (seconds) and ``estimated`` (hours, NaN when unset). ``pairs()`` maps row
+    numbers back to (project, task).
+    """
+
+    def __init__(self, projects: List[Project]):
+        self.projects = projects
+        self.statuses = list(STATUS_CODES)
+        codes = dict(STATUS_CODES)
+        tasks: List[Task] = []
+        owners: List[int] = []
+        status: List[int] = []
+        for pos, p in enumerate(projects):
+            for t in p.tasks:
+                tasks.append(t)
+                owners.append(pos)
+                code = codes.get(t.status)
+                if code is None:
+                    code = codes[t.status] = len(self.statuses)
+                    self.statuses.append(t.status)
+                status.append(code)
+        self.tasks = tasks
+        self.owners = np.array(owners, dtype=np.int64)
+        self.ids = np.array([t.id for t in tasks], dtype=np.int64)
+        self.project_ids = np.array([p.id for p in projects], dtype=np.int64)[self.owners] if tasks else np.zeros(0, np.int64)
+        self.status = np.array(status, dtype=np.int16)
+        self.importance = np.array([t.importance for t in tasks], dtype=np.int16)
+        self.time_spent = np.array([t.time_spent or 0 for t in tasks], dtype=np.int64)
+        self.estimated = np.array([np.nan if t.estimated is None else t.estimated for t in tasks], dtype=np.float64)
+        self.deadline = _datetime64_column([t.deadline for t in tasks], tasks, "deadline_at")
+        self.planned_start = _datetime64_column([t.planned_start for t in tasks], tasks, "planned_start_at")
+        has_start = np.array([bool(t.planned_start) for t in tasks], dtype=bool)
+        self.scheduled = np.where(has_start, self.planned_start, self.deadline)
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def pairs(self, rows) -> List[Tuple[Project, Task]]:
+        projects, tasks, owners = self.projects, self.tasks, self.owners
+        return [(projects[owners[i]], tasks[i]) for i in rows]
+
+    def _open(self):
+        return self.status != DONE
+
+    # queries ----------------------------------------------------------------
+
+    def scheduled_rows(self, start: date, end: date, include_done: bool = True):
+        """Rows whose planned start (or deadline) falls in [start, end)."""
+        lo, hi = np.datetime64(start, "s"), np.datetime64(end, "s")
+        mask = (self.scheduled >= lo) & (self.scheduled < hi)
+        if not include_done:
+            mask &= self._open()
+        return np.flatnonzero(mask)
+
+    def scheduled_between(self, start: date, end: date, include_done: bool = True) -> List[Tuple[Project, Task]]:
+        return self.pairs(self.scheduled_rows(start, end, include_done))
+
+    def due_per_day(self, start: date, end: date, include_done: bool = False) -> Dict[date, int]:
+        """Number of tasks with a deadline on each day of [start, end)."""
+        days = self.deadline.astype("datetime64[D]")
+        lo, hi = np.datetime64(start, "D"), np.datetime64(end, "D")
+        mask = (days >= lo) & (days < hi)
+        if not include_done:
+            mask &= self._open()
+        counts = np.bincount((days[mask] - lo).astype(np.int64), minlength=int((hi - lo).astype(np.int64)))
+        return {(lo + i).item(): int(c) for i, c in enumerate(counts) if c}
+
+    def overdue_count(self, now: datetime) -> int:
+        """Open tasks whose deadline is before ``now``."""
+        return int(np.count_nonzero((self.deadline < np.datetime64(now, "s")) & self._open()))
+
+    def time_spent_by_project(self) -> Dict[int, int]:
+        """Seconds spent per project id."""
+        sums = np.bincount(self.owners, weights=self.time_spent, minlength=len(self.projects))
+        return {p.id: int(sums[pos]) for pos, p in enumerate(self.projects)}
+
+    def time_spent_by_status(self) -> Dict[str, int]:
+        """Seconds spent per task status."""
+        sums = np.bincount(self.status, weights=self.time_spent, minlength=len(self.statuses))
+        return {name: int(sums[code]) for code, name in enumerate(self.statuses)}
+
+    def project_stats(self) -> Dict[int, dict]:
+        """Per project id: task counts by state, estimated hours and hours spent."""
+        n = len(self.projects)
+        total = np.bincount(self.owners, minlength=n)
+        done = np.bincount(self.owners[self.status == DONE], minlength=n)
+        estimated = np.bincount(self.owners, weights=np.nan_to_num(self.estimated), minlength=n)
+        spent = np.bincount(self.owners, weights=self.time_spent, minlength=n) / 3600
+        return {
+            p.id: {
+                "total": int(total[pos]),
+                "done": int(done[pos]),
+                "progress": int(done[pos] / total[pos] * 100) if total[pos] else 0,
+                "estimated_hours": float(estimated[pos]),
+                "spent_hours": float(spent[pos]),
+            }
+            for pos, p in enumerate(self.projects)
+        }
+
+
+_lock = threading.Lock()
+_cached: Tuple[Optional[list], Optional[TaskTable]] = (None, None)
+
+
+def enabled() -> bool:
+    """Whether the table can be used.
+
+    It needs NumPy, can be turned off with ``"columnar": false`` in the
+    storage settings and is not used with lazy loading, which it would defeat.
+    """
+    if np is None:
+        return False
+    settings = storage.storage_settings()
+    return bool(settings.get("columnar", True)) and not settings.get("lazy", False)
+
+
+def task_table() -> Optional[TaskTable]:
+    """Return the table for the current projects, or None when it is not available.
+
+    Inside a storage session the projects change in place, so no table is
+    returned there either.
+    """
+    global _cached
+    if not enabled() or storage.current_session() is not None:
+        return None
+    projects = storage.view_projects()
+    with _lock:
+        source, table = _cached
+        if source is not projects:
+            table = TaskTable(projects)
+            _cached = (projects, table)
+        return table
+
+
+def scheduled_between(start: date, end: date, include_done: bool = True) -> List[Tuple[Project, Task]]:
+    """Like ``storage.scheduled_between`` but answered from the table when possible.
+
+    The SQLite backend answers from its indexes instead.
+    """
+    if storage.sqlite_repository() is not None:
+        return storage.scheduled_between(start, end, include_done)
+    table = task_table()
+    if table is not None:
+        return table.scheduled_between(start, end, include_done)
+    return storage.scheduled_between(start, end, include_done)
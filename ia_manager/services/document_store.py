@@ -0,0 +1,67 @@
+"""A small data file read through a shared cache.
+
+Each store owns one file and keeps its parsed content until the file's
+signature changes, so repeated reads cost a ``stat`` and a write rewrites
+only that file. Callers must not modify the data returned by ``read``.
+"""
+import threading
+from pathlib import Path
+from typing import Callable
+
+from . import serialization
+from .storage import _file_signature, storage_settings
+
+
+class DocumentStore:
+    """One JSON document; ``path`` is a file or a function ``existing -> file``.
+
+    A function lets the file follow the configured storage format, as
+    ``storage.notes_path`` does. Stores with a fixed path write the binary
+    format as compact JSON.
+    """
+
+    def __init__(self, path, default: Callable[[], dict] = dict):
+        self._path = path
+        self.default = default
+        self._lock = threading.Lock()
+        self._snapshot: tuple = (None, None, None)  # (path, signature, data)
+
+    def path(self, existing: bool = True) -> Path:
+        if callable(self._path):
+            return self._path(existing)
+        return self._path
+
+    def exists(self) -> bool:
+        return self.path().exists()
+
+    def signature(self) -> list:
+        """Changes whenever the file is written, by this process or another."""
+        path = self.path()
+        return [path.name, *(_file_signature(path) or ())]
+
+    def read(self) -> dict:
+        """Return the parsed file, shared and parsed again only when it changes."""
+        path = self.path()
+        signature = _file_signature(path)
+        with self._lock:
+            cached_path, cached_signature, data = self._snapshot
+        if cached_path == path and cached_signature == signature and data is not None:
+            return data
+        data = serialization.read_file(path) if signature else self.default()
+        with self._lock:
+            self._snapshot = (path, signature, data)
+        return data
+
+    def write(self, data: dict):
+        """Replace the file in the configured format."""
+        fmt = storage_settings().get("format", "pretty")
+        if fmt == "binary" and not callable(self._path):
+            fmt = "compact"
+        old = self.path()
+        path = self.path(existing=False)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        serialization.write_file(path, data, fmt)
+        if old != path and old.exists():
+            old.unlink()
+        with self._lock:
+            self._snapshot = (path, _file_signature(path), data)
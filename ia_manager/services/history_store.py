@@ -0,0 +1,208 @@
+"""Append-only store for the conversation history.
+
+Messages are JSON lines in numbered segment files under ``data/history/``.
+A new segment is started once the active one reaches ``segment_bytes``;
+``manifest.json`` lists the segments with the sequence number of their first
+message, so a message is found without reading the others. Appending writes
+one line, and the most recent ``tail_size`` messages are kept in memory.
+Writers hold the memory lock; readers only parse complete lines and skip
+lines that do not decode, which do not count as messages. A line torn by a
+crash is cut off before the next append.
+"""
+import threading
+from bisect import bisect_right
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from . import serialization
+from .storage import _file_signature
+
+SEGMENT_BYTES = 1024 * 1024
+TAIL_SIZE = 200
+
+
+class HistoryStore:
+    def __init__(self, directory: Path, segment_bytes: int = SEGMENT_BYTES, tail_size: int = TAIL_SIZE):
+        self.directory = directory
+        self.manifest_path = directory / "manifest.json"
+        self.segment_bytes = segment_bytes
+        self.tail_size = tail_size
+        self._lock = threading.RLock()
+        self._manifest_signature = None
+        self._generation = 0
+        self._next = 1
+        self._segments: List[dict] = []  # {"name", "start"}, oldest first; the last one is active
+        self._starts: List[int] = []
+        self._active_offset = 0
+        self._active_count = 0
+        self._tail = deque(maxlen=tail_size)  # (seq, item) of the newest messages
+
+    def exists(self) -> bool:
+        return self.manifest_path.exists()
+
+    def _segment_path(self, segment: dict) -> Path:
+        return self.directory / segment["name"]
+
+    def _read_items(self, path: Path, offset: int = 0):
+        """Return the messages on the complete lines of ``path`` after ``offset`` and the offset past them."""
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                raw = f.read()
+        except FileNotFoundError:
+            return [], offset
+        end = raw.rfind(b"\n") + 1
+        items = []
+        for line in raw[:end].splitlines():
+            try:
+                item = serialization.loads(line)
+            except ValueError:
+                continue
+            if isinstance(item, dict):
+                items.append(item)
+        return items, offset + end
+
+    def _refresh(self):
+        """Catch up with other processes: reread the manifest if it changed, then new lines."""
+        signature = _file_signature(self.manifest_path)
+        if signature != self._manifest_signature:
+            data = serialization.read_file(self.manifest_path) if signature else {}
+            self._manifest_signature = signature
+            self._generation = data.get("generation", 0)
+            self._next = data.get("next", 1)
+            self._segments = data.get("segments", [])
+            self._starts = [s["start"] for s in self._segments]
+            self._active_offset = 0
+            self._active_count = 0
+            self._tail.clear()
+            if len(self._segments) > 1:
+                # seed the tail with the end of the previous segment
+                previous = self._segments[-2]
+                items, _ = self._read_items(self._segment_path(previous))
+                start = self._starts[-1] - len(items)
+                skip = max(0, len(items) - self.tail_size)
+                for i, item in enumerate(items[skip:], skip):
+                    self._tail.append((start + i, item))
+        if not self._segments:
+            return
+        items, self._active_offset = self._read_items(self._segment_path(self._segments[-1]), self._active_offset)
+        seq = self._starts[-1] + self._active_count
+        skip = max(0, len(items) - self.tail_size)
+        for i, item in enumerate(items[skip:], skip):
+            self._tail.append((seq + i, item))
+        self._active_count += len(items)
+
+    def _write_manifest(self):
+        data = {"generation": self._generation, "next": self._next, "segments": self._segments}
+        serialization.write_file(self.manifest_path, data, "pretty")
+        self._manifest_signature = _file_signature(self.manifest_path)
+        self._starts = [s["start"] for s in self._segments]
+
+    def _new_segment(self, start: int) -> dict:
+        segment = {"name": f"{self._next:06d}.jsonl", "start": start}
+        self._next += 1
+        return segment
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self._starts[-1] + self._active_count if self._segments else 0
+
+    def version(self) -> list:
+        """Changes on every append and every ``replace``."""
+        with self._lock:
+            return [self._generation, len(self)]
+
+    def append(self, item: dict) -> int:
+        """Append one message and return its sequence number."""
+        with self._lock:
+            self._refresh()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            seq = self._starts[-1] + self._active_count if self._segments else 0
+            if not self._segments or self._active_offset >= self.segment_bytes:
+                self._segments.append(self._new_segment(seq))
+                self._write_manifest()
+                self._active_offset = 0
+                self._active_count = 0
+            line = serialization.dumps(item, "compact") + b"\n"
+            with open(self._segment_path(self._segments[-1]), "ab") as f:
+                if f.seek(0, 2) > self._active_offset:
+                    # a crash left part of a line after the last complete one
+                    f.truncate(self._active_offset)
+                f.write(line)
+            self._active_offset += len(line)
+            self._active_count += 1
+            self._tail.append((seq, item))
+            return seq
+
+    def replace(self, items: List[dict]):
+        """Rewrite the whole history."""
+        with self._lock:
+            self._refresh()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            old = [self._segment_path(s) for s in self._segments]
+            segments = []
+            chunk: List[bytes] = []
+            size = 0
+            for seq, item in enumerate(items):
+                if not chunk or size >= self.segment_bytes:
+                    if chunk:
+                        serialization.atomic_write(self._segment_path(segments[-1]), b"".join(chunk))
+                    segments.append(self._new_segment(seq))
+                    chunk, size = [], 0
+                line = serialization.dumps(item, "compact") + b"\n"
+                chunk.append(line)
+                size += len(line)
+            if chunk:
+                serialization.atomic_write(self._segment_path(segments[-1]), b"".join(chunk))
+            self._generation += 1
+            self._segments = segments
+            self._write_manifest()
+            for path in old:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            self._manifest_signature = None
+            self._refresh()
+
+    def load(self) -> List[dict]:
+        """Every message, oldest first."""
+        with self._lock:
+            self._refresh()
+            items = []
+            for segment in self._segments[:-1]:
+                items += self._read_items(self._segment_path(segment))[0]
+            if self._segments:
+                active, _ = self._read_items(self._segment_path(self._segments[-1]))
+                items += active[:self._active_count]
+            return items
+
+    def tail(self, n: int) -> List[dict]:
+        """The ``n`` most recent messages, oldest first."""
+        with self._lock:
+            self._refresh()
+            if n <= len(self._tail):
+                return [item for _seq, item in list(self._tail)[len(self._tail) - n:]] if n > 0 else []
+        return self.load()[-n:]
+
+    def get(self, seqs: Iterable[int]) -> Dict[int, dict]:
+        """Messages by sequence number, reading only the segments that hold them."""
+        with self._lock:
+            self._refresh()
+            recent = dict(self._tail)
+            found = {}
+            wanted: Dict[int, List[int]] = {}
+            for seq in seqs:
+                if seq in recent:
+                    found[seq] = recent[seq]
+                elif seq >= 0 and self._segments:
+                    wanted.setdefault(bisect_right(self._starts, seq) - 1, []).append(seq)
+            for pos, group in wanted.items():
+                items, _ = self._read_items(self._segment_path(self._segments[pos]))
+                start = self._starts[pos]
+                for seq in group:
+                    if seq - start < len(items):
+                        found[seq] = items[seq - start]
+            return found
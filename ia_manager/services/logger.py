@@ -1,9 +1,42 @@
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from .storage import LOG_FILE
 
+_local = threading.local()
 
-def log(action: str):
+
+def _write(lines: list):
     LOG_FILE.parent.mkdir(exist_ok=True)
     with open(LOG_FILE, "a", encoding="utf-8") as f:
-        timestamp = datetime.now().isoformat()
-        f.write(f"{timestamp}: {action}\n")
+        f.write("".join(lines))
+
+
+def log(action: str):
+    timestamp = datetime.now().isoformat()
+    line = f"{timestamp}: {action}\n"
+    lines = getattr(_local, "lines", None)
+    if lines is not None:
+        lines.append(line)
+        return
+    _write([line])
+
+
+@contextmanager
+def buffered():
+    """Hold the lines logged in this thread and append them in one write.
+
+    The lines are dropped if the block raises, like the changes of the
+    storage session they usually describe.
+    """
+    if getattr(_local, "lines", None) is not None:
+        yield
+        return
+    _local.lines = []
+    try:
+        yield
+        lines = _local.lines
+    finally:
+        _local.lines = None
+    if lines:
+        _write(lines)
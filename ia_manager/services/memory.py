@@ -1,77 +1,229 @@
 import json
-from pathlib import Path
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 from typing import List
 from datetime import datetime
-import re
 
 from ..models.note import Note
 from ..models.user import User
+from . import note_index, search_index, serialization, storage, vector_index
+from .document_store import DocumentStore
+from .history_store import HistoryStore
 
-DATA_DIR = Path(__file__).resolve().parent.parent / "data"
-MEMORY_FILE = DATA_DIR / "memory.json"
+DATA_DIR = storage.DATA_DIR
 PERSONALITY_FILE = DATA_DIR / "personality.json"
+SEARCH_INDEX_FILE = DATA_DIR / "search_index.json"
+HISTORY_VECTORS_FILE = DATA_DIR / "history_vectors.f32"
 
+CONTEXT_CANDIDATES = 5
+MIN_SIMILARITY = 0.2
+VECTOR_SAVE_EVERY = 64
+CONTEXT_CACHE_SIZE = 256
 
-def _ensure_dirs():
-    DATA_DIR.mkdir(exist_ok=True)
+# each kind of memory lives in its own file so that a small write stays small
+_notes_file = DocumentStore(storage.notes_path, lambda: {"notes": []})
+_session_file = DocumentStore(storage.SESSION_NOTE_FILE, lambda: {"session_note": ""})
+_history = HistoryStore(storage.HISTORY_DIR)
+_memory_file_checked = False
 
+# parsed files shared by every reader, keyed by the version they were read at
+_snapshot_lock = threading.Lock()
+_notes_snapshot: tuple = (None, [])  # (notes source, notes)
+_user_snapshot: tuple = (None, None)  # (signature, data)
 
-def load_memory() -> dict:
-    _ensure_dirs()
-    if not MEMORY_FILE.exists():
-        return {"notes": [], "session_note": "", "history": []}
-    with open(MEMORY_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+
+def _ensure_dirs():
+    DATA_DIR.mkdir(exist_ok=True)
 
 
-def save_memory(data: dict):
-    _ensure_dirs()
-    with open(MEMORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+def _memory_lock() -> storage.FileLock:
+    return storage.file_lock(storage.MEMORY_LOCK)
+
+
+def _migrate_memory_file():
+    """Split a memory file from an older version into the notes, session note and history stores."""
+    global _memory_file_checked
+    if _memory_file_checked:
+        return
+    with _memory_lock().locked():
+        legacy = storage.memory_path()
+        if legacy.exists():
+            mem = serialization.read_file(legacy)
+            if not _notes_file.exists():
+                _notes_file.write({"notes": mem.get("notes", [])})
+            if not _session_file.exists():
+                _session_file.write({"session_note": mem.get("session_note", "")})
+            if not _history.exists():
+                _history.replace(mem.get("history", []))
+            # kept as a backup, like the single file after a sharded migration
+            legacy.replace(legacy.with_name(legacy.name + ".bak"))
+        _memory_file_checked = True
+
+
+def export_memory() -> dict:
+    """Notes, session note and history as stored by the JSON backend."""
+    _migrate_memory_file()
+    return {
+        "notes": _notes_file.read().get("notes", []),
+        "session_note": _session_file.read().get("session_note", ""),
+        "history": _history.load(),
+    }
+
+
+def convert_format():
+    """Rewrite the notes in the configured storage format."""
+    _migrate_memory_file()
+    with _memory_lock().locked():
+        if _notes_file.exists():
+            _notes_file.write(_notes_file.read())
+
+
+def _note_text(n: Note) -> str:
+    return n.text + " " + " ".join(n.tags)
+
+
+def _notes_source() -> list:
+    db = storage.sqlite_repository()
+    if db:
+        return ["sqlite", db.load_meta("memory_version")]
+    _migrate_memory_file()
+    return _notes_file.signature()
+
+
+def _history_source() -> list:
+    db = storage.sqlite_repository()
+    if db:
+        return ["sqlite", db.load_meta("memory_version")]
+    return _history_store().version()
+
+
+def _index_source() -> list:
+    """Version of the notes and history, as recorded by the search index."""
+    return _notes_source() + _history_source()
+
+
+def _search_index() -> search_index.MemoryIndex:
+    """Return the search index, rebuilt first if the memory changed without it."""
+    index = search_index.memory_index(SEARCH_INDEX_FILE)
+    if not index.current(_index_source()):
+        with _memory_lock().locked():
+            source = _index_source()
+            if not index.current(source):
+                index.rebuild(
+                    source,
+                    {n.id: _note_text(n) for n in _view_notes()},
+                    dict(enumerate(h.get("text", "") for h in load_history())),
+                )
+    return index
+
+
+def rebuild_search_index() -> search_index.MemoryIndex:
+    """Index every note and message from scratch."""
+    with _memory_lock().locked():
+        index = search_index.memory_index(SEARCH_INDEX_FILE)
+        index.rebuild(
+            _index_source(),
+            {n.id: _note_text(n) for n in _view_notes()},
+            dict(enumerate(h.get("text", "") for h in load_history())),
+        )
+    return index
+
+
+@contextmanager
+def _indexed_write():
+    """Hold the memory lock around a write and pass its changes on to the search index.
+
+    The block fills the yielded dict with ``replace``/``append`` arguments for
+    ``MemoryIndex.update``.
+    """
+    with _memory_lock().locked():
+        before = _index_source()
+        changes = {}
+        yield changes
+        db = storage.sqlite_repository()
+        if db:
+            db.save_meta("memory_version", str(time.time_ns()))
+        search_index.memory_index(SEARCH_INDEX_FILE).update(before, _index_source(), **changes)
 
 
 def load_notes() -> List[Note]:
-    mem = load_memory()
-    return [Note.from_dict(n) for n in mem.get("notes", [])]
+    db = storage.sqlite_repository()
+    if db:
+        return [Note.from_dict(n) for n in db.load_notes()]
+    _migrate_memory_file()
+    return [Note.from_dict(n) for n in _notes_file.read().get("notes", [])]
+
+
+def _view_notes() -> List[Note]:
+    """The stored notes, built once per version and shared: do not modify them."""
+    global _notes_snapshot
+    source = _notes_source()
+    with _snapshot_lock:
+        cached_source, notes = _notes_snapshot
+    if cached_source == source:
+        return notes
+    notes = load_notes()
+    with _snapshot_lock:
+        _notes_snapshot = (source, notes)
+    return notes
 
 
 def save_notes(notes: List[Note]):
-    mem = load_memory()
-    mem["notes"] = [n.to_dict() for n in notes]
-    save_memory(mem)
+    with _indexed_write() as changes:
+        db = storage.sqlite_repository()
+        if db:
+            db.save_notes([n.to_dict() for n in notes])
+        else:
+            _notes_file.write({"notes": [n.to_dict() for n in notes]})
+        changes["replace"] = {"notes": {n.id: _note_text(n) for n in notes}}
 
 
 def add_internal_note(text: str):
     """Store a note for the assistant only."""
-    notes = load_notes()
-    note_id = max([n.id for n in notes], default=0) + 1
-    notes.append(Note(id=note_id, text=text, internal=True))
-    save_notes(notes)
+    with _memory_lock().locked():
+        notes = load_notes()
+        note_id = max([n.id for n in notes], default=0) + 1
+        notes.append(Note(id=note_id, text=text, internal=True))
+        save_notes(notes)
 
 
 def load_custom_session_note() -> str:
-    mem = load_memory()
-    return mem.get("session_note", "")
+    db = storage.sqlite_repository()
+    if db:
+        return db.load_meta("session_note")
+    _migrate_memory_file()
+    return _session_file.read().get("session_note", "")
 
 
 def save_custom_session_note(text: str):
-    mem = load_memory()
-    mem["session_note"] = text
-    save_memory(mem)
+    db = storage.sqlite_repository()
+    if db:
+        db.save_meta("session_note", text)
+        return
+    _migrate_memory_file()
+    _session_file.write({"session_note": text})
 
 
 def load_user() -> User:
-    if not PERSONALITY_FILE.exists():
+    global _user_snapshot
+    signature = storage._file_signature(PERSONALITY_FILE)
+    if signature is None:
         return User()
-    with open(PERSONALITY_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with _snapshot_lock:
+        cached_signature, data = _user_snapshot
+    if cached_signature != signature:
+        with open(PERSONALITY_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with _snapshot_lock:
+            _user_snapshot = (signature, data)
     return User.from_dict(data)
 
 
 def save_user(user: User):
     _ensure_dirs()
-    with open(PERSONALITY_FILE, "w", encoding="utf-8") as f:
-        json.dump(user.to_dict(), f, indent=2, ensure_ascii=False)
+    serialization.write_file(PERSONALITY_FILE, user.to_dict())
 
 
 def generate_session_note(projects: List, notes: List[Note], user: User) -> str:
@@ -80,13 +232,10 @@ def generate_session_note(projects: List, notes: List[Note], user: User) -> str:
     today = datetime.utcnow().date()
     for p in projects:
         for t in p.tasks:
-            if t.status == "done" or not t.deadline:
+            if t.status == "done":
                 continue
-            try:
-                d = datetime.fromisoformat(t.deadline)
-            except ValueError:
-                continue
-            if 0 <= (d.date() - today).days <= 7:
+            d = t.deadline_at
+            if d and 0 <= (d.date() - today).days <= 7:
                 upcoming.append(f"{p.name}:{t.name}({d.date()})")
     msg = f"Hello {user.name}. "
     if upcoming:
@@ -102,43 +251,49 @@ def generate_session_note(projects: List, notes: List[Note], user: User) -> str:
     return msg[:500]
 
 
+def _history_store() -> HistoryStore:
+    _migrate_memory_file()
+    return _history
+
+
 def load_history() -> list:
-    mem = load_memory()
-    return list(mem.get("history", []))
+    db = storage.sqlite_repository()
+    if db:
+        return db.load_history()
+    return _history_store().load()
 
 
 def save_history(history: list):
-    mem = load_memory()
-    mem["history"] = history
-    save_memory(mem)
+    with _indexed_write() as changes:
+        db = storage.sqlite_repository()
+        if db:
+            db.save_history(history)
+        else:
+            _history_store().replace(history)
+        changes["replace"] = {"history": dict(enumerate(h.get("text", "") for h in history))}
 
 
 def append_history(role: str, text: str):
-    history = load_history()
-    history.append({"role": role, "text": text, "ts": datetime.utcnow().isoformat()})
-    save_history(history)
-
-
-
-def _score(text: str, tokens: list[str]) -> float:
-    words = set(re.findall(r"\w+", text.lower()))
-    if not words:
-        return 0.0
-    matched = sum(1 for t in tokens if t in words)
-    return matched / len(tokens) if tokens else 0.0
+    item = {"role": role, "text": text, "ts": datetime.utcnow().isoformat()}
+    with _indexed_write() as changes:
+        db = storage.sqlite_repository()
+        if db:
+            db.append_history(item)
+        else:
+            _history_store().append(item)
+        changes["append"] = {"history": text}
 
 
 def search_history(query: str, limit: int = 3) -> list:
-    """Return most relevant past messages."""
-    history = load_history()
-    tokens = re.findall(r"\w+", query.lower())
-    scored = []
-    for item in history:
-        score = _score(item.get("text", ""), tokens)
-        if score:
-            scored.append((score, item))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [item for _score_val, item in scored[:limit]]
+    """Return most relevant past messages, ranked by BM25."""
+    hits = _search_index().search("history", query, limit)
+    if not hits:
+        return []
+    if storage.sqlite_repository():
+        history = dict(enumerate(load_history()))
+    else:
+        history = _history_store().get(key for _score, key in hits)
+    return [history[key] for _score, key in hits if key in history]
 
 
 def search_notes(
@@ -147,31 +302,225 @@ def search_notes(
     limit: int = 3,
     include_internal: bool = False,
 ) -> list[Note]:
+    """Return the notes most relevant to ``query``, ranked by BM25.
+
+    The stored notes are searched through the persistent index; an explicit
+    ``notes`` list is indexed on the fly.
+    """
+    def accept(key: int) -> bool:
+        n = by_key.get(key)
+        return n is not None and (include_internal or not n.internal)
+
     if notes is None:
-        notes = load_notes()
-    tokens = re.findall(r"\w+", query.lower())
-    scored: list[tuple[float, Note]] = []
-    for n in notes:
-        if not include_internal and n.internal:
+        by_key = {n.id: n for n in _view_notes()}
+        hits = _search_index().search("notes", query, limit, accept)
+    else:
+        by_key = dict(enumerate(notes))
+        index = search_index.BM25Index()
+        for key, n in by_key.items():
+            index.add(key, _note_text(n))
+        hits = index.search(query, limit, accept)
+    if notes is None:
+        # the stored notes are shared, hand out copies
+        return [Note.from_dict(by_key[key].to_dict()) for _score, key in hits]
+    return [by_key[key] for _score, key in hits]
+
+
+_vectors: dict = {}
+_vectors_lock = threading.Lock()
+
+
+def _sync_history_vectors(index: vector_index.VectorIndex, source: list):
+    """Embed the messages added since ``index`` was last synced."""
+    if storage.sqlite_repository() is None and index.source and index.source[0] == source[0]:
+        # same history generation: it only grew
+        start = len(index)
+        if start <= source[1]:
+            new = _history_store().get(range(start, source[1]))
+            index.add_many((seq, new[seq].get("text", "")) for seq in sorted(new))
+            return
+    index.sync(dict(enumerate(h.get("text", "") for h in load_history())))
+
+
+def _vector_indexes():
+    """Return the notes and history vector indexes brought up to date, or None without NumPy.
+
+    Only notes and messages that are new or changed since the last call are
+    embedded. With ``"vector_file": true`` in the storage settings the
+    history matrix is memory-mapped from ``history_vectors.f32`` and reused
+    by the next process.
+    """
+    if not vector_index.available():
+        return None
+    with _vectors_lock:
+        if not _vectors:
+            _vectors["notes"] = vector_index.VectorIndex()
+            if storage.storage_settings().get("vector_file"):
+                _vectors["history"] = vector_index.VectorIndex.open(HISTORY_VECTORS_FILE)
+            else:
+                _vectors["history"] = vector_index.VectorIndex()
+            _vectors["saved"] = len(_vectors["history"])
+        notes, history = _vectors["notes"], _vectors["history"]
+        source = _notes_source()
+        if notes.source != source:
+            notes.sync({n.id: _note_text(n) for n in _view_notes()})
+            notes.source = source
+        source = _history_source()
+        if history.source != source:
+            # a shared vector file is only changed, rebuilt and saved under the memory lock
+            with _memory_lock().locked() if history.path else nullcontext():
+                if history.stale():
+                    history = _vectors["history"] = vector_index.VectorIndex.open(HISTORY_VECTORS_FILE)
+                    _vectors["saved"] = len(history)
+                inode = history.inode
+                _sync_history_vectors(history, source)
+                history.source = source
+                if history.inode != inode or abs(len(history) - _vectors["saved"]) >= VECTOR_SAVE_EVERY:
+                    history.save()
+                    _vectors["saved"] = len(history)
+    return notes, history
+
+
+def _blend(lexical: list, semantic: list, weight: float) -> list:
+    """Merge (score, key) lists, each scaled by its best score, into one ranking."""
+    combined = {}
+    for hits, w in ((lexical, 1 - weight), (semantic, weight)):
+        if not hits or not w:
             continue
-        combined = n.text + " " + " ".join(n.tags)
-        score = _score(combined, tokens)
-        if score:
-            scored.append((score, n))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [n for _score_val, n in scored[:limit]]
-
-
-def get_context(query: str, max_chars: int | None = None, include_internal: bool = False) -> str:
-    """Return a short summary of history and notes related to the query."""
-    if max_chars is None:
-        max_chars = load_user().context_chars
-    notes = search_notes(query, include_internal=include_internal)
-    hist = search_history(query)
+        best = hits[0][0]
+        for score, key in hits:
+            combined[key] = combined.get(key, 0.0) + w * score / best
+    return sorted(((s, k) for k, s in combined.items()), key=lambda sk: (-sk[0], sk[1]))
+
+
+def _render_context(notes: List[str], messages: List[str]) -> str:
     parts = []
     if notes:
-        parts.append("Notes: " + "; ".join(n.text for n in notes))
-    if hist:
-        parts.append("Messages: " + "; ".join(h["text"] for h in hist))
-    ctx = " ".join(parts)
+        parts.append("Notes: " + "; ".join(notes))
+    if messages:
+        parts.append("Messages: " + "; ".join(messages))
+    return " ".join(parts)
+
+
+_notes_index = note_index.NoteIndex()
+_notes_index_lock = threading.Lock()
+
+
+def _note_index() -> note_index.NoteIndex:
+    """Return the trigram index of the notes, re-indexing the notes added or edited since the last call."""
+    with _notes_index_lock:
+        source = _notes_source()
+        if _notes_index.source != source:
+            _notes_index.sync(_view_notes())
+            _notes_index.source = source
+    return _notes_index
+
+
+def find_notes(
+    query: str,
+    mode: str = "auto",
+    max_edits: int | None = None,
+    include_internal: bool = False,
+) -> list[tuple[Note, int, int]]:
+    """Return (note, match kind, edits) for notes matching ``query``, best first.
+
+    See ``NoteIndex.search`` for the modes and the ranking.
+    """
+    index = _note_index()
+    with _notes_index_lock:
+        hits = index.search(query, mode, max_edits)
+    by_id = {n.id: n for n in _view_notes()}
+    return [
+        (Note.from_dict(by_id[i].to_dict()), kind, edits)
+        for i, kind, edits in hits
+        if i in by_id and (include_internal or not by_id[i].internal)
+    ]
+
+
+def notes_with_tag(tag: str) -> List[Note]:
+    """Return the notes carrying ``tag``, in id order."""
+    index = _note_index()
+    with _notes_index_lock:
+        ids = index.with_tag(tag)
+    return [Note.from_dict(n.to_dict()) for n in _view_notes() if n.id in ids]
+
+
+_context_lock = threading.Lock()
+_context_cache: OrderedDict = OrderedDict()
+_context_source = None
+
+
+def get_context(
+    query: str,
+    max_chars: int | None = None,
+    include_internal: bool = False,
+    semantic_weight: float | None = None,
+) -> str:
+    """Return a short summary of history and notes related to the query.
+
+    Notes and messages are ranked by BM25 blended with the cosine similarity
+    of their n-gram vectors (``semantic_weight``, from the user settings by
+    default), then the best ones are added while the text fits in ``max_chars``.
+    The last ``CONTEXT_CACHE_SIZE`` results are cached until the notes or the
+    history change, so repeating a query costs a few ``stat`` calls.
+    """
+    global _context_source
+    if max_chars is None or semantic_weight is None:
+        user = load_user()
+        max_chars = user.context_chars if max_chars is None else max_chars
+        semantic_weight = user.semantic_weight if semantic_weight is None else semantic_weight
+    # ranking only depends on the lowercased words of the query
+    key = (tuple(search_index.tokenize(query)), max_chars, include_internal, semantic_weight)
+    source = _index_source()
+    with _context_lock:
+        if _context_source != source:
+            _context_cache.clear()
+            _context_source = source
+        ctx = _context_cache.get(key)
+        if ctx is not None:
+            _context_cache.move_to_end(key)
+            return ctx
+    ctx = _build_context(query, max_chars, include_internal, semantic_weight)
+    with _context_lock:
+        if _context_source == source:
+            _context_cache[key] = ctx
+            if len(_context_cache) > CONTEXT_CACHE_SIZE:
+                _context_cache.popitem(last=False)
+    return ctx
+
+
+def _build_context(query: str, max_chars: int, include_internal: bool, semantic_weight: float) -> str:
+    all_notes = {n.id: n for n in _view_notes()}
+
+    def accept(key: int) -> bool:
+        n = all_notes.get(key)
+        return n is not None and (include_internal or not n.internal)
+
+    index = _search_index()
+    lexical_notes = index.search("notes", query, CONTEXT_CANDIDATES, accept)
+    lexical_history = index.search("history", query, CONTEXT_CANDIDATES)
+    semantic_notes: list = []
+    semantic_history: list = []
+    vectors = _vector_indexes() if semantic_weight > 0 else None
+    if vectors is not None:
+        semantic_notes = [h for h in vectors[0].search(query, CONTEXT_CANDIDATES, accept) if h[0] >= MIN_SIMILARITY]
+        semantic_history = [h for h in vectors[1].search(query, CONTEXT_CANDIDATES) if h[0] >= MIN_SIMILARITY]
+    ranked_history = _blend(lexical_history, semantic_history, semantic_weight)
+    if storage.sqlite_repository():
+        messages = dict(enumerate(load_history()))
+    else:
+        messages = _history_store().get(k for _s, k in ranked_history)
+
+    candidates = [(s, "note", all_notes[k].text) for s, k in _blend(lexical_notes, semantic_notes, semantic_weight)]
+    candidates += [(s, "message", messages[k].get("text", "")) for s, k in ranked_history if k in messages]
+    candidates.sort(key=lambda c: -c[0])
+    chosen = {"note": [], "message": []}
+    for _score, kind, text in candidates:
+        chosen[kind].append(text)
+        if len(_render_context(chosen["note"], chosen["message"])) > max_chars:
+            chosen[kind].pop()
+    ctx = _render_context(chosen["note"], chosen["message"])
+    if not ctx and candidates:
+        _score, kind, text = candidates[0]
+        ctx = _render_context([text] if kind == "note" else [], [text] if kind == "message" else [])
     return ctx[:max_chars]
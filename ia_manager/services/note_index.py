@@ -0,0 +1,248 @@
+"""Trigram index over note text and tags.
+
+Two levels: the trigrams of each note's text and tags point to the notes,
+which answers substring and word-prefix queries by intersecting a few
+posting sets before checking the survivors; the trigrams of every distinct
+word point to the words, which narrows fuzzy queries to the words sharing
+enough trigrams with the query word before computing edit distances. A
+tag → note ids map serves tag filters.
+"""
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from ..models.note import Note
+
+EXACT, PREFIX, SUBSTRING, FUZZY = range(4)
+MODES = ("auto", "substring", "prefix", "fuzzy")
+WORD_RE = re.compile(r"\w+")
+
+
+def _grams(s: str) -> Set[str]:
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def _normalize(s: str) -> str:
+    return " ".join(s.lower().split())
+
+
+def _fields(note: Note) -> List[str]:
+    return [_normalize(note.text)] + [_normalize(t) for t in note.tags]
+
+
+def _fingerprint(note: Note) -> int:
+    return zlib.crc32("\x00".join([note.text, *note.tags]).encode("utf-8"))
+
+
+def default_edits(word: str) -> int:
+    """Edits allowed for a query word: none below 3 letters, 1 up to 5, then 2."""
+    if len(word) < 3:
+        return 0
+    return 1 if len(word) <= 5 else 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Edit distance of ``a`` and ``b``, or ``limit + 1`` once it exceeds ``limit``.
+
+    Insertions, deletions, substitutions and swaps of two adjacent letters
+    count as one edit each (optimal string alignment).
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        best = i
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+            best = min(best, cost)
+        if best > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+
+class NoteIndex:
+    """Substring, prefix, fuzzy and tag lookups over a set of notes."""
+
+    def __init__(self):
+        self.postings: Dict[str, Set[int]] = {}  # field trigram -> note ids
+        self.vocabulary: Dict[str, Set[int]] = {}  # word -> note ids
+        self.word_grams: Dict[str, Set[str]] = {}  # padded word trigram -> words
+        self.tags: Dict[str, Set[int]] = {}
+        self.fields: Dict[int, List[str]] = {}
+        self.fingerprints: Dict[int, int] = {}
+        self.source = None
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def add(self, note: Note):
+        self.remove(note.id)
+        fields = _fields(note)
+        self.fields[note.id] = fields
+        self.fingerprints[note.id] = _fingerprint(note)
+        for field in fields:
+            # the leading space lets word prefixes be looked up too
+            for gram in _grams(f" {field}"):
+                self.postings.setdefault(gram, set()).add(note.id)
+            for word in WORD_RE.findall(field):
+                ids = self.vocabulary.get(word)
+                if ids is None:
+                    ids = self.vocabulary[word] = set()
+                    for gram in _grams(f" {word} "):
+                        self.word_grams.setdefault(gram, set()).add(word)
+                ids.add(note.id)
+        for tag in note.tags:
+            self.tags.setdefault(tag, set()).add(note.id)
+
+    def remove(self, note_id: int):
+        fields = self.fields.pop(note_id, None)
+        if fields is None:
+            return
+        del self.fingerprints[note_id]
+        for field in fields:
+            for gram in _grams(f" {field}"):
+                ids = self.postings.get(gram)
+                if ids is not None:
+                    ids.discard(note_id)
+                    if not ids:
+                        del self.postings[gram]
+            for word in WORD_RE.findall(field):
+                ids = self.vocabulary.get(word)
+                if ids is None:
+                    continue
+                ids.discard(note_id)
+                if not ids:
+                    del self.vocabulary[word]
+                    for gram in _grams(f" {word} "):
+                        words = self.word_grams[gram]
+                        words.discard(word)
+                        if not words:
+                            del self.word_grams[gram]
+        for tag in [t for t, ids in self.tags.items() if note_id in ids]:
+            self.tags[tag].discard(note_id)
+            if not self.tags[tag]:
+                del self.tags[tag]
+
+    def sync(self, notes: Iterable[Note]) -> int:
+        """Make the index hold exactly ``notes``, re-indexing only new or edited ones."""
+        notes = list(notes)
+        keep = {n.id for n in notes}
+        for note_id in [i for i in self.fields if i not in keep]:
+            self.remove(note_id)
+        changed = [n for n in notes if self.fingerprints.get(n.id) != _fingerprint(n)]
+        for n in changed:
+            self.add(n)
+        return len(changed)
+
+    def with_tag(self, tag: str) -> Set[int]:
+        return set(self.tags.get(tag, ()))
+
+    def _candidates(self, grams: Set[str]) -> Set[int]:
+        """Notes containing every trigram in ``grams``; all notes when there is none."""
+        if not grams:
+            return set(self.fields)
+        sets = sorted((self.postings.get(g, set()) for g in grams), key=len)
+        result = set(sets[0])
+        for s in sets[1:]:
+            if not result:
+                break
+            result &= s
+        return result
+
+    def _substring(self, query: str, prefix_only: bool) -> Dict[int, Tuple[int, int]]:
+        word_start = f" {query}"
+        whole_word = f" {query} "
+        grams = _grams(word_start) if prefix_only else _grams(query)
+        fields = self.fields
+        found = {}
+        for note_id in self._candidates(grams):
+            best = None
+            for field in fields[note_id]:
+                if query not in field:
+                    continue
+                padded = f" {field} "
+                if whole_word in padded:
+                    kind = EXACT
+                elif word_start in padded:
+                    kind = PREFIX
+                elif prefix_only:
+                    continue
+                else:
+                    kind = SUBSTRING
+                if best is None or kind < best:
+                    best = kind
+            if best is not None:
+                found[note_id] = (best, 0)
+        return found
+
+    def _similar_words(self, word: str, limit: int) -> Dict[str, int]:
+        """Words of the vocabulary within ``limit`` edits of ``word``, with their distance."""
+        grams = _grams(f" {word} ")
+        # q-gram lemma: an edit changes at most 3 trigrams of the padded word, a swap 4
+        needed = len(grams) - 4 * limit
+        if needed > 0:
+            counts: Dict[str, int] = {}
+            for gram in grams:
+                for w in self.word_grams.get(gram, ()):
+                    counts[w] = counts.get(w, 0) + 1
+            candidates = [w for w, c in counts.items() if c >= needed]
+        else:
+            candidates = list(self.vocabulary)
+        found = {}
+        for w in candidates:
+            d = edit_distance(word, w, limit)
+            if d <= limit:
+                found[w] = d
+        return found
+
+    def _fuzzy(self, query: str, max_edits: Optional[int]) -> Dict[int, Tuple[int, int]]:
+        """Notes with a word close to each query word; ranked by the total number of edits."""
+        total: Optional[Dict[int, int]] = None
+        words = WORD_RE.findall(query)
+        if not words:
+            return {}
+        for word in words:
+            limit = default_edits(word) if max_edits is None else max_edits
+            best: Dict[int, int] = {}
+            for w, d in self._similar_words(word, limit).items():
+                for note_id in self.vocabulary[w]:
+                    if d < best.get(note_id, limit + 1):
+                        best[note_id] = d
+            if total is None:
+                total = best
+            else:
+                total = {i: total[i] + d for i, d in best.items() if i in total}
+            if not total:
+                return {}
+        return {i: (EXACT if d == 0 else FUZZY, d) for i, d in total.items()}
+
+    def search(self, query: str, mode: str = "auto", max_edits: Optional[int] = None) -> List[Tuple[int, int, int]]:
+        """Return (note id, match kind, edits) for the matching notes, best first.
+
+        ``substring`` finds the query anywhere in the text or a tag,
+        ``prefix`` at the start of a word, ``fuzzy`` words within
+        ``max_edits`` edits of each query word (by default 1 for up to 5
+        letters, 2 above). ``auto`` combines them. Exact word matches rank
+        first, then word prefixes, substrings and fuzzy matches by number of
+        edits; newer notes (higher ids) come first within a rank.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        query = _normalize(query)
+        if not query:
+            return []
+        found: Dict[int, Tuple[int, int]] = {}
+        if mode in ("auto", "substring", "prefix"):
+            found = self._substring(query, prefix_only=mode == "prefix")
+        if mode in ("auto", "fuzzy"):
+            for note_id, match in self._fuzzy(query, max_edits).items():
+                if note_id not in found or match < found[note_id]:
+                    found[note_id] = match
+        ranked = sorted(found.items(), key=lambda item: (item[1], -item[0]))
+        return [(note_id, kind, edits) for note_id, (kind, edits) in ranked]
@@ -1,30 +1,645 @@
-from datetime import date, datetime
-from typing import List
+import heapq
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
 from ..models.project import Project
+from ..models.task import Task
+from . import storage
 
 
-def suggest_tasks(projects: List[Project]) -> List[str]:
-    """Return a simple list of task descriptions sorted by priority and importance."""
-    pending = []
+class Suggestion(NamedTuple):
+    project_id: int
+    task_id: int
+    score: float  # higher first among tasks planned at the same time
+    project: str
+    task: str
+    planned_start: Optional[str]
+
+    def __str__(self) -> str:
+        return f"{self.project} - {self.task}"
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+def score(priority: int, importance: int) -> float:
+    """Project priority first (1 is the highest), then task importance."""
+    importance = max(importance, 0)
+    return importance / (importance + 1) - priority
+
+
+def task_score(project: Project, task: Task) -> float:
+    return score(project.priority, task.importance)
+
+
+def _pending(projects: Iterable[Project]) -> Iterable[Tuple[datetime, float, int, int, int, Project, Task]]:
+    order = 0
     for project in projects:
         for task in project.tasks:
             if task.status != "done":
-                pending.append((project, task))
-
-    def sort_key(pt):
-        p, t = pt
-        start = None
-        if t.planned_start:
-            try:
-                start = datetime.fromisoformat(t.planned_start)
-            except ValueError:
-                start = None
-        return (
-            start or datetime.max,
-            p.priority,
-            -t.importance,
-        )
+                order += 1
+                # planned tasks first by start, then by score, then by project and task id like
+                # the recommendation queue; the unique order ends the comparison
+                key = (task.planned_start_at or datetime.max, -task_score(project, task), project.id, task.id)
+                yield (*key, order, project, task)
+
+
+def suggest_tasks(projects: List[Project], k: Optional[int] = None) -> List[Suggestion]:
+    """Return the ``k`` pending tasks to do first (all of them when ``k`` is None).
+
+    Ties are broken by project id, then task id. Each task's sort key is
+    computed once and only the best ``k`` are kept in a bounded heap, so
+    asking for a few suggestions does not sort every task.
+    """
+    if k is None:
+        ranked = sorted(_pending(projects))
+    elif k <= 0:
+        return []
+    else:
+        ranked = heapq.nsmallest(k, _pending(projects))
+    return [
+        Suggestion(p.id, t.id, -neg_score, p.name, t.name, t.planned_start)
+        for _start, neg_score, _pid, _tid, _order, p, t in ranked
+    ]
+
+
+# Scheduling ---------------------------------------------------------------
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+# used when config.json has no availability at all
+DEFAULT_AVAILABILITY = {day: ["09:00-12:00", "14:00-18:00"] for day in WEEKDAYS[:5]}
+DEFAULT_TASK_HOURS = 1.0
+MIN_TASK_HOURS = 0.25
+FILL_WINDOW = 8  # tasks after the most urgent one considered to fill a gap
+
+
+class Block(NamedTuple):
+    project_id: int
+    task_id: int
+    start: datetime
+    end: datetime
+    fixed: bool = False  # planned beforehand, kept as is
+
+    @property
+    def hours(self) -> float:
+        return (self.end - self.start).total_seconds() / 3600
+
+    def to_dict(self) -> dict:
+        return {
+            "project_id": self.project_id,
+            "task_id": self.task_id,
+            "start": self.start.isoformat(timespec="minutes"),
+            "end": self.end.isoformat(timespec="minutes"),
+            "fixed": self.fixed,
+        }
+
+
+class Schedule(NamedTuple):
+    blocks: List[Block]  # by start time
+    unscheduled: List[Tuple[int, int]]  # (project id, task id) not finished within the horizon
+    late: List[Tuple[int, int]]  # finished after their deadline
+    unplaced_hours: float = 0.0  # work of the unscheduled tasks left outside the horizon
+
+    def on(self, day: date) -> List[Block]:
+        return [b for b in self.blocks if b.start.date() == day]
+
+
+def parse_availability(availability: Optional[dict]) -> Dict[int, List[Tuple[time, time]]]:
+    """Map each weekday (0 is Monday) to its ``"HH:MM-HH:MM"`` ranges from config.json."""
+    if not availability:
+        availability = DEFAULT_AVAILABILITY
+    hours: Dict[int, List[Tuple[time, time]]] = {}
+    for name, ranges in availability.items():
+        if name not in WEEKDAYS:
+            raise ValueError(f"Unknown day in availability: {name}")
+        day = hours.setdefault(WEEKDAYS.index(name), [])
+        for text in ranges:
+            start, _, end = text.partition("-")
+            start_at, end_at = time.fromisoformat(start.strip()), time.fromisoformat(end.strip())
+            if end_at <= start_at:
+                raise ValueError(f"Empty availability range: {text}")
+            day.append((start_at, end_at))
+        day.sort()
+    return hours
+
+
+def _naive(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def task_hours(task: Task) -> float:
+    """Hours of work left: planned or estimated hours minus the time already spent."""
+    total = task.planned_hours or task.estimated or DEFAULT_TASK_HOURS
+    return max(total - task.time_spent / 3600, MIN_TASK_HOURS)
+
+
+def due_at(project: Project, task: Task) -> Optional[datetime]:
+    """End of the day the task is due: its own deadline, else the project's."""
+    due = task.deadline_at
+    if not due and project.deadline:
+        try:
+            due = datetime.fromisoformat(project.deadline)
+        except ValueError:
+            due = None
+    if not due:
+        return None
+    return datetime.combine(_naive(due).date() + timedelta(days=1), time())
+
+
+def planned_block(project: Project, task: Task) -> Optional[Block]:
+    """The block ``task`` is planned for, or None without a valid planned start.
+
+    It ends at ``planned_end``, else after the planned or estimated hours.
+    """
+    start = task.planned_start_at
+    if not start:
+        return None
+    start = _naive(start)
+    end = task.planned_end_at
+    end = _naive(end) if end else start + timedelta(hours=task.planned_hours or task.estimated or DEFAULT_TASK_HOURS)
+    return Block(project.id, task.id, start, max(end, start), True)
+
+
+class _MaxTree:
+    """Segment tree answering "which values exceed x" over a prefix, "first value >= x" and range maxima."""
+
+    def __init__(self, values: list, empty):
+        size = 1
+        while size < len(values):
+            size *= 2
+        self.size = size
+        self.empty = empty
+        tree = [empty] * (2 * size)
+        tree[size:size + len(values)] = values
+        for i in range(size - 1, 0, -1):
+            tree[i] = max(tree[2 * i], tree[2 * i + 1])
+        self.tree = tree
+
+    def above(self, stop: int, bound) -> List[int]:
+        """Positions before ``stop`` holding a value greater than ``bound``, in order."""
+        found = []
+        stack = [(1, 0, self.size)]
+        tree = self.tree
+        while stack:
+            node, lo, hi = stack.pop()
+            if lo >= stop or tree[node] <= bound:
+                continue
+            if node >= self.size:
+                found.append(lo)
+                continue
+            mid = (lo + hi) // 2
+            stack.append((2 * node + 1, mid, hi))
+            stack.append((2 * node, lo, mid))
+        return found
+
+    def first(self, begin: int, bound) -> Optional[int]:
+        """First position from ``begin`` holding a value of at least ``bound``."""
+        tree = self.tree
+
+        def descend(node: int, lo: int, hi: int) -> Optional[int]:
+            if hi <= begin or tree[node] < bound:
+                return None
+            if node >= self.size:
+                return lo
+            mid = (lo + hi) // 2
+            found = descend(2 * node, lo, mid)
+            return found if found is not None else descend(2 * node + 1, mid, hi)
+
+        return descend(1, 0, self.size)
+
+    def top(self, begin: int, stop: int):
+        """Largest value at the positions [begin, stop)."""
+        tree = self.tree
+        best = self.empty
+        lo, hi = begin + self.size, stop + self.size
+        while lo < hi:
+            if lo & 1:
+                best = max(best, tree[lo])
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                best = max(best, tree[hi])
+            lo //= 2
+            hi //= 2
+        return best
+
+
+INDEX_BUCKET = 128  # a bucket of the interval index is split past twice this many blocks
+
+
+def _block_key(b: Block) -> tuple:
+    return (b.start, b.end, b.project_id, b.task_id)
+
 
-    pending.sort(key=sort_key)
-    suggestions = [f"{p.name} - {t.name}" for p, t in pending]
-    return suggestions
+class _Bucket:
+    """Consecutive blocks of the index, never modified once built."""
+
+    __slots__ = ("blocks", "keys", "end", "gap")
+
+    def __init__(self, blocks: List[Block]):
+        self.blocks = blocks
+        self.keys = [_block_key(b) for b in blocks]
+        end = blocks[0].end
+        gap = 0.0
+        for b in blocks[1:]:
+            if b.start > end:
+                gap = max(gap, (b.start - end).total_seconds())
+            end = max(end, b.end)
+        self.end = end  # latest end
+        # widest free time between its blocks; blocks of earlier buckets may cover part of it
+        self.gap = gap
+
+
+class IntervalIndex:
+    """Planned blocks sorted by start, for conflict and free-time queries.
+
+    The blocks are kept in sorted buckets of up to ``2 * INDEX_BUCKET``. A
+    max-tree over the bucket ends finds the buckets overlapping a range, and
+    one over the widest free time each bucket may hold finds the first
+    bucket where a slot can start, so both queries read O(log n) nodes and
+    the few buckets they land on. ``updated()`` returns a new index for a
+    save of the projects: only the blocks of the tasks that changed are moved,
+    and the buckets they leave alone are shared.
+    """
+
+    def __init__(self, blocks: Iterable[Block] = (), tasks: Optional[dict] = None):
+        ordered = sorted(blocks, key=_block_key)
+        self.tasks = tasks or {}  # (project id, task id) -> (project, task)
+        self._blocks = {(b.project_id, b.task_id): b for b in ordered}
+        self._buckets = [_Bucket(ordered[i:i + INDEX_BUCKET]) for i in range(0, len(ordered), INDEX_BUCKET)]
+        self._summarize()
+
+    def _summarize(self):
+        buckets = self._buckets
+        self._firsts = [b.keys[0] for b in buckets]
+        self._first_starts = [b.blocks[0].start for b in buckets]
+        self._ends = _MaxTree([b.end for b in buckets], datetime.min)
+        # free time that may start in each bucket: before its first block (the
+        # previous buckets end at least at their latest end) or between its blocks
+        rooms = [
+            max(b.gap, (b.blocks[0].start - buckets[i - 1].end).total_seconds()) if i else float("inf")
+            for i, b in enumerate(buckets)
+        ]
+        self._rooms = _MaxTree(rooms, -1.0)
+
+    @classmethod
+    def from_projects(cls, projects: Iterable[Project]) -> "IntervalIndex":
+        """Index the planned blocks of the tasks that are not done."""
+        blocks = []
+        tasks = {}
+        for p in projects:
+            for t in p.tasks:
+                if t.status == "done":
+                    continue
+                block = planned_block(p, t)
+                if block is not None:
+                    blocks.append(block)
+                    tasks[(p.id, t.id)] = (p, t)
+        return cls(blocks, tasks)
+
+    def updated(self, before: Dict[int, Project], after: Dict[int, Project]) -> "IntervalIndex":
+        """The index once the projects in ``before`` are replaced by those in ``after``.
+
+        Both map a project id to the project, as in ``storage.Change``; a
+        block is moved only when its task's block differs.
+        """
+        index = IntervalIndex.__new__(IntervalIndex)
+        index.tasks = dict(self.tasks)
+        index._blocks = dict(self._blocks)
+        index._buckets = list(self._buckets)
+        index._firsts = list(self._firsts)
+        for pid in before.keys() | after.keys():
+            current = {}
+            new = after.get(pid)
+            if new is not None:
+                for t in new.tasks:
+                    block = planned_block(new, t) if t.status != "done" else None
+                    if block is not None:
+                        current[(pid, t.id)] = (block, new, t)
+            old = before.get(pid)
+            if old is not None:
+                for t in old.tasks:
+                    ident = (pid, t.id)
+                    if ident not in current and ident in index._blocks:
+                        index._remove(ident)
+            for ident, (block, p, t) in current.items():
+                if index._blocks.get(ident) != block:
+                    if ident in index._blocks:
+                        index._remove(ident)
+                    index._insert(block)
+                index.tasks[ident] = (p, t)
+        index._summarize()
+        return index
+
+    def _insert(self, block: Block):
+        key = _block_key(block)
+        i = max(bisect_right(self._firsts, key) - 1, 0)
+        if i == len(self._buckets):
+            blocks = [block]
+        else:
+            blocks = list(self._buckets[i].blocks)
+            blocks.insert(bisect_right(self._buckets[i].keys, key), block)
+        if len(blocks) > 2 * INDEX_BUCKET:
+            parts = [_Bucket(blocks[:INDEX_BUCKET]), _Bucket(blocks[INDEX_BUCKET:])]
+        else:
+            parts = [_Bucket(blocks)]
+        self._buckets[i:i + 1] = parts
+        self._firsts[i:i + 1] = [b.keys[0] for b in parts]
+        self._blocks[(block.project_id, block.task_id)] = block
+
+    def _remove(self, ident: Tuple[int, int]):
+        block = self._blocks.pop(ident)
+        self.tasks.pop(ident, None)
+        key = _block_key(block)
+        i = bisect_right(self._firsts, key) - 1
+        bucket = self._buckets[i]
+        pos = bisect_left(bucket.keys, key)
+        blocks = bucket.blocks[:pos] + bucket.blocks[pos + 1:]
+        parts = [_Bucket(blocks)] if blocks else []
+        self._buckets[i:i + 1] = parts
+        self._firsts[i:i + 1] = [b.keys[0] for b in parts]
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def __iter__(self):
+        for bucket in self._buckets:
+            yield from bucket.blocks
+
+    def overlaps(self, start: datetime, end: datetime) -> List[Block]:
+        """Blocks sharing some time with [start, end), by start."""
+        stop = bisect_left(self._first_starts, end)
+        found = []
+        for i in self._ends.above(stop, start):
+            for b in self._buckets[i].blocks:
+                if b.start >= end:
+                    break
+                if b.end > start:
+                    found.append(b)
+        return found
+
+    def conflicts(self, block: Block) -> List[Block]:
+        """Blocks of other tasks overlapping ``block``."""
+        return [
+            b for b in self.overlaps(block.start, block.end)
+            if (b.project_id, b.task_id) != (block.project_id, block.task_id)
+        ]
+
+    def free_slot(self, after: datetime, hours: float) -> datetime:
+        """Start of the first free period of ``hours`` hours at or after ``after``."""
+        need = hours * 3600
+        buckets = self._buckets
+        cursor = after
+        # the bucket holding the last block starting by ``after``; earlier
+        # buckets only matter through how late they end
+        i = bisect_right(self._first_starts, after) - 1
+        if i >= 0:
+            cursor = max(cursor, self._ends.top(0, i))
+        else:
+            i = 0
+        while i < len(buckets):
+            for b in buckets[i].blocks:
+                if (b.start - cursor).total_seconds() >= need:
+                    return cursor
+                cursor = max(cursor, b.end)
+            # skip the buckets that cannot hold the slot, keeping their ends
+            nxt = self._rooms.first(i + 1, need)
+            if nxt is None:
+                return max(cursor, self._ends.top(i + 1, len(buckets)))
+            cursor = max(cursor, self._ends.top(i + 1, nxt))
+            i = nxt
+        return cursor
+
+
+_index_lock = threading.Lock()
+_cached_index: Tuple[Optional[list], Optional[IntervalIndex]] = (None, None)
+
+
+_session_index = threading.local()  # .entry: (session, index, {project id: project as indexed})
+
+
+def schedule_index() -> IntervalIndex:
+    """Return the interval index of the current projects.
+
+    It is built once and then follows the saves of this process through
+    ``storage.on_save``; it is built again when another process changed the
+    projects. Inside a storage session it follows the projects the session
+    copied to change them: each call moves the blocks of those projects only.
+    """
+    active = storage.current_session()
+    if active is not None:
+        return _session_schedule_index(active)
+    return _view_index(storage.view_projects())
+
+
+def _view_index(projects: "storage.ProjectList") -> IntervalIndex:
+    global _cached_index
+    with _index_lock:
+        source, index = _cached_index
+        if source is not projects:
+            index = IntervalIndex.from_projects(projects)
+            _cached_index = (projects, index)
+        return index
+
+
+def _session_schedule_index(active: "storage.Session") -> IntervalIndex:
+    projects = active.projects
+    entry = getattr(_session_index, "entry", None)
+    if entry is not None and entry[0] is active:
+        _session, index, indexed = entry
+    else:
+        # the session's projects start as a writable list over the cached ones
+        base = active.repo.view()
+        index, indexed = _view_index(base), {p.id: p for p in base}
+    after = {}
+    owned = set()
+    for p in projects:
+        # a project still shared with the cache is not changed in place; a
+        # copy the session owns may have been since the last call
+        if indexed.get(p.id) is p and projects.shares(p):
+            continue
+        after[p.id] = p
+        if not projects.shares(p):
+            owned.add(p.id)
+    if projects and len(owned) == len(projects):
+        # a list given to save_projects: any project may have changed
+        _session_index.entry = None
+        return IntervalIndex.from_projects(projects)
+    gone = indexed.keys() - {p.id for p in projects}
+    before = {pid: p for pid, p in indexed.items() if pid in after or pid in gone}
+    if before or after:
+        index = index.updated(before, after)
+        indexed = dict(indexed)
+        for pid in before.keys() - after.keys():
+            del indexed[pid]
+        for pid, p in after.items():
+            # keep the tasks as indexed, to know which blocks to move next time
+            indexed[pid] = p.copy() if pid in owned else p
+    _session_index.entry = (active, index, indexed)
+    return index
+
+
+def _follow_save(change: "storage.Change"):
+    global _cached_index
+    with _index_lock:
+        source, index = _cached_index
+        if index is not None and source is change.previous:
+            if change.before or change.after:
+                index = index.updated(change.before, change.after)
+            _cached_index = (change.projects, index)
+
+
+storage.on_save(_follow_save)
+
+
+def _free_slots(hours, first: date, days: int, busy: List[Block], now: Optional[datetime]) -> List[List[datetime]]:
+    """Available [start, end] ranges of the horizon, minus the busy blocks and the past."""
+    slots = []
+    for offset in range(days):
+        day = first + timedelta(days=offset)
+        for start, end in hours.get(day.weekday(), ()):
+            slots.append([datetime.combine(day, start), datetime.combine(day, end)])
+    free = []
+    busy = sorted(busy, key=lambda b: b.start)
+    i = 0
+    for start, end in slots:
+        if now is not None:
+            start = max(start, now)
+        # the blocks are sorted by start: skip those over before this slot
+        while i < len(busy) and busy[i].end <= start:
+            i += 1
+        j = i
+        while j < len(busy) and busy[j].start < end and start < end:
+            b = busy[j]
+            if b.start > start:
+                free.append([start, min(b.start, end)])
+            start = max(start, b.end)
+            j += 1
+        if start < end:
+            free.append([start, end])
+    return free
+
+
+def schedule(
+    projects: List[Project],
+    start: date,
+    days: int = 7,
+    availability: Optional[dict] = None,
+    now: Optional[datetime] = None,
+) -> Schedule:
+    """Pack the pending tasks into the available hours of ``days`` days from ``start``.
+
+    Tasks already given a ``planned_start`` keep their block, which is taken
+    out of the available hours. The others are placed earliest deadline first
+    (then project priority and importance); a task longer than the time left
+    in a range is split, unless a smaller task among the next few fits there
+    whole without making the urgent one miss its deadline. Nothing is placed
+    before ``now``.
+    """
+    hours = parse_availability(availability)
+    fixed: List[Block] = []
+    queue = []
+    for project in projects:
+        for task in project.tasks:
+            if task.status == "done":
+                continue
+            block = planned_block(project, task)
+            if block is not None:
+                fixed.append(block)
+                continue
+            due = due_at(project, task)
+            key = (due or datetime.max, project.priority, -task.importance, len(queue))
+            queue.append((key, project.id, task.id, due, task_hours(task)))
+    queue.sort()
+    slots = _free_slots(hours, start, days, fixed, now and _naive(now))
+    # capacity[i]: available hours in the slots before slot i
+    capacity = [0.0]
+    for s, e in slots:
+        capacity.append(capacity[-1] + (e - s).total_seconds() / 3600)
+    slot_starts = [s for s, _e in slots]
+
+    remaining = [item[4] for item in queue]
+    finished = [False] * len(queue)
+    blocks: List[Block] = []
+    late = []
+    head = 0
+
+    def place(n: int, begin: datetime, length: float) -> datetime:
+        end = begin + timedelta(hours=length)
+        _key, pid, tid, due, _hours = queue[n]
+        if blocks and blocks[-1].task_id == tid and blocks[-1].project_id == pid and blocks[-1].end == begin:
+            blocks[-1] = blocks[-1]._replace(end=end)
+        else:
+            blocks.append(Block(pid, tid, begin, end))
+        remaining[n] -= length
+        if remaining[n] <= 1e-9:
+            finished[n] = True
+            if due is not None and end > due:
+                late.append((pid, tid))
+        return end
+
+    for i, (cursor, slot_end) in enumerate(slots):
+        while cursor < slot_end:
+            while head < len(queue) and finished[head]:
+                head += 1
+            if head == len(queue):
+                break
+            left = (slot_end - cursor).total_seconds() / 3600
+            if remaining[head] <= left + 1e-9:
+                cursor = place(head, cursor, remaining[head])
+                continue
+            # the most urgent task does not fit: fill the gap with the largest
+            # task that does if the urgent one can still make its deadline
+            due = queue[head][3]
+            slack = float("inf")
+            if due is not None:
+                slack = left + capacity[bisect_left(slot_starts, due)] - capacity[i + 1] - remaining[head]
+            best = None
+            seen = 0
+            n = head + 1
+            while n < len(queue) and seen < FILL_WINDOW:
+                if not finished[n]:
+                    seen += 1
+                    size = remaining[n]
+                    if size <= left + 1e-9 and size <= slack and (best is None or size > remaining[best]):
+                        best = n
+                n += 1
+            if best is not None:
+                cursor = place(best, cursor, remaining[best])
+            elif left < MIN_TASK_HOURS:
+                break
+            else:
+                cursor = place(head, cursor, left)
+    unscheduled = [(q[1], q[2]) for n, q in enumerate(queue) if not finished[n]]
+    unplaced = sum((remaining[n] for n in range(len(queue)) if not finished[n]), 0.0)
+    blocks += fixed
+    blocks.sort(key=lambda b: (b.start, b.end))
+    return Schedule(blocks, unscheduled, late, round(unplaced, 2))
+
+
+def apply_schedule(projects: storage.ProjectList, plan: Schedule) -> int:
+    """Write the placed blocks back as ``planned_*`` fields; returns the number of tasks changed.
+
+    A task split over several blocks is planned from the start of the first
+    to the end of the last, with the hours actually placed.
+    """
+    spans: Dict[Tuple[int, int], List[Block]] = {}
+    for b in plan.blocks:
+        if not b.fixed:
+            spans.setdefault((b.project_id, b.task_id), []).append(b)
+    changed = 0
+    for (pid, tid), blocks in spans.items():
+        found = projects.find_task(tid)
+        if not found or found[0].id != pid:
+            continue
+        project, task = found
+        project.update_task(
+            task,
+            planned_start=blocks[0].start.isoformat(timespec="minutes"),
+            planned_end=blocks[-1].end.isoformat(timespec="minutes"),
+            planned_hours=round(sum(b.hours for b in blocks), 2),
+            status="planned" if task.status == "todo" else task.status,
+        )
+        changed += 1
+    return changed
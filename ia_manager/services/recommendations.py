@@ -0,0 +1,207 @@
+"""Materialized ranking of the pending tasks, as returned by ``planner.suggest_tasks``.
+
+The queue keeps every pending task's sort key in a sorted list together with
+the fields the key depends on, so the top ``k`` is a slice of the list. Each
+save of the projects by this process (``storage.on_save``) moves only the
+tasks of the projects it replaced, in memory. ``recommend()`` saves the
+first ``HEAD_SIZE`` entries when they are out of date, in
+``recommendations.json`` with the data version they match
+(``storage.data_version``), so saves do not write a second file. A new
+process answers from that head while it is current and long enough;
+otherwise every task is ranked once. Ties are broken by project and task
+id, as in ``planner.suggest_tasks``.
+"""
+import math
+import threading
+from bisect import bisect_left, insort
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ..models.project import Project
+from ..models.task import Task
+from . import planner, serialization, storage
+
+HEAD_FILE = storage.DATA_DIR / "recommendations.json"
+HEAD_SIZE = 50
+
+Fields = Tuple[str, int, str, int, Optional[str]]  # project, priority, task, importance, planned_start
+Ident = Tuple[int, int]  # project id, task id
+
+
+def _fields(project: Project, task: Task) -> Fields:
+    return (project.name, project.priority, task.name, task.importance, task.planned_start)
+
+
+def _key(project_id: int, task_id: int, fields: Fields, start: float) -> tuple:
+    _project, priority, _task, importance, _planned = fields
+    return (start, -planner.score(priority, importance), project_id, task_id)
+
+
+def _start(task: Task) -> float:
+    start = task.planned_start_at
+    return planner._naive(start).timestamp() if start else math.inf
+
+
+def _delta(change: storage.Change) -> Tuple[Dict[Ident, Tuple[tuple, Fields]], List[Ident], int]:
+    """The entries a save changed: (new entries, removed ids, change in the number of pending tasks)."""
+    changed = {}
+    removed = []
+    count = 0
+    for pid in change.before.keys() | change.after.keys():
+        old, new = change.before.get(pid), change.after.get(pid)
+        old_fields = {t.id: _fields(old, t) for t in old.tasks if t.status != "done"} if old else {}
+        pending = set()
+        if new is not None:
+            for t in new.tasks:
+                if t.status == "done":
+                    continue
+                pending.add(t.id)
+                fields = _fields(new, t)
+                if old_fields.get(t.id) != fields:
+                    changed[(pid, t.id)] = (_key(pid, t.id, fields, _start(t)), fields)
+        removed.extend((pid, tid) for tid in old_fields if tid not in pending)
+        count += len(pending) - len(old_fields)
+    return changed, removed, count
+
+
+class RecommendationQueue:
+    def __init__(self, head_path: Path = HEAD_FILE):
+        self.head_path = head_path
+        self.version = None
+        self.saved_version = None  # version of the head in head_path, as far as this process knows
+        self.total = 0  # pending tasks, also those past the head
+        self.complete = False  # False when only the head is held
+        self.entries: Dict[Ident, Tuple[tuple, Fields]] = {}  # ids -> (key, fields)
+        self.ranked: List[tuple] = []
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.ranked)
+
+    def sync(self, projects: List[Project]) -> int:
+        """Update the queue to the pending tasks of ``projects``; returns the number of tasks moved."""
+        entries = self.entries
+        removed = []
+        added = []
+        seen = set()
+        for p in projects:
+            for t in p.tasks:
+                if t.status == "done":
+                    continue
+                ident = (p.id, t.id)
+                seen.add(ident)
+                fields = _fields(p, t)
+                entry = entries.get(ident)
+                if entry is not None:
+                    if entry[1] == fields:
+                        continue
+                    removed.append(entry[0])
+                key = _key(p.id, t.id, fields, _start(t))
+                entries[ident] = (key, fields)
+                added.append(key)
+        for ident in [i for i in entries if i not in seen]:
+            removed.append(entries.pop(ident)[0])
+        if len(removed) + len(added) > len(self.ranked) // 8 + 16:
+            self.ranked = sorted(key for key, _fields in entries.values())
+        else:
+            for key in removed:
+                del self.ranked[bisect_left(self.ranked, key)]
+            for key in added:
+                insort(self.ranked, key)
+        self.complete = True
+        self.total = len(self.ranked)
+        return len(added) + len(removed)
+
+    def apply(self, changed: Dict[Ident, Tuple[tuple, Fields]], removed: List[Ident], count: int):
+        """Move the entries of one save, as computed by ``_delta``.
+
+        A queue holding only the head stays a head: a changed task enters it
+        only when it ranks before the head's last entry, which every task
+        left out ranks after.
+        """
+        last = self.ranked[-1] if self.ranked else None
+        for ident in [*removed, *changed]:
+            entry = self.entries.pop(ident, None)
+            if entry is not None:
+                del self.ranked[bisect_left(self.ranked, entry[0])]
+        for ident, (key, fields) in changed.items():
+            if self.complete or (last is not None and key < last):
+                self.entries[ident] = (key, fields)
+                insort(self.ranked, key)
+        self.total += count
+        if not self.complete:
+            for key in self.ranked[HEAD_SIZE:]:
+                del self.entries[(key[2], key[3])]
+            del self.ranked[HEAD_SIZE:]
+            self.complete = len(self.ranked) >= self.total
+
+    def top(self, k: int) -> List[planner.Suggestion]:
+        result = []
+        for key in self.ranked[:max(k, 0)]:
+            _start, rank, pid, tid = key
+            project, _priority, task, _importance, planned = self.entries[(pid, tid)][1]
+            result.append(planner.Suggestion(pid, tid, -rank, project, task, planned))
+        return result
+
+    def _read(self) -> bool:
+        """Replace the queue with the saved head; False if it cannot be read."""
+        try:
+            data = serialization.read_file(self.head_path)
+        except (FileNotFoundError, ValueError):
+            return False
+        rows = data.get("rows", [])
+        self.entries, self.ranked = {}, []
+        for pid, tid, start, *fields in rows:
+            key = _key(pid, tid, tuple(fields), math.inf if start is None else start)
+            self.entries[(pid, tid)] = (key, tuple(fields))
+            self.ranked.append(key)
+        self.ranked.sort()
+        self.version = self.saved_version = data.get("version")
+        self.total = data.get("total", len(rows))
+        self.complete = len(rows) >= self.total
+        return True
+
+    def save(self):
+        rows = []
+        for key in self.ranked[:HEAD_SIZE]:
+            start, _rank, pid, tid = key
+            rows.append([pid, tid, None if start == math.inf else start, *self.entries[(pid, tid)][1]])
+        self.head_path.parent.mkdir(parents=True, exist_ok=True)
+        serialization.write_file(
+            self.head_path, {"version": self.version, "total": self.total, "rows": rows}, "compact"
+        )
+        self.saved_version = self.version
+
+    def recommend(self, k: int) -> List[planner.Suggestion]:
+        """The ``k`` tasks to do first, ranking every task again only when the queue cannot answer."""
+        version = storage.data_version()
+        with self._lock:
+            if self.version != version and not self.complete:
+                # another process may have brought the saved head along
+                self._read()
+            if self.version != version or not (self.complete or k <= len(self.ranked)):
+                # the version is taken before the projects: if they change meanwhile the next call syncs again
+                self.sync(storage.view_projects())
+                self.version = version
+            if self.saved_version != self.version:
+                self.save()
+            return self.top(k)
+
+    def follow(self, change: storage.Change):
+        """Apply a save of this process to the queue held, if it was current; the file is left to ``recommend``."""
+        with self._lock:
+            if self.version == change.previous_version:
+                self.apply(*_delta(change))
+                self.version = change.version
+
+
+_queue = RecommendationQueue()
+storage.on_save(_queue.follow)
+
+
+def recommend(k: int) -> List[planner.Suggestion]:
+    """Like ``planner.suggest_tasks(projects, k)`` for the stored projects, from the cached queue."""
+    if storage.current_session() is not None:
+        # the projects of a session change in place without a new version
+        return planner.suggest_tasks(storage.view_projects(), k)
+    return _queue.recommend(k)
@@ -0,0 +1,244 @@
+"""What-if planning: schedule variations of the projects and compare them.
+
+A scenario moves project deadlines, limits the working hours per day,
+replaces the availability or drops tasks. It is applied copy-on-write: a
+scenario shares every project and task it does not change with the base
+set. Scenarios run in a process pool; each worker receives the base
+projects once, when it starts, and then only the scenarios.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+from ..models.project import Project
+from ..models.task import Task
+from . import planner
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _json_type(value) -> str:
+    """The JSON name of the type of ``value``, for error messages."""
+    if isinstance(value, bool):
+        return "a boolean"
+    if isinstance(value, (int, float)):
+        return "a number"
+    if isinstance(value, str):
+        return "a string"
+    if isinstance(value, list):
+        return "a list"
+    if isinstance(value, dict):
+        return "an object"
+    return "null"
+
+
+@dataclass
+class Scenario:
+    name: str
+    shift_deadlines: Dict[str, int] = field(default_factory=dict)  # project id or name -> days
+    hours_per_day: Optional[float] = None
+    availability: Optional[dict] = None  # replaces the configured one
+    drop_tasks: List[int] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Scenario":
+        """Build a scenario from its JSON object, raising ValueError on unknown or mistyped settings."""
+        if not isinstance(data, dict):
+            raise ValueError(f"A scenario must be an object, not {_json_type(data)}")
+        name = data.get("name")
+        if not isinstance(name, str):
+            raise ValueError("A scenario needs a name")
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Scenario {name}: unknown settings: {', '.join(sorted(unknown))}")
+
+        def check(key: str, ok: bool, expected: str):
+            if key in data and not ok:
+                raise ValueError(f"Scenario {name}: {key} must be {expected}")
+
+        shifts = data.get("shift_deadlines", {})
+        check("shift_deadlines", isinstance(shifts, dict) and all(_is_int(v) for v in shifts.values()),
+              "an object of day counts")
+        hours = data.get("hours_per_day")
+        check("hours_per_day", hours is None or (_is_number(hours) and hours >= 0), "a number of hours")
+        availability = data.get("availability")
+        check("availability", availability is None or (
+            isinstance(availability, dict)
+            and all(isinstance(r, list) and all(isinstance(t, str) for t in r) for r in availability.values())
+        ), 'an object of "HH:MM-HH:MM" lists')
+        drop = data.get("drop_tasks", [])
+        check("drop_tasks", isinstance(drop, list) and all(_is_int(t) for t in drop), "a list of task ids")
+        if availability:
+            try:
+                planner.parse_availability(availability)
+            except ValueError as e:
+                raise ValueError(f"Scenario {name}: {e}") from None
+        return cls(**data)
+
+
+def from_list(data: list) -> List[Scenario]:
+    """Build the scenarios of a JSON list, as read from a scenario file."""
+    if not isinstance(data, list):
+        raise ValueError(f"Expected a list of scenarios, not {_json_type(data)}")
+    return [Scenario.from_dict(d) for d in data]
+
+
+class Outcome(NamedTuple):
+    name: str
+    tasks_late: int  # finished after their deadline, or not at all when due within the horizon
+    hours_overbooked: float  # work that does not fit in the horizon
+    completion: Dict[int, Optional[str]]  # project id -> day its last task ends, None if it does not fit
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+def _shift(day: Optional[str], days: int) -> Optional[str]:
+    try:
+        return (date.fromisoformat(day[:10]) + timedelta(days=days)).isoformat()
+    except (TypeError, ValueError):
+        return day
+
+
+def _shifted(task: Task, days: int) -> Task:
+    if not task.deadline:
+        return task
+    clone = task.copy()
+    clone.deadline = _shift(task.deadline, days)
+    return clone
+
+
+def apply(projects: List[Project], scenario: Scenario) -> List[Project]:
+    """The projects as changed by ``scenario``; unchanged projects and tasks are shared."""
+    shifts = {}
+    for ident, days in scenario.shift_deadlines.items():
+        match = [p for p in projects if str(p.id) == str(ident) or p.name == ident]
+        if not match:
+            raise ValueError(f"Scenario {scenario.name}: unknown project {ident}")
+        shifts[match[0].id] = days
+    drop = set(scenario.drop_tasks)
+    result = []
+    for p in projects:
+        days = shifts.get(p.id)
+        tasks = p.tasks
+        if drop:
+            tasks = [t for t in tasks if t.id not in drop]
+        if days:
+            tasks = [_shifted(t, days) for t in tasks]
+            deadline = _shift(p.deadline, days)
+        elif len(tasks) == len(p.tasks):
+            result.append(p)
+            continue
+        else:
+            deadline = p.deadline
+        # a plain Project, as the view may hold lazy ones; the counters are not
+        # read by the scheduler and are left as they were
+        result.append(Project(
+            id=p.id,
+            name=p.name,
+            description=p.description,
+            priority=p.priority,
+            deadline=deadline,
+            status=p.status,
+            tasks=tasks,
+            counters=p.counters,
+        ))
+    return result
+
+
+def _availability(base: Optional[dict], scenario: Scenario) -> Optional[dict]:
+    availability = scenario.availability if scenario.availability is not None else base
+    if scenario.hours_per_day is None:
+        return availability
+    # keep the working days and their first start, with a single range of that length
+    hours = planner.parse_availability(availability)
+    result = {}
+    for weekday, ranges in hours.items():
+        start = datetime.combine(date.min, ranges[0][0])
+        end = min(start + timedelta(hours=scenario.hours_per_day), datetime.combine(date.min, time.max))
+        if end > start:
+            result[planner.WEEKDAYS[weekday]] = [f"{start:%H:%M}-{end:%H:%M}"]
+    return result or {planner.WEEKDAYS[0]: []}
+
+
+def evaluate(
+    projects: List[Project],
+    scenario: Scenario,
+    start: date,
+    days: int,
+    availability: Optional[dict] = None,
+    now: Optional[datetime] = None,
+) -> Outcome:
+    """Schedule ``projects`` under ``scenario`` and measure the result."""
+    changed = apply(projects, scenario)
+    plan = planner.schedule(changed, start, days, _availability(availability, scenario), now)
+    horizon = datetime.combine(start + timedelta(days=days), time())
+    unscheduled = set(plan.unscheduled)
+    late = len(plan.late)
+    pending: Dict[int, bool] = {}  # project id -> whether all its pending tasks fit
+    for p in changed:
+        for t in p.tasks:
+            if t.status == "done":
+                continue
+            fits = (p.id, t.id) not in unscheduled
+            pending[p.id] = pending.get(p.id, True) and fits
+            if not fits:
+                due = planner.due_at(p, t)
+                if due is not None and due <= horizon:
+                    late += 1
+    ends: Dict[int, datetime] = {}
+    for b in plan.blocks:
+        if b.end > ends.get(b.project_id, datetime.min):
+            ends[b.project_id] = b.end
+    completion = {
+        pid: ends[pid].date().isoformat() if fits and pid in ends else None
+        for pid, fits in pending.items()
+    }
+    return Outcome(scenario.name, late, plan.unplaced_hours, completion)
+
+
+# state of a pool worker, set once by _init_worker
+_worker: dict = {}
+
+
+def _init_worker(projects: List[dict], start: date, days: int, availability: Optional[dict], now: Optional[datetime]):
+    _worker.update(
+        projects=[Project.from_dict(p) for p in projects],
+        start=start, days=days, availability=availability, now=now,
+    )
+
+
+def _evaluate_in_worker(scenario: Scenario) -> Outcome:
+    w = _worker
+    return evaluate(w["projects"], scenario, w["start"], w["days"], w["availability"], w["now"])
+
+
+def run(
+    projects: List[Project],
+    scenarios: List[Scenario],
+    start: date,
+    days: int = 56,
+    availability: Optional[dict] = None,
+    now: Optional[datetime] = None,
+    workers: Optional[int] = None,
+) -> List[Outcome]:
+    """Evaluate every scenario, in parallel when there is more than one worker; results keep their order."""
+    workers = min(workers or os.cpu_count() or 1, len(scenarios))
+    if workers <= 1:
+        return [evaluate(projects, s, start, days, availability, now) for s in scenarios]
+    payload = [p.to_dict() for p in projects]
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(payload, start, days, availability, now),
+    ) as pool:
+        return list(pool.map(_evaluate_in_worker, scenarios))
@@ -0,0 +1,278 @@
+"""BM25 inverted index over the notes and the history messages.
+
+Each term maps to the documents containing it with their term frequency, so a
+query only visits the postings of its own terms. The index lives in
+``search_index.json`` plus an append-only ``search_index.journal`` of the
+changes made since, and records the version of the memory it matches. When
+the memory was changed behind its back (by hand, or by a version without the
+index) the versions differ and it is rebuilt.
+"""
+import heapq
+import math
+import re
+import threading
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import serialization
+from .storage import _file_signature
+
+TOKEN_RE = re.compile(r"\w+")
+K1 = 1.2
+B = 0.75
+JOURNAL_MAX_BYTES = 4 << 20
+INDEX_VERSION = 1
+
+_UNSET = object()
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def fingerprint(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+class BM25Index:
+    """Inverted index of documents identified by an integer key.
+
+    ``docs`` keeps, per key, the fingerprint of the indexed text, its length
+    in tokens and its term counts, which is what removing or re-indexing a
+    document needs.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.docs: Dict[int, Tuple[int, int, Dict[str, int]]] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, key: int, text: str) -> tuple:
+        """Index ``text`` under ``key``, replacing any previous text; return the journal entry."""
+        entry = (key, fingerprint(text), dict(Counter(tokenize(text))))
+        self.insert(*entry)
+        return entry
+
+    def insert(self, key: int, fp: int, terms: Dict[str, int]):
+        self.remove(key)
+        length = sum(terms.values())
+        self.docs[key] = (fp, length, terms)
+        self.total_length += length
+        postings = self.postings
+        for term, tf in terms.items():
+            posting = postings.get(term)
+            if posting is None:
+                posting = postings[term] = {}
+            posting[key] = tf
+
+    def remove(self, key: int):
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return
+        self.total_length -= doc[1]
+        for term in doc[2]:
+            posting = self.postings[term]
+            del posting[key]
+            if not posting:
+                del self.postings[term]
+
+    def sync(self, texts: Dict[int, str]) -> List[tuple]:
+        """Make the index hold exactly ``texts``; return the journal entries of the changes.
+
+        Unchanged documents are recognized by their fingerprint and not tokenized again.
+        """
+        entries = []
+        docs = self.docs
+        for key in [k for k in docs if k not in texts]:
+            self.remove(key)
+            entries.append((key,))
+        for key, text in texts.items():
+            doc = docs.get(key)
+            if doc is None or doc[0] != fingerprint(text):
+                entries.append(self.add(key, text))
+        return entries
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        accept: Optional[Callable[[int], bool]] = None,
+    ) -> List[Tuple[float, int]]:
+        """Return up to ``limit`` (score, key) pairs, best first.
+
+        Ties keep the lower key first. ``accept`` filters the candidate keys.
+        """
+        n = len(self.docs)
+        if not n or limit <= 0:
+            return []
+        avg = self.total_length / n or 1.0
+        docs = self.docs
+        base, per_token = K1 * (1 - B), K1 * B / avg
+        scores: Dict[int, float] = {}
+        get = scores.get
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            weight = math.log(1 + (n - df + 0.5) / (df + 0.5)) * (K1 + 1)
+            for key, tf in posting.items():
+                scores[key] = get(key, 0.0) + weight * tf / (tf + base + per_token * docs[key][1])
+        items = scores.items()
+        if accept is not None:
+            items = [(k, s) for k, s in items if accept(k)]
+        best = heapq.nlargest(limit, items, key=lambda kv: (kv[1], -kv[0]))
+        return [(s, k) for k, s in best]
+
+    def dump(self) -> list:
+        return [[key, fp, terms] for key, (fp, _length, terms) in self.docs.items()]
+
+    @staticmethod
+    def load(rows: list) -> "BM25Index":
+        index = BM25Index()
+        for key, fp, terms in rows:
+            index.insert(key, fp, terms)
+        return index
+
+
+class MemoryIndex:
+    """The notes and history indexes, persisted as a snapshot plus a journal.
+
+    ``source`` is the memory version the indexes match. Every change is
+    appended to the journal together with the version it leads to, so other
+    processes catch up by replaying the new journal lines only. Callers hold
+    the memory lock while they update or rebuild the index.
+    """
+
+    def __init__(self, path: Path, fmt: str = "compact"):
+        self.path = path
+        self.journal_path = path.with_suffix(".journal")
+        self.format = fmt
+        self.notes = BM25Index()
+        self.history = BM25Index()
+        self.source = _UNSET
+        self._snapshot_signature = None
+        self._journal_offset = 0
+        self._lock = threading.RLock()
+
+    def _indexes(self) -> Dict[str, BM25Index]:
+        return {"notes": self.notes, "history": self.history}
+
+    def _read(self):
+        """Catch up with the files: replay new journal lines, or reload everything."""
+        signature = _file_signature(self.path)
+        if signature is None:
+            self.source = _UNSET
+            return
+        if signature != self._snapshot_signature:
+            data = serialization.read_file(self.path)
+            if data.get("version") != INDEX_VERSION:
+                self.source = _UNSET
+                return
+            self.notes = BM25Index.load(data["notes"])
+            self.history = BM25Index.load(data["history"])
+            self.source = data["source"]
+            self._snapshot_signature = signature
+            self._journal_offset = 0
+        try:
+            f = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(self._journal_offset)
+            raw = f.read()
+        end = raw.rfind(b"\n") + 1
+        indexes = self._indexes()
+        for line in raw[:end].splitlines():
+            record = serialization.loads(line)
+            if "source" in record:
+                self.source = record["source"]
+                continue
+            index = indexes[record["index"]]
+            entry = record["entry"]
+            if len(entry) == 1:
+                index.remove(entry[0])
+            else:
+                index.insert(*entry)
+        self._journal_offset += end
+
+    def current(self, source) -> bool:
+        """Whether the index matches the memory version ``source``, reading the files if needed."""
+        with self._lock:
+            if self.source != source:
+                self._read()
+            return self.source == source
+
+    def search(self, name: str, query: str, limit: int, accept=None) -> List[Tuple[float, int]]:
+        """``BM25Index.search`` on the ``notes`` or ``history`` index, safe against concurrent updates."""
+        with self._lock:
+            return self._indexes()[name].search(query, limit, accept)
+
+    def rebuild(self, source, notes: Dict[int, str], history: Dict[int, str]):
+        """Index ``notes`` and ``history`` from scratch and write the snapshot."""
+        with self._lock:
+            self.notes = BM25Index()
+            self.history = BM25Index()
+            for key, text in notes.items():
+                self.notes.add(key, text)
+            for key, text in history.items():
+                self.history.add(key, text)
+            self.source = source
+            self._write_snapshot()
+
+    def update(self, before, after, replace: Dict[str, Dict[int, str]] = None, append: Dict[str, str] = None):
+        """Record a memory write that turned version ``before`` into ``after``.
+
+        ``replace`` gives the full new content of an index, ``append`` one new
+        document added after the existing ones. Nothing is done when the index
+        did not match ``before``; the next query then rebuilds it.
+        """
+        with self._lock:
+            if not self.current(before):
+                return
+            indexes = self._indexes()
+            records = []
+            for name, texts in (replace or {}).items():
+                records += [{"index": name, "entry": e} for e in indexes[name].sync(texts)]
+            for name, text in (append or {}).items():
+                index = indexes[name]
+                records.append({"index": name, "entry": index.add(len(index), text)})
+            records.append({"source": after})
+            self.source = after
+            raw = b"".join(serialization.dumps(r, "compact") + b"\n" for r in records)
+            with open(self.journal_path, "ab") as f:
+                f.write(raw)
+            self._journal_offset += len(raw)
+            if self._journal_offset > JOURNAL_MAX_BYTES:
+                self._write_snapshot()
+
+    def _write_snapshot(self):
+        data = {
+            "version": INDEX_VERSION,
+            "source": self.source,
+            "notes": self.notes.dump(),
+            "history": self.history.dump(),
+        }
+        serialization.write_file(self.path, data, self.format)
+        if self.journal_path.exists():
+            self.journal_path.unlink()
+        self._snapshot_signature = _file_signature(self.path)
+        self._journal_offset = 0
+
+
+_indexes: Dict[Path, MemoryIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def memory_index(path: Path, fmt: str = "compact") -> MemoryIndex:
+    """Return the process-wide index stored at ``path``."""
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None or index.format != fmt:
+            index = _indexes[path] = MemoryIndex(path, fmt)
+        return index
@@ -0,0 +1,75 @@
+import json
+import marshal
+import os
+import tempfile
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+FORMATS = ("pretty", "compact", "binary")
+
+# binary snapshots: magic, one version byte, then a marshal payload
+BINARY_MAGIC = b"IAMB"
+BINARY_VERSION = 1
+
+
+def dumps(data, fmt: str = "pretty") -> bytes:
+    """Encode ``data`` in one of FORMATS."""
+    if fmt == "pretty":
+        return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+    if fmt == "compact":
+        if orjson is not None:
+            return orjson.dumps(data)
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if fmt == "binary":
+        return BINARY_MAGIC + bytes([BINARY_VERSION]) + marshal.dumps(data)
+    raise ValueError(f"Unknown format: {fmt}")
+
+
+def loads(raw: bytes):
+    """Decode data written by ``dumps`` in any format."""
+    if raw.startswith(BINARY_MAGIC):
+        version = raw[len(BINARY_MAGIC)]
+        if version != BINARY_VERSION:
+            raise ValueError(f"Unsupported binary snapshot version {version}")
+        return marshal.loads(raw[len(BINARY_MAGIC) + 1:])
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode("utf-8"))
+
+
+def read_file(path: Path):
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def write_file(path: Path, data, fmt: str = "pretty"):
+    atomic_write(path, dumps(data, fmt))
+
+
+def atomic_write(path: Path, raw: bytes):
+    """Write ``raw`` to a temporary file next to ``path`` and rename it over ``path``.
+
+    Readers see either the old or the new content, never a truncated file.
+    """
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
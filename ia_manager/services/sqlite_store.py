@@ -0,0 +1,345 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ..models.project import Project
+from ..models.task import Task
+from .storage import LOCK_TIMEOUT, ProjectList, _file_signature, _notify, _saved, _unique_task_ids, file_lock
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    priority INTEGER NOT NULL DEFAULT 3,
+    deadline TEXT,
+    status TEXT NOT NULL DEFAULT 'en cours'
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    project_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    estimated INTEGER,
+    deadline TEXT,
+    importance INTEGER NOT NULL DEFAULT 3,
+    status TEXT NOT NULL DEFAULT 'todo',
+    description TEXT NOT NULL DEFAULT '',
+    started TEXT,
+    time_spent INTEGER NOT NULL DEFAULT 0,
+    planned_start TEXT,
+    planned_end TEXT,
+    planned_hours REAL,
+    PRIMARY KEY (project_id, id)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_id ON tasks(id);
+CREATE INDEX IF NOT EXISTS idx_tasks_deadline ON tasks(deadline);
+CREATE INDEX IF NOT EXISTS idx_tasks_planned_start ON tasks(planned_start);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL DEFAULT '',
+    tags TEXT NOT NULL DEFAULT '[]',
+    project_id INTEGER,
+    internal INTEGER NOT NULL DEFAULT 0,
+    created TEXT
+);
+CREATE TABLE IF NOT EXISTS history (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    ts TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+PROJECT_COLUMNS = ("id", "name", "description", "priority", "deadline", "status")
+TASK_COLUMNS = (
+    "id", "name", "estimated", "deadline", "importance", "status", "description",
+    "started", "time_spent", "planned_start", "planned_end", "planned_hours",
+)
+NOTE_COLUMNS = ("id", "text", "tags", "project_id", "internal", "created")
+
+
+def _project_row(p: Project) -> tuple:
+    return (p.id, p.name, p.description, p.priority, p.deadline, p.status)
+
+
+def _task_row(t: Task) -> tuple:
+    return (
+        t.id, t.name, t.estimated, t.deadline, t.importance, t.status, t.description,
+        t.started, t.time_spent, t.planned_start, t.planned_end, t.planned_hours,
+    )
+
+
+def _note_row(n: dict) -> tuple:
+    return (
+        n["id"],
+        n.get("text", ""),
+        json.dumps(n.get("tags", []), ensure_ascii=False),
+        n.get("project_id"),
+        int(bool(n.get("internal", False))),
+        n.get("created"),
+    )
+
+
+class SqliteRepository:
+    """Project, note and history storage backed by an indexed SQLite database.
+
+    Exposes the same ``view``/``load``/``save`` API as the JSON repository.
+    ``save`` compares the projects copied by ``load()``'s writable list with
+    the last known rows and only writes the projects and tasks that actually
+    changed. ``transaction()``
+    holds an advisory lock next to the database so that concurrent
+    read-modify-write cycles from other processes do not interleave.
+    """
+
+    def __init__(self, path: Path, source=None, memory_source: Optional[Callable[[], dict]] = None):
+        self.path = path
+        self.source = source
+        self.memory_source = memory_source
+        self.lock = file_lock(path.with_name(path.name + ".lock"))
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._version: Optional[int] = None
+        self._projects = ProjectList()
+        self._task_map: Dict[Tuple[int, int], Tuple[Project, Task]] = {}
+        self._project_rows: Dict[int, tuple] = {}
+        self._task_rows: Dict[Tuple[int, int], tuple] = {}
+
+    def configure(self, settings: dict):
+        self.lock.timeout = float(settings.get("lock_timeout", LOCK_TIMEOUT))
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            fresh = not self.path.exists()
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+            if fresh:
+                projects = self.source.load() if self.source is not None else []
+                migrate_json(self, projects, self.memory_source() if self.memory_source else None)
+        return self._conn
+
+    # projects -------------------------------------------------------------
+
+    def _refresh(self):
+        conn = self._connect()
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._version:
+            return
+        projects: List[Project] = []
+        by_id: Dict[int, Project] = {}
+        project_rows: Dict[int, tuple] = {}
+        task_rows: Dict[Tuple[int, int], tuple] = {}
+        task_map: Dict[Tuple[int, int], Tuple[Project, Task]] = {}
+        for row in conn.execute(f"SELECT {', '.join(PROJECT_COLUMNS)} FROM projects ORDER BY id"):
+            p = Project(**dict(zip(PROJECT_COLUMNS, row)))
+            projects.append(p)
+            by_id[p.id] = p
+            project_rows[p.id] = row
+        query = f"SELECT project_id, {', '.join(TASK_COLUMNS)} FROM tasks ORDER BY project_id, rowid"
+        for row in conn.execute(query):
+            p = by_id.get(row[0])
+            if p is None:
+                continue
+            t = Task(**dict(zip(TASK_COLUMNS, row[1:])))
+            p.tasks.append(t)
+            task_rows[(p.id, t.id)] = row[1:]
+        _unique_task_ids(projects)
+        for p in projects:
+            p.recount()
+            for t in p.tasks:
+                task_map[(p.id, t.id)] = (p, t)
+        self._projects = ProjectList(projects)
+        self._project_rows = project_rows
+        self._task_rows = task_rows
+        self._task_map = task_map
+        self._version = version
+
+    def view(self) -> ProjectList:
+        with self._lock:
+            self._refresh()
+            return self._projects
+
+    def version(self) -> list:
+        """Changes whenever the database or its write-ahead log is written, by any process."""
+        files = (self.path, self.path.with_name(self.path.name + "-wal"))
+        return [list(s) if s else None for s in map(_file_signature, files)]
+
+    def load(self) -> ProjectList:
+        return self.view().writable()
+
+    @contextmanager
+    def transaction(self):
+        with self.lock.locked(), self._lock:
+            projects = self.load()
+            yield projects
+            self.save(projects)
+
+    def save(self, projects: List[Project]):
+        with self.lock.locked(), self._lock:
+            self._refresh()
+            conn = self._connect()
+            previous, previous_version = self._projects, self.version()
+            # only the projects that are not the cached objects can have changed
+            cached = {p.id: p for p in self._projects}
+            ids = {p.id for p in projects}
+            changed = [p for p in projects if cached.get(p.id) is not p]
+            gone = [p for pid, p in cached.items() if pid not in ids]
+            replaced = gone + [cached[p.id] for p in changed if p.id in cached]
+            project_rows = dict(self._project_rows)
+            task_rows = dict(self._task_rows)
+            task_map = dict(self._task_map)
+            for p in gone:
+                del project_rows[p.id]
+            for p in replaced:
+                for t in p.tasks:
+                    task_rows.pop((p.id, t.id), None)
+                    task_map.pop((p.id, t.id), None)
+            for p in changed:
+                project_rows[p.id] = _project_row(p)
+                for t in p.tasks:
+                    task_rows[(p.id, t.id)] = _task_row(t)
+            changed_projects = [project_rows[p.id] for p in changed if self._project_rows.get(p.id) != project_rows[p.id]]
+            removed_projects = [(p.id,) for p in gone]
+            changed_tasks = [
+                (p.id,) + task_rows[(p.id, t.id)]
+                for p in changed for t in p.tasks
+                if self._task_rows.get((p.id, t.id)) != task_rows[(p.id, t.id)]
+            ]
+            removed_tasks = [(p.id, t.id) for p in replaced for t in p.tasks if (p.id, t.id) not in task_rows]
+            with conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO projects ({', '.join(PROJECT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                    changed_projects,
+                )
+                conn.executemany("DELETE FROM tasks WHERE project_id = ? AND id = ?", removed_tasks)
+                conn.executemany("DELETE FROM projects WHERE id = ?", removed_projects)
+                conn.executemany(
+                    f"INSERT INTO tasks (project_id, {', '.join(TASK_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * (len(TASK_COLUMNS) + 1))}) "
+                    f"ON CONFLICT (project_id, id) DO UPDATE SET "
+                    + ", ".join(f"{c} = excluded.{c}" for c in TASK_COLUMNS[1:]),
+                    changed_tasks,
+                )
+            self._projects = _saved(projects)
+            changed_ids = {p.id for p in changed}
+            for p in self._projects:
+                if p.id in changed_ids:
+                    for t in p.tasks:
+                        task_map[(p.id, t.id)] = (p, t)
+            self._project_rows = project_rows
+            self._task_rows = task_rows
+            self._task_map = task_map
+            _notify(previous, self._projects, previous_version, self.version())
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+    def scheduled_between(self, start: date, end: date, include_done: bool = True) -> List[Tuple[Project, Task]]:
+        """Return tasks whose planned start (or deadline) falls in [start, end) using the indexes."""
+        with self._lock:
+            self._refresh()
+            status = "" if include_done else " AND status != 'done'"
+            bounds = (start.isoformat(), end.isoformat())
+            rows = self._connect().execute(
+                f"SELECT project_id, id FROM tasks WHERE planned_start >= ? AND planned_start < ?{status} "
+                f"UNION ALL "
+                f"SELECT project_id, id FROM tasks WHERE deadline >= ? AND deadline < ?"
+                f" AND (planned_start IS NULL OR planned_start = ''){status}",
+                bounds + bounds,
+            ).fetchall()
+            return [self._task_map[key] for key in rows if key in self._task_map]
+
+    # memory ---------------------------------------------------------------
+
+    def load_notes(self) -> List[dict]:
+        with self._lock:
+            rows = self._connect().execute(f"SELECT {', '.join(NOTE_COLUMNS)} FROM notes ORDER BY id").fetchall()
+        return [
+            {
+                "id": r[0],
+                "text": r[1],
+                "tags": json.loads(r[2] or "[]"),
+                "project_id": r[3],
+                "internal": bool(r[4]),
+                "created": r[5],
+            }
+            for r in rows
+        ]
+
+    def save_notes(self, notes: List[dict]):
+        rows = [_note_row(n) for n in notes]
+        with self._lock:
+            conn = self._connect()
+            existing = {r[0]: r for r in conn.execute(f"SELECT {', '.join(NOTE_COLUMNS)} FROM notes")}
+            keep = {r[0] for r in rows}
+            with conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO notes ({', '.join(NOTE_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                    [r for r in rows if existing.get(r[0]) != r],
+                )
+                conn.executemany("DELETE FROM notes WHERE id = ?", [(i,) for i in existing if i not in keep])
+
+    def load_history(self) -> List[dict]:
+        with self._lock:
+            rows = self._connect().execute("SELECT role, text, ts FROM history ORDER BY seq").fetchall()
+        return [{"role": r[0], "text": r[1], "ts": r[2]} for r in rows]
+
+    def append_history(self, item: dict):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT INTO history (role, text, ts) VALUES (?, ?, ?)",
+                    (item.get("role"), item.get("text", ""), item.get("ts")),
+                )
+
+    def save_history(self, history: List[dict]):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM history")
+                conn.executemany(
+                    "INSERT INTO history (role, text, ts) VALUES (?, ?, ?)",
+                    [(h.get("role"), h.get("text", ""), h.get("ts")) for h in history],
+                )
+
+    def load_meta(self, key: str, default: str = "") -> str:
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def save_meta(self, key: str, value: str):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def migrate_json(repo: SqliteRepository, projects: List[Project], memory: Optional[dict] = None) -> int:
+    """Copy the projects and ``memory`` into an empty database. Returns the number of projects.
+
+    ``memory`` holds the ``notes``, ``session_note`` and ``history`` of the
+    JSON backend, as returned by ``memory.export_memory``.
+    """
+    mem = memory or {}
+    with repo._lock:
+        conn = repo._connect()
+        if conn.execute("SELECT COUNT(*) FROM projects").fetchone()[0]:
+            raise RuntimeError(f"{repo.path} already contains projects")
+        repo.save(projects)
+        repo.save_notes(mem.get("notes", []))
+        repo.save_history(mem.get("history", []))
+        repo.save_meta("session_note", mem.get("session_note", ""))
+    return len(projects)
@@ -1,30 +1,1258 @@
+import codecs
 import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
 from pathlib import Path
-from typing import List
-from ..models.project import Project
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from ..models.project import Project, TaskCounters
+from ..models.task import Task
+from . import serialization
 
-DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DATA_DIR = Path(os.environ.get("IA_MANAGER_DATA") or Path(__file__).resolve().parent.parent / "data")
 PROJECTS_FILE = DATA_DIR / "projects.json"
 CONFIG_FILE = DATA_DIR / "config.json"
 LOG_FILE = DATA_DIR / "log.txt"
 DOCS_DIR = DATA_DIR / "docs"
 IMPROVEMENTS_FILE = DATA_DIR / "improvements.json"
+MEMORY_FILE = DATA_DIR / "memory.json"
+DB_FILE = DATA_DIR / "ia_manager.db"
+JOURNAL_FILE = DATA_DIR / "projects.journal.jsonl"
+PROJECTS_BIN_FILE = DATA_DIR / "projects.bin"
+MEMORY_BIN_FILE = DATA_DIR / "memory.bin"
+NOTES_FILE = DATA_DIR / "notes.json"
+NOTES_BIN_FILE = DATA_DIR / "notes.bin"
+SESSION_NOTE_FILE = DATA_DIR / "session_note.json"
+HISTORY_DIR = DATA_DIR / "history"
+SHARDS_DIR = DATA_DIR / "projects"
+PROJECTS_LOCK = DATA_DIR / "projects.lock"
+MEMORY_LOCK = DATA_DIR / "memory.lock"
+
+JOURNAL_MAX_BYTES = 1024 * 1024
+LOCK_TIMEOUT = 10.0
 
 DATA_DIR.mkdir(exist_ok=True)
 DOCS_DIR.mkdir(exist_ok=True)
 
 
-def load_projects() -> List[Project]:
-    if not PROJECTS_FILE.exists():
-        return []
-    with open(PROJECTS_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return [Project.from_dict(d) for d in data]
+def _file_signature(path: Path) -> Optional[tuple]:
+    """Return (mtime, size, inode) for ``path`` or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class LockTimeout(TimeoutError):
+    pass
+
+
+class FileLock:
+    """Advisory inter-process lock on ``path``, re-entrant within a process.
+
+    Threads are serialized with an RLock; the first acquisition also takes
+    the OS lock (``fcntl.flock``, ``msvcrt.locking`` on Windows), retrying
+    with exponential backoff for up to ``timeout`` seconds. Use
+    ``file_lock()`` so that a process holds a single instance per path.
+    """
+
+    def __init__(self, path: Path, timeout: float = LOCK_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def acquire(self, shared: bool = False):
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            raise LockTimeout(f"Could not lock {self.path}")
+        if self._depth == 0:
+            try:
+                self._acquire_os(shared)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            os.close(fd)
+        self._thread_lock.release()
+
+    def _acquire_os(self, shared: bool):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + self.timeout
+        delay = 0.005
+        while True:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    raise LockTimeout(f"Could not lock {self.path} within {self.timeout}s")
+                time.sleep(delay)
+                delay = min(delay * 2, 0.25)
+        self._fd = fd
+
+    @contextmanager
+    def locked(self, shared: bool = False):
+        self.acquire(shared)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+_locks: Dict[Path, FileLock] = {}
+_locks_guard = threading.Lock()
+
+
+def file_lock(path: Path) -> FileLock:
+    """Return the process-wide lock for ``path``."""
+    with _locks_guard:
+        lock = _locks.get(path)
+        if lock is None:
+            lock = _locks[path] = FileLock(path)
+        return lock
+
+
+class ProjectList(list):
+    """A list of projects with constant-time lookups by task id, project id and name.
+
+    The lookup tables are built on first use; the task table is separate so
+    that looking up a project does not load the tasks of lazy projects.
+    Mutate the list through ``add_project``/``remove_project``/
+    ``rename_project``/``add_task``/``remove_task`` so they stay in sync.
+
+    A list made by ``writable()`` shares its projects with the original and
+    copies a project the first time it is looked up to be changed: by
+    ``find_project``, ``find_task``, the methods above or ``edit()``. A
+    project reached by iterating must go through ``edit()`` before it is
+    modified.
+    """
+
+    _by_id: Optional[dict] = None
+    _by_task: Optional[dict] = None
+    _max_task: Optional[int] = None
+    _shared: Optional[dict] = None  # project id -> project not copied yet, on a writable list
+
+    def writable(self) -> "ProjectList":
+        projects = ProjectList(self)
+        projects._shared = {p.id: p for p in self}
+        projects._copy_index(self)
+        return projects
+
+    def shares(self, project: Project) -> bool:
+        """True when ``project`` is still the one of the original list, not a copy made to be changed.
+
+        Always False on a list not made by ``writable()``.
+        """
+        return self._shared is not None and self._shared.get(project.id) is project
+
+    def _copy_index(self, other: "ProjectList"):
+        if other._by_id is not None:
+            self._by_id, self._by_name = dict(other._by_id), dict(other._by_name)
+            self._max_project = other._max_project
+        if other._by_task is not None:
+            self._by_task = dict(other._by_task)
+        self._max_task = other._max_task
+
+    def edit(self, project: Project) -> Project:
+        """Return the copy of ``project`` owned by this list, copying it if it is still shared."""
+        shared = self._shared
+        if not shared or shared.get(project.id) is not project:
+            return project
+        del shared[project.id]
+        copy = project.copy()
+        # compared by identity: == would read the tasks of lazy projects
+        self[next(i for i, p in enumerate(self) if p is project)] = copy
+        if self._by_id is not None:
+            if self._by_id.get(project.id) is project:
+                self._by_id[project.id] = copy
+            if self._by_name.get(project.name) is project:
+                self._by_name[project.name] = copy
+        if self._by_task is not None:
+            # the task table was built, so the tasks of a lazy project are loaded
+            by_task = self._by_task
+            for t in copy.tasks:
+                if by_task.get(t.id, (None,))[0] is project:
+                    by_task[t.id] = (copy, t)
+        return copy
+
+    def _project_index(self):
+        if self._by_id is None:
+            by_id, by_name = {}, {}
+            for p in self:
+                by_id.setdefault(p.id, p)
+                by_name.setdefault(p.name, p)
+            self._by_id, self._by_name = by_id, by_name
+            self._max_project = max(by_id, default=0)
+
+    def _task_index(self):
+        if self._by_task is None:
+            by_task = {}
+            for p in self:
+                for t in p.tasks:
+                    by_task.setdefault(t.id, (p, t))
+            self._by_task = by_task
+
+    def find_task(self, task_id: int) -> Optional[Tuple[Project, Task]]:
+        self._task_index()
+        found = self._by_task.get(task_id)
+        if found and self._shared:
+            self.edit(found[0])
+            found = self._by_task[task_id]
+        return found
+
+    def find_project(self, ident) -> Optional[Project]:
+        """Return a project by id or name. Numeric strings are tried as ids after names."""
+        self._project_index()
+        if isinstance(ident, int):
+            proj = self._by_id.get(ident)
+        else:
+            proj = self._by_name.get(ident)
+            if proj is None and isinstance(ident, str) and ident.isdigit():
+                proj = self._by_id.get(int(ident))
+        return self.edit(proj) if proj is not None else None
+
+    def next_task_id(self) -> int:
+        if self._max_task is None:
+            self._max_task = max((p.max_task_id() for p in self), default=0)
+        return self._max_task + 1
+
+    def next_project_id(self) -> int:
+        self._project_index()
+        return self._max_project + 1
+
+    def add_project(self, project: Project):
+        self._project_index()
+        self.append(project)
+        self._by_id.setdefault(project.id, project)
+        self._by_name.setdefault(project.name, project)
+        self._max_project = max(self._max_project, project.id)
+        for t in project.tasks:
+            self._task_added(project, t)
+
+    def remove_project(self, project: Project):
+        self.remove(project)
+        if self._shared:
+            self._shared.pop(project.id, None)
+        self._by_id = self._by_task = self._max_task = None
+
+    def rename_project(self, project: Project, name: str):
+        project = self.edit(project)
+        self._project_index()
+        if self._by_name.get(project.name) is project:
+            del self._by_name[project.name]
+        project.name = name
+        self._by_name.setdefault(name, project)
+
+    def add_task(self, project: Project, task: Task):
+        project = self.edit(project)
+        project.add_task(task)
+        self._task_added(project, task)
+
+    def _task_added(self, project: Project, task: Task):
+        if self._by_task is not None:
+            self._by_task.setdefault(task.id, (project, task))
+        if self._max_task is not None:
+            self._max_task = max(self._max_task, task.id)
+
+    def remove_task(self, task_id: int) -> Optional[Tuple[Project, Task]]:
+        found = self.find_task(task_id)
+        if found:
+            project, task = found
+            project.remove_task(task)
+            del self._by_task[task_id]
+        return found
+
+
+class LazyProject(Project):
+    """A project whose tasks are read from the snapshot file on first access.
+
+    ``source`` is (path, file signature, byte offset, byte length) of the
+    project object in the file. The counters and the highest task id come
+    from the initial scan so ``progress()`` and ``max_task_id()`` do not need
+    the tasks; the counters are checked once the tasks are read. If another
+    process saved the file since, the project is read as it is in the new
+    file (without tasks if it is gone); the repository notices the new
+    signature and reloads its cache on the next view.
+    """
+
+    def __init__(self, header: dict, source: tuple, counters: TaskCounters, max_task: int):
+        super().__init__(
+            id=header["id"],
+            name=header["name"],
+            description=header.get("description", ""),
+            priority=header.get("priority", 3),
+            deadline=header.get("deadline"),
+            status=header.get("status", "en cours"),
+        )
+        self._tasks = None
+        self.source = source
+        self.counters = counters
+        self.max_task = max_task
+
+    def _read(self) -> dict:
+        path, signature, offset, length = self.source
+        try:
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())
+                current = (st.st_mtime_ns, st.st_size, st.st_ino)
+                if current == signature:
+                    f.seek(offset)
+                    return serialization.loads(f.read(length))
+                # saved by another process since the scan
+                for offset, length, data in iter_json_array(f):
+                    if data.get("id") == self.id:
+                        self.source = (path, current, offset, length)
+                        return data
+        except FileNotFoundError:
+            pass
+        return {}
+
+    @property
+    def tasks(self) -> List[Task]:
+        if self._tasks is None:
+            data = self._read()
+            self._tasks = [Task.from_dict(td) for td in data.get("tasks", [])]
+            self.check_counters()
+        return self._tasks
+
+    @tasks.setter
+    def tasks(self, value: List[Task]):
+        self._tasks = value
+
+    @property
+    def loaded(self) -> bool:
+        return self._tasks is not None
+
+    def max_task_id(self) -> int:
+        return super().max_task_id() if self.loaded else self.max_task
+
+    def copy(self) -> Project:
+        if self.loaded:
+            return Project(
+                id=self.id,
+                name=self.name,
+                description=self.description,
+                priority=self.priority,
+                deadline=self.deadline,
+                status=self.status,
+                tasks=[t.copy() for t in self.tasks],
+                counters=self.counters.copy(),
+            )
+        header = _project_header(self)
+        return LazyProject(header, self.source, self.counters.copy(), self.max_task)
+
+
+def iter_json_array(f, chunk_size: int = 1 << 20):
+    """Yield (byte offset, byte length, value) for each element of a JSON array.
+
+    ``f`` is a binary file containing a top-level array. Only the current
+    element and one chunk are held in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    base = 0  # byte offset of buf[pos]
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + utf8.decode(chunk, final=eof)
+        pos = 0
+
+    def skip(chars: str):
+        nonlocal pos, base
+        while True:
+            start = pos
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            base += len(buf[start:pos].encode("utf-8"))
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    skip(" \t\r\n\ufeff")
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("expected a JSON array")
+    pos += 1
+    base += 1
+    while True:
+        skip(" \t\r\n,")
+        if pos >= len(buf):
+            raise ValueError("unterminated JSON array")
+        if buf[pos] == "]":
+            return
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                # a number running to the end of the chunk may go on in the next one
+                if eof or buf[end:].strip("0123456789+-.eE"):
+                    break
+            except ValueError:
+                if eof:
+                    raise
+            fill()
+        length = len(buf[pos:end].encode("utf-8"))
+        yield base, length, value
+        base += length
+        pos = end
+
+
+def _load_lazy(path: Path) -> List[Project]:
+    """Read project headers from a JSON snapshot, leaving tasks on disk.
+
+    Projects sharing task ids with an earlier project are loaded eagerly so
+    the duplicates can be renumbered like ``_unique_task_ids`` does.
+    """
+    signature = _file_signature(path)
+    projects: List[Project] = []
+    seen = set()
+    duplicates = []
+    with open(path, "rb") as f:
+        for offset, length, data in iter_json_array(f):
+            tasks = data.get("tasks", [])
+            ids = [td["id"] for td in tasks]
+            if seen.isdisjoint(ids) and len(set(ids)) == len(ids):
+                if "counters" in data:
+                    counters = TaskCounters.from_dict(data["counters"])
+                else:
+                    counters = TaskCounters.of(Task.from_dict(td) for td in tasks)
+                proj = LazyProject(data, (path, signature, offset, length), counters, max(ids, default=0))
+            else:
+                proj = Project.from_dict(data)
+                for t in proj.tasks:
+                    if t.id in seen:
+                        duplicates.append(t)
+                    seen.add(t.id)
+            seen.update(ids)
+            projects.append(proj)
+    next_id = max(seen, default=0) + 1
+    for t in duplicates:
+        t.id = next_id
+        next_id += 1
+    return projects
+
+
+def _unique_task_ids(projects: List[Project]) -> List[Project]:
+    """Renumber tasks whose id is already used by an earlier task.
+
+    Task ids used to be allocated per project; the first task keeps its id so
+    the result is the same every time the same data is loaded.
+    """
+    seen = set()
+    duplicates = []
+    for p in projects:
+        for t in p.tasks:
+            if t.id in seen:
+                duplicates.append(t)
+            seen.add(t.id)
+    next_id = max(seen, default=0) + 1
+    for t in duplicates:
+        t.id = next_id
+        next_id += 1
+    return projects
+
+
+def _project_header(p: Project) -> dict:
+    return {
+        "id": p.id,
+        "name": p.name,
+        "description": p.description,
+        "priority": p.priority,
+        "deadline": p.deadline,
+        "status": p.status,
+    }
+
+
+def _same_tasks(a: Project, b: Project) -> bool:
+    """True when both projects still point at the same unloaded snapshot tasks."""
+    return (
+        isinstance(a, LazyProject) and isinstance(b, LazyProject)
+        and not a.loaded and not b.loaded and a.source == b.source
+    )
+
+
+def _saved(projects: List[Project]) -> ProjectList:
+    """The cache once ``projects`` are saved.
+
+    A list from ``load()`` hands its projects over to the cache and shares
+    them again from then on; any other list is copied.
+    """
+    if getattr(projects, "_shared", None) is None:
+        return ProjectList(p.copy() for p in projects)
+    cache = ProjectList(projects)
+    cache._copy_index(projects)
+    projects._shared = {p.id: p for p in projects}
+    return cache
+
+
+def _diff_records(old: List[Project], new: List[Project]) -> List[dict]:
+    """Return the journal records turning ``old`` into ``new``.
+
+    A project that is the very object cached in ``old`` was not copied for
+    writing and is skipped without looking at its tasks.
+    """
+    records = []
+    old_by_id = {p.id: p for p in old}
+    new_ids = {p.id for p in new}
+    for p in old:
+        if p.id not in new_ids:
+            records.append({"op": "delete_project", "id": p.id})
+    for p in new:
+        before = old_by_id.get(p.id)
+        if before is p:
+            continue
+        header = _project_header(p)
+        if before is None or _project_header(before) != header:
+            records.append({"op": "project", "data": header})
+        if before is not None and _same_tasks(before, p):
+            continue
+        old_tasks = {t.id: t for t in before.tasks} if before else {}
+        new_task_ids = set()
+        for t in p.tasks:
+            new_task_ids.add(t.id)
+            if old_tasks.get(t.id) != t:
+                records.append({"op": "task", "project": p.id, "data": t.to_dict()})
+        for tid in old_tasks:
+            if tid not in new_task_ids:
+                records.append({"op": "delete_task", "project": p.id, "id": tid})
+    return records
+
+
+def _replay(projects: List[Project], lines) -> List[Project]:
+    """Apply journal records on top of ``projects``. Replaying twice is harmless."""
+    by_id = {p.id: p for p in projects}
+    touched = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rec = serialization.loads(line.encode("utf-8"))
+        except ValueError:
+            # a torn last line after a crash
+            continue
+        op = rec.get("op")
+        if op == "project":
+            header = rec["data"]
+            proj = by_id.get(header["id"])
+            if proj is None:
+                proj = Project.from_dict(header)
+                by_id[proj.id] = proj
+                projects.append(proj)
+            else:
+                proj.name = header["name"]
+                proj.description = header.get("description", "")
+                proj.priority = header.get("priority", 3)
+                proj.deadline = header.get("deadline")
+                proj.status = header.get("status", "en cours")
+        elif op == "delete_project":
+            proj = by_id.pop(rec["id"], None)
+            if proj is not None:
+                projects.remove(proj)
+        elif op == "task":
+            proj = by_id.get(rec["project"])
+            if proj is None:
+                continue
+            task = Task.from_dict(rec["data"])
+            touched[proj.id] = proj
+            for i, t in enumerate(proj.tasks):
+                if t.id == task.id:
+                    proj.tasks[i] = task
+                    break
+            else:
+                proj.tasks.append(task)
+        elif op == "delete_task":
+            proj = by_id.get(rec["project"])
+            if proj is not None:
+                proj.tasks = [t for t in proj.tasks if t.id != rec["id"]]
+                touched[proj.id] = proj
+    for proj in touched.values():
+        proj.recount()
+    return projects
+
+
+class ProjectRepository:
+    """Keep the parsed projects in memory and reload them only when the file changes.
+
+    ``view()`` hands out the cached objects and must be treated as read-only.
+    ``load()`` returns a writable ``ProjectList`` sharing them, which copies
+    only the projects looked up to be changed; give it back to ``save()``,
+    which compares only those projects with the cache and keeps them.
+
+    Snapshots are written in ``format`` (see ``serialization.FORMATS``);
+    binary snapshots go to ``binary_path`` instead of ``path``. A snapshot
+    left in the other format is still read and replaced on the next write.
+
+    In lazy mode JSON snapshots are scanned incrementally and only project
+    headers are kept; the tasks of a project are read when first accessed.
+
+    In journal mode ``save()`` appends only the changed projects and tasks to
+    ``journal_path`` as JSONL records. They are replayed on top of the
+    snapshot when loading and folded back into it by ``compact()`` once the
+    journal grows past ``journal_max_bytes``.
+
+    Writes hold ``lock`` exclusively and replace files atomically; reloads
+    hold it shared so they never see a snapshot and journal out of step.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        journal_path: Optional[Path] = None,
+        binary_path: Optional[Path] = None,
+        lock: Optional[FileLock] = None,
+    ):
+        self.path = path
+        self.lock = lock or file_lock(path.with_suffix(".lock"))
+        self.json_path = path
+        self.binary_path = binary_path
+        self.journal_path = journal_path
+        self.format = "pretty"
+        self.lazy = False
+        self.journal = False
+        self.journal_max_bytes = JOURNAL_MAX_BYTES
+        self._lock = threading.RLock()
+        self._signature: Optional[tuple] = None
+        self._projects = ProjectList()
+        self._compactor: Optional[threading.Thread] = None
+
+    def configure(self, settings: dict):
+        self.format = settings.get("format", "pretty")
+        if self.format not in serialization.FORMATS:
+            raise ValueError(f"Unknown storage format: {self.format}")
+        if self.format == "binary" and self.binary_path is not None:
+            self.path = self.binary_path
+        else:
+            self.path = self.json_path
+        self.lazy = bool(settings.get("lazy", False))
+        self.journal = bool(settings.get("journal", False)) and self.journal_path is not None
+        self.journal_max_bytes = int(settings.get("journal_max_bytes", JOURNAL_MAX_BYTES))
+        self.lock.timeout = float(settings.get("lock_timeout", LOCK_TIMEOUT))
+
+    def _other_path(self) -> Optional[Path]:
+        return self.json_path if self.path != self.json_path else self.binary_path
+
+    def _snapshot_path(self) -> Path:
+        other = self._other_path()
+        if not self.path.exists() and other is not None and other.exists():
+            return other
+        return self.path
+
+    def _current_signature(self) -> tuple:
+        journal = _file_signature(self.journal_path) if self.journal_path else None
+        return (_file_signature(self._snapshot_path()), journal)
+
+    def _refresh(self):
+        if self._current_signature() == self._signature:
+            return
+        with self.lock.locked(shared=True), self._lock:
+            self._reload()
+
+    def _reload(self):
+        signature = self._current_signature()
+        if signature == self._signature:
+            return
+        snapshot, journal = signature
+        path = self._snapshot_path()
+        if snapshot is None:
+            projects = []
+        elif self.lazy and path == self.json_path:
+            projects = _load_lazy(path)
+        else:
+            data = serialization.read_file(path)
+            projects = _unique_task_ids([Project.from_dict(d) for d in data])
+        if journal is not None:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                projects = _replay(projects, f)
+        self._projects = ProjectList(projects)
+        self._signature = signature
+
+    def view(self) -> ProjectList:
+        self._refresh()
+        return self._projects
+
+    def version(self) -> list:
+        """Changes whenever the snapshot or the journal is written, by any process."""
+        return [list(s) if s else None for s in self._current_signature()]
+
+    def load(self) -> ProjectList:
+        return self.view().writable()
+
+    @contextmanager
+    def transaction(self):
+        with self.lock.locked(), self._lock:
+            projects = self.load()
+            yield projects
+            self.save(projects)
+
+    def _write_snapshot(self, projects: List[Project]):
+        serialization.write_file(self.path, [p.to_dict() for p in projects], self.format)
+        other = self._other_path()
+        if other is not None and other.exists():
+            other.unlink()
+        if self.journal_path and self.journal_path.exists():
+            self.journal_path.unlink()
+
+    def save(self, projects: List[Project]):
+        with self.lock.locked(), self._lock:
+            self._reload()
+            records = _diff_records(self._projects, projects)
+            if not records and self._signature[0] is not None:
+                return
+            previous, previous_version = self._projects, self.version()
+            if self.journal and self.path.exists():
+                lines = [serialization.dumps(rec, "compact").decode("utf-8") + "\n" for rec in records]
+                with open(self.journal_path, "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+            else:
+                self._write_snapshot(projects)
+            self._projects = _saved(projects)
+            self._signature = self._current_signature()
+            _notify(previous, self._projects, previous_version, self.version())
+            if self.journal and self._signature[1] and self._signature[1][1] > self.journal_max_bytes:
+                self._start_compaction()
+
+    def _start_compaction(self):
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        # not a daemon: a CLI process waits for the snapshot to be written before exiting
+        self._compactor = threading.Thread(target=self.compact, name="journal-compaction")
+        self._compactor.start()
+
+    def compact(self):
+        """Fold the journal into the snapshot file."""
+        with self.lock.locked(), self._lock:
+            self._reload()
+            if self._signature[1] is None:
+                return
+            previous_version = self.version()
+            self._write_snapshot(self._projects)
+            self._signature = self._current_signature()
+            _notify(self._projects, self._projects, previous_version, self.version())
+
+    def write_snapshot(self, projects: List[Project]):
+        """Rewrite the whole snapshot, folding in any pending journal."""
+        with self.lock.locked(), self._lock:
+            self._reload()
+            previous, previous_version = self._projects, self.version()
+            self._write_snapshot(projects)
+            self._projects = _saved(projects)
+            self._signature = self._current_signature()
+            _notify(previous, self._projects, previous_version, self.version())
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+            self._projects = ProjectList()
+
+    def scheduled_between(self, start: date, end: date, include_done: bool = True) -> List[Tuple[Project, Task]]:
+        return _scan_scheduled(self.view(), start, end, include_done)
+
+
+class ShardedRepository:
+    """Store each project with its tasks in its own file under ``directory``.
+
+    ``manifest.json`` lists the projects in order with the shard file and a
+    version taken from a global revision counter. ``save()`` rewrites only
+    the shards of projects that changed, and a reload after another process
+    wrote re-reads only the shards whose version moved. When the manifest
+    does not exist yet the projects of ``source`` are migrated into shards;
+    the old single file is left in place as a backup.
+    """
+
+    def __init__(self, directory: Path, source: Optional[ProjectRepository] = None, lock: Optional[FileLock] = None):
+        self.directory = directory
+        self.lock = lock or (source.lock if source is not None else file_lock(directory.with_suffix(".lock")))
+        self.manifest_path = directory / "manifest.json"
+        self.source = source
+        self.format = "pretty"
+        self._lock = threading.RLock()
+        self._signature: Optional[tuple] = None
+        self._revision = 0
+        self._entries: Dict[int, dict] = {}
+        self._projects = ProjectList()
+
+    def configure(self, settings: dict):
+        self.format = settings.get("format", "pretty")
+        self.lock.timeout = float(settings.get("lock_timeout", LOCK_TIMEOUT))
+        if self.source is not None:
+            self.source.configure(settings)
+
+    def _shard_name(self, project_id: int) -> str:
+        return f"{project_id}.bin" if self.format == "binary" else f"{project_id}.json"
+
+    def _refresh(self):
+        signature = _file_signature(self.manifest_path)
+        if signature is not None and signature == self._signature:
+            return
+        # creating the shards from the single file is a write
+        with self.lock.locked(shared=self.manifest_path.exists()), self._lock:
+            self._reload()
+
+    def _reload(self):
+        if not self.manifest_path.exists():
+            self._migrate()
+        signature = _file_signature(self.manifest_path)
+        if signature == self._signature:
+            return
+        manifest = serialization.read_file(self.manifest_path)
+        cached = {p.id: p for p in self._projects}
+        projects = []
+        entries = {}
+        for entry in manifest["projects"]:
+            pid = entry["id"]
+            proj = cached.get(pid)
+            if proj is None or self._entries.get(pid) != entry:
+                proj = Project.from_dict(serialization.read_file(self.directory / entry["file"]))
+            projects.append(proj)
+            entries[pid] = entry
+        self._projects = ProjectList(projects)
+        self._entries = entries
+        self._revision = manifest.get("revision", 0)
+        self._signature = signature
+
+    def _migrate(self):
+        projects = self.source.load() if self.source is not None else []
+        self.directory.mkdir(exist_ok=True)
+        self._entries = {}
+        self._write(_unique_task_ids(projects), force=True)
+
+    def _write(self, projects: List[Project], force: bool = False):
+        old = {p.id: p for p in self._projects}
+        revision = self._revision
+        entries = {}
+        changed = force or [p.id for p in projects] != list(self._entries)
+        for p in projects:
+            entry = self._entries.get(p.id)
+            name = self._shard_name(p.id)
+            before = old.get(p.id)
+            if force or entry is None or entry["file"] != name or (before is not p and before != p):
+                revision += 1
+                serialization.write_file(self.directory / name, p.to_dict(), self.format)
+                if entry is not None and entry["file"] != name:
+                    (self.directory / entry["file"]).unlink(missing_ok=True)
+                entry = {"id": p.id, "file": name, "version": revision}
+                changed = True
+            entries[p.id] = entry
+        for pid, entry in self._entries.items():
+            if pid not in entries:
+                (self.directory / entry["file"]).unlink(missing_ok=True)
+        if changed:
+            manifest = {"revision": revision, "projects": list(entries.values())}
+            serialization.write_file(self.manifest_path, manifest, "compact")
+        self._projects = _saved(projects)
+        self._entries = entries
+        self._revision = revision
+        self._signature = _file_signature(self.manifest_path)
+
+    def view(self) -> ProjectList:
+        self._refresh()
+        return self._projects
+
+    def version(self) -> list:
+        """Changes whenever the manifest is written, by any process."""
+        signature = _file_signature(self.manifest_path)
+        return [list(signature) if signature else None]
+
+    def load(self) -> ProjectList:
+        return self.view().writable()
+
+    @contextmanager
+    def transaction(self):
+        with self.lock.locked(), self._lock:
+            projects = self.load()
+            yield projects
+            self.save(projects)
+
+    def save(self, projects: List[Project]):
+        with self.lock.locked(), self._lock:
+            self._reload()
+            previous, previous_version = self._projects, self.version()
+            self._write(projects)
+            _notify(previous, self._projects, previous_version, self.version())
+
+    def write_snapshot(self, projects: List[Project]):
+        """Rewrite every shard."""
+        with self.lock.locked(), self._lock:
+            self._reload()
+            previous, previous_version = self._projects, self.version()
+            self._write(projects, force=True)
+            _notify(previous, self._projects, previous_version, self.version())
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+            self._entries = {}
+            self._projects = ProjectList()
+
+    def scheduled_between(self, start: date, end: date, include_done: bool = True) -> List[Tuple[Project, Task]]:
+        return _scan_scheduled(self.view(), start, end, include_done)
+
+
+def _scan_scheduled(projects, start: date, end: date, include_done: bool) -> List[Tuple[Project, Task]]:
+    """Return tasks whose planned start (or deadline) falls in [start, end)."""
+    lo, hi = start.isoformat(), end.isoformat()
+    found = []
+    for p in projects:
+        for t in p.tasks:
+            when = t.planned_start or t.deadline
+            if not when or not (lo <= when < hi):
+                continue
+            if include_done or t.status != "done":
+                found.append((p, t))
+    return found
+
+
+_repositories: dict = {}
+_settings: dict = {}
+_settings_signature: Optional[tuple] = None
+
+
+def storage_settings() -> dict:
+    """Return the ``storage`` section of config.json.
+
+    The backend can be overridden with the ``IA_MANAGER_STORAGE`` environment
+    variable.
+    """
+    global _settings, _settings_signature
+    signature = _file_signature(CONFIG_FILE)
+    if signature != _settings_signature:
+        _settings = dict(load_config().get("storage", {}))
+        _settings_signature = signature
+    settings = dict(_settings)
+    if os.environ.get("IA_MANAGER_STORAGE"):
+        settings["backend"] = os.environ["IA_MANAGER_STORAGE"]
+    return settings
+
+
+def _json_repository(layout: str):
+    single = ProjectRepository(PROJECTS_FILE, JOURNAL_FILE, PROJECTS_BIN_FILE, file_lock(PROJECTS_LOCK))
+    if layout == "single":
+        return single
+    if layout == "sharded":
+        return ShardedRepository(SHARDS_DIR, single)
+    raise ValueError(f"Unknown storage layout: {layout}")
+
+
+def get_repository():
+    """Return the repository of the configured backend (``json`` or ``sqlite``).
+
+    The JSON backend stores all projects in one file or, with the
+    ``sharded`` layout, one file per project.
+    """
+    settings = storage_settings()
+    backend = settings.get("backend", "json")
+    layout = settings.get("layout", "single")
+    repo = _repositories.get((backend, layout))
+    if repo is None:
+        if backend == "json":
+            repo = _json_repository(layout)
+        elif backend == "sqlite":
+            from .sqlite_store import SqliteRepository
+            source = _json_repository(layout)
+            source.configure(settings)
+            from .memory import export_memory
+            repo = SqliteRepository(DB_FILE, source, export_memory)
+        else:
+            raise ValueError(f"Unknown storage backend: {backend}")
+        _repositories[(backend, layout)] = repo
+    repo.configure(settings)
+    return repo
+
+
+def format_path(json_file: Path, bin_file: Path, existing: bool = True) -> Path:
+    """Return ``json_file`` or ``bin_file``, whichever matches the configured format.
+
+    With ``existing`` a file left in the other format is returned when the
+    configured one does not exist yet.
+    """
+    path, other = json_file, bin_file
+    if storage_settings().get("format") == "binary":
+        path, other = other, path
+    if existing and not path.exists() and other.exists():
+        return other
+    return path
+
+
+def memory_path(existing: bool = True) -> Path:
+    """Return the combined memory file used before notes, history and session note were split."""
+    return format_path(MEMORY_FILE, MEMORY_BIN_FILE, existing)
+
+
+def notes_path(existing: bool = True) -> Path:
+    return format_path(NOTES_FILE, NOTES_BIN_FILE, existing)
+
+
+def sqlite_repository():
+    """Return the SQLite repository when it is the active backend, else None."""
+    from .sqlite_store import SqliteRepository
+    repo = get_repository()
+    return repo if isinstance(repo, SqliteRepository) else None
+
+
+class Session:
+    """Unit of work: projects loaded once, changed in memory and flushed once.
+
+    Created by ``session()``. While it is active in a thread, the module
+    level functions (``view_projects``, ``load_projects``, ``save_projects``,
+    ``transaction`` and ``scheduled_between``) work on ``projects`` instead
+    of the repository.
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.projects = repo.load()
+        self.dirty = False
+
+    def replace(self, projects: List[Project]):
+        if projects is not self.projects:
+            self.projects = ProjectList(projects)
+        self.dirty = True
+
+    @contextmanager
+    def transaction(self):
+        # savepoint: the step works on a writable list over the session's
+        # projects, so a failing step leaves the earlier steps intact
+        saved = self.projects
+        self.projects = saved.writable()
+        try:
+            yield self.projects
+        except BaseException:
+            self.projects = saved
+            raise
+        self.dirty = True
+
+    def flush(self):
+        if self.dirty:
+            self.repo.save(self.projects)
+            self.dirty = False
+
+
+_local = threading.local()
+
+
+def current_session() -> Optional[Session]:
+    return getattr(_local, "session", None)
+
+
+@contextmanager
+def session():
+    """Group several mutations into a single load and a single save.
+
+    The repository stays locked for the whole block. Changes are written
+    once when the block ends and discarded if it raises::
+
+        with storage.session():
+            for name in names:
+                commands.add_task(SimpleNamespace(project="Exemple", name=name, ...))
+
+    Nested calls join the active session.
+    """
+    active = current_session()
+    if active is not None:
+        yield active
+        return
+    repo = get_repository()
+    with repo.lock.locked():
+        active = _local.session = Session(repo)
+        try:
+            yield active
+        finally:
+            _local.session = None
+        active.flush()
+
+
+def data_version() -> list:
+    """A JSON value that changes whenever the projects are saved, by this process or another."""
+    return get_repository().version()
+
+
+class Change(NamedTuple):
+    """One save of the projects by this process, as given to ``on_save`` listeners.
+
+    ``before`` and ``after`` map the id of every project the save replaced,
+    added or removed to the project as it was and as it is now; projects
+    that are the same object in ``previous`` and ``projects`` did not change.
+    """
+
+    previous: ProjectList  # cached projects before the save
+    projects: ProjectList  # and after it
+    before: Dict[int, Project]
+    after: Dict[int, Project]
+    previous_version: list  # data_version() before the save
+    version: list
+
+
+_listeners: List[Callable[[Change], None]] = []
+
+
+def on_save(listener: Callable[[Change], None]):
+    """Call ``listener`` after every save of the projects by this process.
+
+    It runs while the repository is still locked, so no other save comes
+    between ``previous_version`` and ``version``. Saves by other processes
+    are not reported.
+    """
+    _listeners.append(listener)
+
+
+def _notify(previous: ProjectList, projects: ProjectList, previous_version: list, version: list):
+    if not _listeners:
+        return
+    old = {p.id: p for p in previous}
+    new = {p.id: p for p in projects}
+    change = Change(
+        previous,
+        projects,
+        {pid: p for pid, p in old.items() if new.get(pid) is not p},
+        {pid: p for pid, p in new.items() if old.get(pid) is not p},
+        previous_version,
+        version,
+    )
+    for listener in list(_listeners):
+        listener(change)
+
+
+def view_projects() -> ProjectList:
+    """Return the cached projects. The result is shared and must not be modified."""
+    active = current_session()
+    if active is not None:
+        return active.projects
+    return get_repository().view()
+
+
+def load_projects() -> ProjectList:
+    """Return the projects to modify and save, as a writable ``ProjectList``.
+
+    Projects are copied when looked up with ``find_project``/``find_task``
+    or passed to ``edit()``; the others are shared with the cache.
+    """
+    active = current_session()
+    if active is not None:
+        return active.projects
+    return get_repository().load()
 
 
 def save_projects(projects: List[Project]):
-    with open(PROJECTS_FILE, "w", encoding="utf-8") as f:
-        json.dump([p.to_dict() for p in projects], f, indent=2, ensure_ascii=False)
+    active = current_session()
+    if active is not None:
+        active.replace(projects)
+        return
+    get_repository().save(projects)
+
+
+def transaction():
+    """Load the projects under an exclusive lock and save them when the block ends.
+
+    Nothing is written if the block raises::
+
+        with storage.transaction() as projects:
+            project, task = projects.find_task(3)
+            task.status = "done"
+
+    Inside ``session()`` the block works on the session's projects and the
+    save is deferred to the end of the session.
+    """
+    active = current_session()
+    if active is not None:
+        return active.transaction()
+    return get_repository().transaction()
+
+
+def compact_journal():
+    """Fold pending journal records into projects.json."""
+    repo = get_repository()
+    if isinstance(repo, ProjectRepository):
+        repo.compact()
+
+
+def repair_counters() -> List[Project]:
+    """Recount the tasks of every project and rewrite the data files if counters had drifted.
+
+    Counters are not part of the journal diff, so a repair rewrites the snapshot.
+    Returns the projects that were fixed.
+    """
+    repo = get_repository()
+    with repo.lock.locked():
+        projects = repo.load()
+        fixed = [projects.edit(p) for p in projects if p.counters != TaskCounters.of(p.tasks)]
+        for p in fixed:
+            p.recount()
+        if fixed and hasattr(repo, "write_snapshot"):
+            repo.write_snapshot(projects)
+    return fixed
+
+
+def scheduled_between(start: date, end: date, include_done: bool = True) -> List[Tuple[Project, Task]]:
+    """Return (project, task) pairs planned or due between ``start`` (inclusive) and ``end``.
+
+    The returned objects come from the shared cache and must not be modified.
+    """
+    active = current_session()
+    if active is not None:
+        return _scan_scheduled(active.projects, start, end, include_done)
+    return get_repository().scheduled_between(start, end, include_done)
+
+
+def migrate_to_sqlite() -> int:
+    """Import the projects, notes, session note and history into a new database and make it the backend."""
+    from .memory import export_memory
+    from .sqlite_store import SqliteRepository, migrate_json
+    if DB_FILE.exists():
+        raise RuntimeError(f"{DB_FILE} already exists")
+    settings = storage_settings()
+    source = _json_repository(settings.get("layout", "single"))
+    source.configure(settings)
+    mem = export_memory()
+    repo = SqliteRepository(DB_FILE)
+    count = migrate_json(repo, source.load(), mem)
+    _repositories[("sqlite", settings.get("layout", "single"))] = repo
+    config = load_config()
+    config.setdefault("storage", {})["backend"] = "sqlite"
+    save_config(config)
+    return count
+
+
+def convert_format(fmt: str):
+    """Rewrite projects and notes in another format and make it the configured one."""
+    from .memory import convert_format as convert_memory
+    if fmt not in serialization.FORMATS:
+        raise ValueError(f"Unknown storage format: {fmt}")
+    repo = get_repository()
+    if not isinstance(repo, (ProjectRepository, ShardedRepository)):
+        raise RuntimeError("Only the JSON backend stores data files")
+    projects = repo.load()
+    config = load_config()
+    config.setdefault("storage", {})["format"] = fmt
+    save_config(config)
+    get_repository().write_snapshot(projects)
+    convert_memory()
 
 
 def load_config() -> dict:
@@ -35,8 +1263,9 @@ def load_config() -> dict:
 
 
 def save_config(config: dict):
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
+    # config.json stays JSON so it can be edited by hand
+    fmt = config.get("storage", {}).get("format", "pretty")
+    serialization.write_file(CONFIG_FILE, config, "pretty" if fmt == "pretty" else "compact")
 
 
 def load_improvements() -> list:
@@ -47,5 +1276,4 @@ def load_improvements() -> list:
 
 
 def save_improvements(items: list):
-    with open(IMPROVEMENTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(items, f, indent=2, ensure_ascii=False)
+    serialization.write_file(IMPROVEMENTS_FILE, items)
@@ -0,0 +1,256 @@
+"""Offline semantic recall with hashed character n-gram vectors.
+
+Each document becomes a dense vector of ``DIM`` buckets counting the
+character trigrams of its words (``" word "``), hashed with CRC32 so vectors
+are stable across processes. Rows are stored L2-normalized with sublinear
+term frequency; the query is weighted by the inverse document frequency of
+each bucket, and the cosine scores of all documents come from one matrix
+product. Trigrams match spelling variants and shared word stems ("deploy",
+"deployment") that exact tokens miss.
+
+Requires NumPy; ``available()`` is False without it. The matrix can live in
+a memory-mapped file so a large history is not embedded again on start.
+"""
+import os
+import re
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+from . import serialization
+
+DIM = 512
+NGRAM = 3
+WORD_RE = re.compile(r"\w+")
+INITIAL_CAPACITY = 1024
+
+_buckets: Dict[str, int] = {}
+
+
+def available() -> bool:
+    return np is not None
+
+
+def _bucket(gram: str) -> int:
+    b = _buckets.get(gram)
+    if b is None:
+        if len(_buckets) > 1_000_000:
+            _buckets.clear()
+        b = _buckets[gram] = zlib.crc32(gram.encode("utf-8")) % DIM
+    return b
+
+
+def embed(texts: List[str]):
+    """Return a (len(texts), DIM) float32 matrix of normalized n-gram vectors."""
+    cells: List[int] = []
+    for row, text in enumerate(texts):
+        base = row * DIM
+        for word in WORD_RE.findall(text.lower()):
+            padded = f" {word} "
+            for i in range(len(padded) - NGRAM + 1):
+                cells.append(base + _bucket(padded[i:i + NGRAM]))
+    counts = np.bincount(np.array(cells, dtype=np.int64), minlength=len(texts) * DIM)
+    matrix = np.log1p(counts.astype(np.float32)).reshape(len(texts), DIM)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+class VectorIndex:
+    """Vectors of documents identified by an integer key, one matrix row each.
+
+    Removed documents leave a zeroed row behind until the next ``rebuild``.
+    With ``path`` the matrix is a memory-mapped file and ``save`` writes the
+    row bookkeeping next to it (``<path>.json``) so ``open`` can reuse it. A
+    new file is written under a temporary name and renamed over the old one,
+    so another process that has the old file mapped keeps reading it intact;
+    ``stale()`` tells that process to ``open`` the new one. Callers sharing
+    the file between processes serialize changes and saves with a lock.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self.rows: Dict[int, int] = {}  # key -> row
+        self.keys: List[Optional[int]] = []  # row -> key, None for a removed document
+        self.fingerprints: Dict[int, int] = {}
+        self.df = np.zeros(DIM, dtype=np.float64)
+        self.source = None
+        self.inode = None  # of the file mapped in ``matrix``
+        self.matrix = self._allocate(INITIAL_CAPACITY)
+        self._publish()
+
+    def _allocate(self, capacity: int, mode: str = "w+"):
+        """A zeroed matrix, in a new temporary file until ``_publish``; with ``"r+"`` the file at ``path``."""
+        if self.path is None:
+            return np.zeros((capacity, DIM), dtype=np.float32)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if mode == "r+":
+            matrix = np.memmap(self.path, dtype=np.float32, mode="r+").reshape(-1, DIM)
+            self._file, self.inode = self.path, os.stat(self.path).st_ino
+            return matrix
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp")
+        os.close(fd)
+        self._file = Path(tmp)
+        return np.memmap(tmp, dtype=np.float32, mode="w+", shape=(capacity, DIM))
+
+    def _publish(self):
+        """Rename the temporary file of a new matrix over ``path``."""
+        if self.path is None:
+            return
+        self.matrix.flush()
+        os.replace(self._file, self.path)
+        self._file, self.inode = self.path, os.stat(self.path).st_ino
+
+    def stale(self) -> bool:
+        """True when another process replaced the file this index has mapped."""
+        if self.path is None:
+            return False
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except FileNotFoundError:
+            return True
+
+    def _grow(self, needed: int):
+        capacity = len(self.matrix)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        if self.path is None:
+            matrix = np.zeros((capacity, DIM), dtype=np.float32)
+            matrix[:len(self.keys)] = self.matrix[:len(self.keys)]
+            self.matrix = matrix
+            return
+        # the mapped file, which is still temporary during a rebuild; growing
+        # it leaves the rows another process has mapped in place
+        self.matrix.flush()
+        del self.matrix
+        with open(self._file, "r+b") as f:
+            f.truncate(capacity * DIM * 4)
+        self.matrix = np.memmap(self._file, dtype=np.float32, mode="r+").reshape(-1, DIM)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add_many(self, items: Iterable[Tuple[int, str]]):
+        """Index (key, text) pairs, replacing the previous text of known keys."""
+        items = list(items)
+        if not items:
+            return
+        for key, _text in items:
+            self.remove(key)
+        vectors = embed([text for _key, text in items])
+        start = len(self.keys)
+        self._grow(start + len(items))
+        self.matrix[start:start + len(items)] = vectors
+        self.df += np.count_nonzero(vectors, axis=0)
+        for row, (key, text) in enumerate(items, start):
+            self.rows[key] = row
+            self.keys.append(key)
+            self.fingerprints[key] = zlib.crc32(text.encode("utf-8"))
+
+    def remove(self, key: int):
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        self.df -= self.matrix[row] > 0
+        self.matrix[row] = 0
+        self.keys[row] = None
+        del self.fingerprints[key]
+
+    def sync(self, texts: Dict[int, str]) -> int:
+        """Make the index hold exactly ``texts``, embedding only new or changed ones."""
+        for key in [k for k in self.rows if k not in texts]:
+            self.remove(key)
+        fingerprints = self.fingerprints
+        changed = [
+            (key, text) for key, text in texts.items()
+            if fingerprints.get(key) != zlib.crc32(text.encode("utf-8"))
+        ]
+        self.add_many(changed)
+        if len(self.keys) > 2 * len(self.rows) + INITIAL_CAPACITY:
+            self.rebuild(texts)
+        return len(changed)
+
+    def rebuild(self, texts: Dict[int, str]):
+        self.rows, self.keys, self.fingerprints = {}, [], {}
+        self.df[:] = 0
+        self.matrix = self._allocate(max(INITIAL_CAPACITY, len(texts)))
+        try:
+            self.add_many(texts.items())
+        except BaseException:
+            if self.path is not None:
+                os.unlink(self._file)
+            raise
+        self._publish()
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        accept: Optional[Callable[[int], bool]] = None,
+    ) -> List[Tuple[float, int]]:
+        """Return up to ``limit`` (cosine, key) pairs with a positive score, best first."""
+        n = len(self.keys)
+        if not self.rows or limit <= 0:
+            return []
+        idf = np.log((1 + len(self.rows)) / (1 + self.df)) + 1
+        q = embed([query])[0] * idf
+        norm = np.linalg.norm(q)
+        if not norm:
+            return []
+        scores = self.matrix[:n] @ (q / norm).astype(np.float32)
+        want = limit
+        while True:
+            # over-fetch when filtering so that rejected keys still leave ``limit`` results
+            top = np.argpartition(-scores, want - 1)[:want] if want < n else np.arange(n)
+            results = []
+            for row in top[np.argsort(-scores[top], kind="stable")]:
+                score = float(scores[row])
+                if score <= 0:
+                    break
+                key = self.keys[row]
+                if key is not None and (accept is None or accept(key)):
+                    results.append((score, key))
+            if len(results) >= limit or want >= n:
+                return results[:limit]
+            want = min(n, want * 4)
+
+    def save(self):
+        """Flush the memory-mapped matrix and write the bookkeeping next to it."""
+        if self.path is None or self.stale():
+            return
+        self.matrix.flush()
+        meta = {
+            "dim": DIM,
+            "source": self.source,
+            "keys": self.keys,
+            "fingerprints": [[k, fp] for k, fp in self.fingerprints.items()],
+        }
+        serialization.write_file(self.path.with_suffix(".json"), meta, "compact")
+
+    @staticmethod
+    def open(path: Path) -> "VectorIndex":
+        """Reopen an index written by ``save``; an empty one if there is none."""
+        index = VectorIndex.__new__(VectorIndex)
+        index.path = path
+        try:
+            meta = serialization.read_file(path.with_suffix(".json"))
+            if meta.get("dim") != DIM or not path.exists():
+                raise ValueError("stale vector file")
+        except (FileNotFoundError, ValueError):
+            VectorIndex.__init__(index, path)
+            return index
+        index.source = meta["source"]
+        index.keys = meta["keys"]
+        index.rows = {k: row for row, k in enumerate(index.keys) if k is not None}
+        index.fingerprints = {k: fp for k, fp in meta["fingerprints"]}
+        index.matrix = index._allocate(0, "r+")
+        index.df = np.count_nonzero(index.matrix[:len(index.keys)], axis=0).astype(np.float64)
+        return index
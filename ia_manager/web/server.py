@@ -2,7 +2,7 @@ from flask import Flask, jsonify, request, render_template, Response
 from datetime import datetime, timedelta
 import re
 import json
-from ..services import storage, planner, logger, memory
+from ..services import storage, planner, logger, memory, columnar, recommendations
 from .. import assistant
 from ..models.project import Project
 from ..models.task import Task
@@ -29,30 +29,44 @@ def index():
 
 @app.route('/api/projects', methods=['GET'])
 def get_projects():
-    projects = storage.load_projects()
+    """Return all projects with their tasks, or only headers and counters with ?summary=1."""
+    projects = storage.view_projects()
+    if request.args.get('summary'):
+        return jsonify([_project_summary(p) for p in projects])
     return jsonify([p.to_dict() for p in projects])
 
+
+def _project_summary(p: Project) -> dict:
+    return {
+        'id': p.id,
+        'name': p.name,
+        'description': p.description,
+        'priority': p.priority,
+        'deadline': p.deadline,
+        'status': p.status,
+        'progress': p.progress(),
+        'counters': p.counters.to_dict(),
+    }
+
 @app.route('/api/projects', methods=['POST'])
 def create_project():
     data = request.json
-    projects = storage.load_projects()
-    project_id = max([p.id for p in projects], default=0) + 1
-    project = Project(
-        id=project_id,
-        name=data.get('name', f'Project {project_id}'),
-        description=data.get('description', ''),
-        priority=data.get('priority', 3),
-        deadline=data.get('deadline'),
-    )
-    projects.append(project)
-    storage.save_projects(projects)
+    with storage.transaction() as projects:
+        project_id = projects.next_project_id()
+        project = Project(
+            id=project_id,
+            name=data.get('name', f'Project {project_id}'),
+            description=data.get('description', ''),
+            priority=data.get('priority', 3),
+            deadline=data.get('deadline'),
+        )
+        projects.add_project(project)
     logger.log(f"Web: added project {project.name}")
     return jsonify(project.to_dict())
 
 @app.route('/api/projects/<int:pid>', methods=['GET'])
 def get_project(pid):
-    projects = storage.load_projects()
-    proj = next((p for p in projects if p.id == pid), None)
+    proj = storage.view_projects().find_project(pid)
     if not proj:
         return jsonify({'error': 'not found'}), 404
     return jsonify(proj.to_dict())
@@ -60,151 +74,170 @@ def get_project(pid):
 @app.route('/api/projects/<int:pid>', methods=['PUT', 'DELETE'])
 def modify_project(pid):
     """Rename or delete a project."""
-    projects = storage.load_projects()
-    proj = next((p for p in projects if p.id == pid), None)
-    if not proj:
-        return jsonify({'error': 'not found'}), 404
-
-    if request.method == 'DELETE':
-        projects.remove(proj)
-        storage.save_projects(projects)
-        logger.log(f"Web: deleted project {pid}")
-        return jsonify({'status': 'ok'})
+    with storage.transaction() as projects:
+        proj = projects.find_project(pid)
+        if not proj:
+            return jsonify({'error': 'not found'}), 404
+
+        if request.method == 'DELETE':
+            projects.remove_project(proj)
+            logger.log(f"Web: deleted project {pid}")
+            return jsonify({'status': 'ok'})
 
-    data = request.json
-    proj.name = data.get('name', proj.name)
-    proj.description = data.get('description', proj.description)
-    proj.priority = data.get('priority', proj.priority)
-    proj.deadline = data.get('deadline', proj.deadline)
-    storage.save_projects(projects)
+        data = request.json
+        projects.rename_project(proj, data.get('name', proj.name))
+        proj.description = data.get('description', proj.description)
+        proj.priority = data.get('priority', proj.priority)
+        proj.deadline = data.get('deadline', proj.deadline)
     logger.log(f"Web: updated project {pid}")
     return jsonify(proj.to_dict())
 
 @app.route('/api/projects/<int:pid>/tasks', methods=['POST'])
 def add_task(pid):
     data = request.json
-    projects = storage.load_projects()
-    proj = next((p for p in projects if p.id == pid), None)
-    if not proj:
-        return jsonify({'error': 'not found'}), 404
-    task_id = max([t.id for t in proj.tasks], default=0) + 1
-    task = Task(
-        id=task_id,
-        name=data.get('name', f'Task {task_id}'),
-        estimated=data.get('estimated'),
-        deadline=data.get('deadline'),
-        importance=data.get('importance', 3),
-        description=data.get('description', ''),
-        planned_start=data.get('planned_start'),
-        planned_end=data.get('planned_end'),
-        planned_hours=data.get('planned_hours'),
-    )
-    proj.tasks.append(task)
-    storage.save_projects(projects)
+    with storage.transaction() as projects:
+        proj = projects.find_project(pid)
+        if not proj:
+            return jsonify({'error': 'not found'}), 404
+        task_id = projects.next_task_id()
+        task = Task(
+            id=task_id,
+            name=data.get('name', f'Task {task_id}'),
+            estimated=data.get('estimated'),
+            deadline=data.get('deadline'),
+            importance=data.get('importance', 3),
+            description=data.get('description', ''),
+            planned_start=data.get('planned_start'),
+            planned_end=data.get('planned_end'),
+            planned_hours=data.get('planned_hours'),
+        )
+        projects.add_task(proj, task)
     logger.log(f"Web: added task {task.name} to project {proj.name}")
     return jsonify(task.to_dict())
 
 @app.route('/api/tasks/<int:tid>', methods=['GET'])
 def get_task(tid):
-    projects = storage.load_projects()
-    for p in projects:
-        for t in p.tasks:
-            if t.id == tid:
-                return jsonify(t.to_dict())
-    return jsonify({'error': 'not found'}), 404
+    found = storage.view_projects().find_task(tid)
+    if not found:
+        return jsonify({'error': 'not found'}), 404
+    return jsonify(found[1].to_dict())
 
 @app.route('/api/tasks/<int:tid>', methods=['PUT'])
 def update_task(tid):
     data = request.json
-    projects = storage.load_projects()
-    for p in projects:
-        for t in p.tasks:
-            if t.id == tid:
-                t.name = data.get('name', t.name)
-                t.status = data.get('status', t.status)
-                t.estimated = data.get('estimated', t.estimated)
-                t.deadline = data.get('deadline', t.deadline)
-                t.importance = data.get('importance', t.importance)
-                t.description = data.get('description', t.description)
-                t.planned_start = data.get('planned_start', t.planned_start)
-                t.planned_end = data.get('planned_end', t.planned_end)
-                t.planned_hours = data.get('planned_hours', t.planned_hours)
-                storage.save_projects(projects)
-                logger.log(f"Web: updated task {tid}")
-                return jsonify(t.to_dict())
-    return jsonify({'error': 'not found'}), 404
+    with storage.transaction() as projects:
+        found = projects.find_task(tid)
+        if not found:
+            return jsonify({'error': 'not found'}), 404
+        p, t = found
+        t.name = data.get('name', t.name)
+        p.update_task(t, status=data.get('status', t.status), estimated=data.get('estimated', t.estimated))
+        t.deadline = data.get('deadline', t.deadline)
+        t.importance = data.get('importance', t.importance)
+        t.description = data.get('description', t.description)
+        t.planned_start = data.get('planned_start', t.planned_start)
+        t.planned_end = data.get('planned_end', t.planned_end)
+        t.planned_hours = data.get('planned_hours', t.planned_hours)
+        block = planner.planned_block(p, t)
+        conflicts = planner.schedule_index().conflicts(block) if block else []
+    logger.log(f"Web: updated task {tid}")
+    result = t.to_dict()
+    if conflicts:
+        result['conflicts'] = [b.to_dict() for b in conflicts]
+    return jsonify(result)
 
 
 @app.route('/api/tasks/<int:tid>/start', methods=['POST'])
 def start_task(tid):
-    projects = storage.load_projects()
     now = datetime.utcnow().isoformat()
-    for p in projects:
-        for t in p.tasks:
-            if t.id == tid:
-                if not t.started:
-                    t.started = now
-                    storage.save_projects(projects)
-                    logger.log(f"Web: started task {tid}")
-                return jsonify({'status': 'started'})
-    return jsonify({'error': 'not found'}), 404
+    with storage.transaction() as projects:
+        found = projects.find_task(tid)
+        if not found:
+            return jsonify({'error': 'not found'}), 404
+        _p, t = found
+        if not t.started:
+            t.started = now
+            logger.log(f"Web: started task {tid}")
+    return jsonify({'status': 'started'})
 
 
 @app.route('/api/tasks/<int:tid>/stop', methods=['POST'])
 def stop_task(tid):
-    projects = storage.load_projects()
     now = datetime.utcnow()
-    for p in projects:
-        for t in p.tasks:
-            if t.id == tid:
-                if t.started:
-                    try:
-                        st = datetime.fromisoformat(t.started)
-                        t.time_spent += int((now - st).total_seconds())
-                    except ValueError:
-                        pass
-                    t.started = None
-                    storage.save_projects(projects)
-                    logger.log(f"Web: stopped task {tid}")
-                return jsonify({'time_spent': t.time_spent})
-    return jsonify({'error': 'not found'}), 404
+    with storage.transaction() as projects:
+        found = projects.find_task(tid)
+        if not found:
+            return jsonify({'error': 'not found'}), 404
+        p, t = found
+        if t.started:
+            st = t.started_at
+            if st:
+                p.update_task(t, time_spent=t.time_spent + int((now - st).total_seconds()))
+            t.started = None
+            logger.log(f"Web: stopped task {tid}")
+    return jsonify({'time_spent': t.time_spent})
 
 @app.route('/api/tasks/<int:tid>/done', methods=['POST'])
 def mark_task_done(tid):
-    projects = storage.load_projects()
-    for p in projects:
-        for t in p.tasks:
-            if t.id == tid:
-                if t.started:
-                    try:
-                        st = datetime.fromisoformat(t.started)
-                        t.time_spent += int((datetime.utcnow() - st).total_seconds())
-                    except ValueError:
-                        pass
-                    t.started = None
-                t.status = 'done'
-                storage.save_projects(projects)
-                logger.log(f"Web: done task {tid}")
-                return jsonify({'status': 'ok'})
-    return jsonify({'error': 'not found'}), 404
+    with storage.transaction() as projects:
+        found = projects.find_task(tid)
+        if not found:
+            return jsonify({'error': 'not found'}), 404
+        p, t = found
+        if t.started:
+            st = t.started_at
+            if st:
+                p.update_task(t, time_spent=t.time_spent + int((datetime.utcnow() - st).total_seconds()))
+            t.started = None
+        p.update_task(t, status='done')
+    logger.log(f"Web: done task {tid}")
+    return jsonify({'status': 'ok'})
 
 @app.route('/api/tasks/<int:tid>', methods=['DELETE'])
 def delete_task(tid):
-    projects = storage.load_projects()
-    for p in projects:
-        for t in list(p.tasks):
-            if t.id == tid:
-                p.tasks.remove(t)
-                storage.save_projects(projects)
-                logger.log(f"Web: deleted task {tid}")
-                return jsonify({'status': 'ok'})
-    return jsonify({'error': 'not found'}), 404
+    with storage.transaction() as projects:
+        if not projects.remove_task(tid):
+            return jsonify({'error': 'not found'}), 404
+    logger.log(f"Web: deleted task {tid}")
+    return jsonify({'status': 'ok'})
 
 @app.route('/api/recommendations')
-def recommendations():
-    projs = storage.load_projects()
-    recs = planner.suggest_tasks(projs)
-    return jsonify(recs)
+def recommended_tasks():
+    recs = recommendations.recommend(request.args.get('k', 10, type=int))
+    return jsonify([r.to_dict() for r in recs])
+
+
+@app.route('/api/plan', methods=['GET', 'POST'])
+def plan():
+    """Pack the pending tasks into the configured availability.
+
+    Query params: `start` (YYYY-MM-DD, today by default) and `days` (7).
+    POST also stores the planned blocks on the tasks.
+    """
+    start = datetime.now().date()
+    if request.args.get('start'):
+        try:
+            start = datetime.fromisoformat(request.args['start']).date()
+        except ValueError:
+            return jsonify({'error': 'bad date'}), 400
+    days = max(1, min(request.args.get('days', 7, type=int), 366))
+    now = datetime.now() if start <= datetime.now().date() else None
+    availability = storage.load_config().get('availability')
+    try:
+        if request.method == 'POST':
+            with storage.transaction() as projects:
+                result = planner.schedule(projects, start, days, availability, now)
+                planner.apply_schedule(projects, result)
+            logger.log(f"Web: planned {start} (+{days} days)")
+        else:
+            result = planner.schedule(storage.view_projects(), start, days, availability, now)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'blocks': [b.to_dict() for b in result.blocks],
+        'unscheduled': [{'project_id': p, 'task_id': t} for p, t in result.unscheduled],
+        'late': [{'project_id': p, 'task_id': t} for p, t in result.late],
+    })
 
 
 @app.route('/api/calendar/<date_str>')
@@ -215,23 +248,15 @@ def calendar_day(date_str: str):
     except ValueError:
         return jsonify({'error': 'bad date'}), 400
 
-    projs = storage.load_projects()
     tasks = []
-    for p in projs:
-        for t in p.tasks:
-            date_str = t.planned_start or t.deadline
-            if not date_str:
-                continue
-            try:
-                d = datetime.fromisoformat(date_str)
-            except ValueError:
-                continue
-            if d.date() == day:
-                tasks.append({
-                    'project': p.name,
-                    'task': t.name,
-                    'time': d.strftime('%H:%M') if d.time().hour or d.time().minute else None
-                })
+    for p, t in columnar.scheduled_between(day, day + timedelta(days=1)):
+        d = t.scheduled_at()
+        if d and d.date() == day:
+            tasks.append({
+                'project': p.name,
+                'task': t.name,
+                'time': d.strftime('%H:%M') if d.time().hour or d.time().minute else None
+            })
     return jsonify(tasks)
 
 
@@ -251,23 +276,17 @@ def calendar_week():
         start = today - timedelta(days=today.weekday())
 
     days = { (start + timedelta(days=i)).isoformat(): [] for i in range(7) }
-    projs = storage.load_projects()
-    for p in projs:
-        for t in p.tasks:
-            date_str = t.planned_start or t.deadline
-            if not date_str:
-                continue
-            try:
-                d = datetime.fromisoformat(date_str)
-            except ValueError:
-                continue
-            date_key = d.date().isoformat()
-            if date_key in days:
-                days[date_key].append({
-                    'project': p.name,
-                    'task': t.name,
-                    'time': d.strftime('%H:%M') if d.time().hour or d.time().minute else None
-                })
+    for p, t in columnar.scheduled_between(start, start + timedelta(days=7)):
+        d = t.scheduled_at()
+        if not d:
+            continue
+        date_key = d.date().isoformat()
+        if date_key in days:
+            days[date_key].append({
+                'project': p.name,
+                'task': t.name,
+                'time': d.strftime('%H:%M') if d.time().hour or d.time().minute else None
+            })
     return jsonify(days)
 
 
@@ -275,19 +294,11 @@ def calendar_week():
 def upcoming_deadlines():
     """Return tasks due in the next 7 days."""
     now = datetime.utcnow()
-    projs = storage.load_projects()
     upcoming = []
-    for p in projs:
-        for t in p.tasks:
-            date_str = t.planned_start or t.deadline
-            if t.status == 'done' or not date_str:
-                continue
-            try:
-                d = datetime.fromisoformat(date_str)
-            except ValueError:
-                continue
-            if 0 <= (d - now).days <= 7:
-                upcoming.append({'id': t.id, 'project': p.name, 'task': t.name, 'deadline': d.isoformat()})
+    for p, t in columnar.scheduled_between(now.date(), now.date() + timedelta(days=9), include_done=False):
+        d = t.scheduled_at()
+        if d and 0 <= (d - now).days <= 7:
+            upcoming.append({'id': t.id, 'project': p.name, 'task': t.name, 'deadline': d.isoformat()})
     upcoming.sort(key=lambda x: x['deadline'])
     return jsonify(upcoming)
 
@@ -300,8 +311,8 @@ def notifications_api():
         notif = Notification(id=nid, message=data.get('message', ''), action=data.get('action'))
         notifications.append(notif)
         logger.log(f"Web: added notification {nid}")
-        return jsonify(notif.__dict__), 201
-    return jsonify([n.__dict__ for n in notifications])
+        return jsonify(notif.to_dict()), 201
+    return jsonify([n.to_dict() for n in notifications])
 
 
 @app.route('/api/notifications/<int:nid>/<action>', methods=['POST'])
@@ -348,7 +359,12 @@ def search_api():
     if not query:
         return jsonify({'result': ''})
     user = memory.load_user()
-    result = memory.get_context(query, max_chars=user.context_chars, include_internal=False)
+    result = memory.get_context(
+        query,
+        max_chars=user.context_chars,
+        include_internal=False,
+        semantic_weight=user.semantic_weight,
+    )
     return jsonify({'result': result})
 
 
@@ -374,6 +390,12 @@ def personality_api():
         except (TypeError, ValueError):
             pass
         user.context_chars = max(100, min(1000, user.context_chars))
+    if 'semantic_weight' in data:
+        try:
+            user.semantic_weight = float(data['semantic_weight'])
+        except (TypeError, ValueError):
+            pass
+        user.semantic_weight = max(0.0, min(1.0, user.semantic_weight))
     memory.save_user(user)
     return jsonify(user.to_dict())
 
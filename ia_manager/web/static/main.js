@@ -31,7 +31,7 @@ async function loadAllTasks() {
 }
 
 async function loadProjects() {
-    const res = await fetch('/api/projects');
+    const res = await fetch('/api/projects?summary=1');
     const projects = await res.json();
     const list = document.getElementById('project-list');
     list.innerHTML = '';
@@ -311,9 +311,9 @@ async function loadDeadlines() {
 }
 
 async function fetchRecommendation() {
-    const res = await fetch('/api/recommendations');
+    const res = await fetch('/api/recommendations?k=1');
     const recs = await res.json();
-    return recs.length ? recs[0] : 'No suggestions';
+    return recs.length ? `${recs[0].project} - ${recs[0].task}` : 'No suggestions';
 }
 
 async function loadDashboard() {
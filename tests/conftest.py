@@ -0,0 +1,98 @@
+"""Shared fixtures: every test runs against a fresh data directory.
+
+``storage.DATA_DIR`` is fixed when the module is imported, so the directory
+is chosen here, before ``ia_manager`` is imported, and emptied between tests.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ["IA_MANAGER_DATA"] = tempfile.mkdtemp(prefix="ia_manager_tests_")
+os.environ.pop("IA_MANAGER_STORAGE", None)
+
+import pytest  # noqa: E402
+
+from ia_manager.models.project import Project  # noqa: E402
+from ia_manager.models.task import Task  # noqa: E402
+from ia_manager.services import storage  # noqa: E402
+
+# storage settings of each mode the project repositories support
+MODES = {
+    "pretty": {},
+    "compact": {"format": "compact"},
+    "binary": {"format": "binary"},
+    "journal": {"journal": True},
+    "lazy": {"lazy": True},
+    "sharded": {"layout": "sharded"},
+    "sqlite": {"backend": "sqlite"},
+}
+
+
+def configure(**settings):
+    storage.save_config({"availability": {}, "storage": {"backend": "json", **settings}})
+
+
+def make_projects(count: int = 4, tasks: int = 5) -> list:
+    projects = []
+    tid = 0
+    for pid in range(1, count + 1):
+        p = Project(id=pid, name=f"project {pid}", priority=pid % 3 + 1, deadline=f"2025-07-{pid:02d}")
+        for n in range(tasks):
+            tid += 1
+            p.add_task(Task(
+                id=tid,
+                name=f"task {tid}",
+                importance=tid % 5 + 1,
+                deadline=f"2025-06-{tid % 28 + 1:02d}",
+                status="done" if tid % 7 == 0 else "todo",
+                planned_start=f"2025-06-{tid % 28 + 1:02d}T{9 + tid % 8:02d}:00" if tid % 3 else None,
+                planned_hours=1 + tid % 3,
+            ))
+        projects.append(p)
+    return projects
+
+
+def other_process(code: str) -> str:
+    """Run ``code`` in a new interpreter on the same data directory and return its output."""
+    result = subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(code)],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": str(ROOT)},
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip()
+
+
+@pytest.fixture(autouse=True)
+def data_dir():
+    """An empty data directory and no cached repositories."""
+    storage._repositories.clear()
+    for path in storage.DATA_DIR.iterdir():
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+    storage.DOCS_DIR.mkdir(exist_ok=True)
+    configure()
+    yield storage.DATA_DIR
+    storage._repositories.clear()
+
+
+@pytest.fixture(params=list(MODES))
+def mode(request) -> str:
+    """Each storage mode in turn, configured, with projects from ``make_projects`` saved."""
+    configure(**MODES[request.param])
+    storage.save_projects(make_projects())
+    return request.param
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(storage.DATA_DIR, ignore_errors=True)
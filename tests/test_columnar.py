@@ -0,0 +1,65 @@
+from datetime import date, datetime
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from conftest import configure, make_projects, other_process  # noqa: E402
+from ia_manager.services import columnar, storage  # noqa: E402
+
+
+def _ids(pairs) -> list:
+    return sorted(t.id for _p, t in pairs)
+
+
+def test_matches_storage_scan():
+    projects = make_projects()
+    project = projects[0]
+    project.tasks[0].planned_start = "2025-06-10T23:30+02:00"
+    project.tasks[1].deadline = "not a date"
+    storage.save_projects(projects)
+    table = columnar.task_table()
+    for start, end in [(date(2025, 6, 1), date(2025, 7, 1)), (date(2025, 6, 10), date(2025, 6, 11))]:
+        for include_done in (True, False):
+            assert _ids(table.scheduled_between(start, end, include_done)) == _ids(
+                storage.scheduled_between(start, end, include_done)
+            )
+    # an offset keeps its wall-clock time instead of moving to UTC
+    assert 1 in _ids(table.scheduled_between(date(2025, 6, 10), date(2025, 6, 11)))
+    view = storage.view_projects()
+    expected = sum(1 for p in view for t in p.tasks if t.status != "done" and t.deadline_at and t.deadline_at < datetime(2025, 6, 15))
+    assert table.overdue_count(datetime(2025, 6, 15)) == expected
+    assert table.time_spent_by_project() == {p.id: p.counters.time_spent for p in view}
+
+
+def test_table_follows_saves():
+    storage.save_projects(make_projects())
+    table = columnar.task_table()
+    assert columnar.task_table() is table
+    with storage.transaction() as projects:
+        projects.find_task(3)[1].planned_start = "2025-08-01T09:00"
+    assert 3 in _ids(columnar.scheduled_between(date(2025, 8, 1), date(2025, 8, 2)))
+
+
+@pytest.mark.parametrize("setting", [{}, {"journal": True}, {"layout": "sharded"}])
+def test_table_sees_changes_from_another_process(setting):
+    configure(**setting)
+    storage.save_projects(make_projects())
+    august = (date(2025, 8, 1), date(2025, 8, 2))
+    assert columnar.scheduled_between(*august) == []
+    other_process("""
+        from ia_manager.services import storage
+        with storage.transaction() as projects:
+            projects.find_task(5)[1].planned_start = "2025-08-01T10:00"
+    """)
+    assert _ids(columnar.scheduled_between(*august)) == [5]
+
+
+def test_not_used_in_lazy_mode_or_sessions():
+    configure(lazy=True)
+    assert columnar.task_table() is None
+    configure()
+    storage.save_projects(make_projects())
+    with storage.session():
+        assert columnar.task_table() is None
+    assert columnar.task_table() is not None
@@ -0,0 +1,34 @@
+from ia_manager.services.history_store import HistoryStore
+
+
+def test_segments_and_lookup(tmp_path):
+    store = HistoryStore(tmp_path, segment_bytes=100, tail_size=3)
+    items = [{"role": "user", "content": f"message {i}"} for i in range(20)]
+    assert [store.append(item) for item in items] == list(range(20))
+    assert len(list(tmp_path.glob("*.jsonl"))) > 2
+    reader = HistoryStore(tmp_path, segment_bytes=100, tail_size=3)
+    assert reader.load() == items
+    assert reader.tail(5) == items[-5:]
+    assert reader.get([0, 7, 19, 20]) == {0: items[0], 7: items[7], 19: items[19]}
+
+
+def test_append_after_a_torn_line(tmp_path):
+    store = HistoryStore(tmp_path)
+    store.append({"content": "first"})
+    segment = next(tmp_path.glob("*.jsonl"))
+    with open(segment, "ab") as f:
+        f.write(b'{"content": "cut sho')
+    fresh = HistoryStore(tmp_path)
+    assert fresh.append({"content": "second"}) == 1
+    assert HistoryStore(tmp_path).load() == [{"content": "first"}, {"content": "second"}]
+
+
+def test_lines_that_do_not_decode_are_skipped(tmp_path):
+    store = HistoryStore(tmp_path)
+    store.append({"content": "first"})
+    with open(next(tmp_path.glob("*.jsonl")), "ab") as f:
+        f.write(b"garbage\n[1, 2]\n")
+    assert store.append({"content": "second"}) == 1
+    reader = HistoryStore(tmp_path)
+    assert reader.load() == [{"content": "first"}, {"content": "second"}]
+    assert reader.get([1]) == {1: {"content": "second"}}
@@ -0,0 +1,149 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import make_projects
+from ia_manager.models.project import Project
+from ia_manager.models.task import Task
+from ia_manager.services import planner, storage
+from ia_manager.services.planner import IntervalIndex
+
+ORIGIN = datetime(2025, 6, 2)
+
+
+def _random_task(rng: random.Random, tid: int) -> Task:
+    task = Task(id=tid, name=f"task {tid}", status=rng.choice(["todo", "todo", "todo", "done"]))
+    if rng.random() < 0.8:
+        start = ORIGIN + timedelta(minutes=15 * rng.randrange(400))
+        task.planned_start = start.isoformat(timespec="minutes")
+        if rng.random() < 0.3:
+            task.planned_end = (start + timedelta(minutes=15 * rng.randrange(0, 16))).isoformat(timespec="minutes")
+        else:
+            task.planned_hours = rng.choice([None, 0.5, 1, 2, 3.25])
+    return task
+
+
+def _random_projects(rng: random.Random, count: int = 6) -> list:
+    projects = []
+    tid = 0
+    for pid in range(1, count + 1):
+        p = Project(id=pid, name=f"project {pid}")
+        for _ in range(rng.randrange(12)):
+            tid += 1
+            p.add_task(_random_task(rng, tid))
+        projects.append(p)
+    return projects
+
+
+def _blocks(projects) -> list:
+    return [
+        b for p in projects for t in p.tasks if t.status != "done"
+        for b in [planner.planned_block(p, t)] if b is not None
+    ]
+
+
+def _free_slot(blocks, after: datetime, hours: float) -> datetime:
+    need = timedelta(hours=hours)
+    for start in sorted({after, *(b.end for b in blocks if b.end > after)}):
+        if not any(b.start < start + need and b.end > start for b in blocks):
+            return start
+
+
+def _check(index: IntervalIndex, projects, rng: random.Random):
+    blocks = _blocks(projects)
+    assert sorted(index) == sorted(blocks)
+    assert list(index) == sorted(index, key=planner._block_key)
+    for _ in range(30):
+        start = ORIGIN + timedelta(minutes=15 * rng.randrange(-8, 420))
+        end = start + timedelta(minutes=15 * rng.randrange(0, 24))
+        expected = [b for b in blocks if b.start < end and b.end > start]
+        assert sorted(index.overlaps(start, end)) == sorted(expected)
+        hours = rng.choice([0.25, 0.5, 1, 2, 5, 12])
+        assert index.free_slot(start, hours) == _free_slot(blocks, start, hours)
+    for block in blocks:
+        expected = [
+            b for b in blocks
+            if b.start < block.end and b.end > block.start and b.task_id != block.task_id
+        ]
+        assert sorted(index.conflicts(block)) == sorted(expected)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_interval_index_matches_brute_force(seed, monkeypatch):
+    # small buckets so the queries cross many of them
+    monkeypatch.setattr(planner, "INDEX_BUCKET", 3)
+    rng = random.Random(seed)
+    projects = _random_projects(rng)
+    index = IntervalIndex.from_projects(projects)
+    _check(index, projects, rng)
+    next_id = sum(len(p.tasks) for p in projects) + 1
+    for _ in range(15):
+        before, after = {}, {}
+        for p in rng.sample(projects, rng.randrange(1, 3)):
+            before[p.id] = p
+            new = p.copy()
+            for t in list(new.tasks):
+                action = rng.random()
+                if action < 0.3:
+                    new.remove_task(t)
+                elif action < 0.6:
+                    new.tasks[new.tasks.index(t)] = _random_task(rng, t.id)
+            for _ in range(rng.randrange(3)):
+                new.add_task(_random_task(rng, next_id))
+                next_id += 1
+            after[p.id] = new
+        if rng.random() < 0.1:
+            gone = rng.choice(projects)
+            before[gone.id] = gone
+            after.pop(gone.id, None)
+        projects = [after.get(p.id, p) for p in projects if p.id in after or p.id not in before]
+        previous = sorted(index)
+        updated = index.updated(before, after)
+        # the index the update started from is left as it was
+        assert sorted(index) == previous
+        index = updated
+        _check(index, projects, rng)
+        assert sorted(index) == sorted(IntervalIndex.from_projects(projects))
+
+
+def test_free_slot_on_empty_index():
+    assert IntervalIndex().free_slot(ORIGIN, 3) == ORIGIN
+    assert IntervalIndex().overlaps(ORIGIN, ORIGIN + timedelta(hours=1)) == []
+
+
+def _fresh() -> list:
+    return sorted(IntervalIndex.from_projects(storage.view_projects()))
+
+
+def test_schedule_index_follows_saves():
+    storage.save_projects(make_projects())
+    index = planner.schedule_index()
+    assert planner.schedule_index() is index
+    with storage.transaction() as projects:
+        project, task = projects.find_task(4)
+        task.planned_start = "2025-06-20T08:00"
+        project, task = projects.find_task(5)
+        project.update_task(task, status="done")
+    assert sorted(planner.schedule_index()) == _fresh()
+    assert planner.schedule_index() is not index
+
+
+def test_schedule_index_inside_a_session():
+    storage.save_projects(make_projects())
+    planner.schedule_index()
+    with storage.session():
+        with storage.transaction() as projects:
+            projects.find_task(1)[1].planned_start = "2025-06-21T10:00"
+        assert sorted(planner.schedule_index()) == _fresh()
+        with storage.transaction() as projects:
+            # the project copied above changes again, in place
+            projects.find_task(2)[1].planned_start = "2025-06-21T10:30"
+            projects.remove_project(projects.find_project(3))
+        assert sorted(planner.schedule_index()) == _fresh()
+        with pytest.raises(KeyError):
+            with storage.transaction() as projects:
+                projects.find_task(2)[1].planned_start = None
+                raise KeyError
+        assert sorted(planner.schedule_index()) == _fresh()
+    assert sorted(planner.schedule_index()) == _fresh()
@@ -0,0 +1,103 @@
+import json
+import random
+
+import pytest
+
+from conftest import make_projects, other_process
+from ia_manager.models.task import Task
+from ia_manager.services import planner, recommendations, storage
+
+
+@pytest.fixture(autouse=True)
+def queue():
+    """The module's queue, emptied: the data directory of the previous test is gone."""
+    recommendations._queue.__init__()
+    return recommendations._queue
+
+
+def _expected(k: int) -> list:
+    return planner.suggest_tasks(storage.view_projects(), k)
+
+
+def _mutate(rng: random.Random, projects: storage.ProjectList):
+    project, task = projects.find_task(rng.choice([t.id for p in projects for t in p.tasks]))
+    action = rng.randrange(6)
+    if action == 0:
+        project.update_task(task, status=rng.choice(["todo", "in_progress", "done"]))
+    elif action == 1:
+        task.planned_start = rng.choice([None, f"2025-06-{rng.randrange(1, 29):02d}T{rng.randrange(8, 18):02d}:00"])
+    elif action == 2:
+        # equal scores across projects leave the order to the ids
+        task.importance = rng.randrange(1, 6)
+    elif action == 3:
+        project.priority = rng.randrange(1, 4)
+    elif action == 4:
+        projects.add_task(project, Task(id=projects.next_task_id(), name="new", importance=rng.randrange(1, 6)))
+    else:
+        projects.remove_task(task.id)
+
+
+def test_queue_matches_suggest_tasks(mode, queue):
+    rng = random.Random(mode)
+    assert recommendations.recommend(5) == _expected(5)
+    for _ in range(40):
+        with storage.transaction() as projects:
+            for _ in range(rng.randrange(1, 4)):
+                _mutate(rng, projects)
+        k = rng.choice([1, 5, 20, 200])
+        assert recommendations.recommend(k) == _expected(k)
+        assert queue.complete
+
+
+def test_saves_do_not_write_the_head(queue):
+    storage.save_projects(make_projects())
+    recommendations.recommend(5)
+    head = recommendations.HEAD_FILE.read_bytes()
+    with storage.transaction() as projects:
+        projects.find_task(1)[1].importance = 5
+    assert recommendations.HEAD_FILE.read_bytes() == head
+    assert recommendations.recommend(5) == _expected(5)
+    assert recommendations.HEAD_FILE.read_bytes() != head
+
+
+def test_new_process_answers_from_the_head(mode):
+    storage.save_projects(make_projects(20, 5))
+    recommendations.recommend(3)
+    expected = [s.to_dict() for s in _expected(3)]
+    found = other_process("""
+        import json
+        from ia_manager.services import recommendations
+        top = recommendations.recommend(3)
+        # answered from the saved head, without ranking every task
+        assert not recommendations._queue.complete
+        print(json.dumps([s.to_dict() for s in top]))
+    """)
+    assert json.loads(found) == expected
+
+
+def test_head_only_queue_follows_saves(queue):
+    storage.save_projects(make_projects(40, 5))
+    recommendations.recommend(5)
+    # a queue holding only the saved head, as in a new process
+    queue.__init__()
+    assert queue._read() and not queue.complete
+    queue.version = storage.data_version()
+    rng = random.Random(0)
+    for _ in range(30):
+        with storage.transaction() as projects:
+            _mutate(rng, projects)
+        assert queue.top(5) == _expected(5)
+
+
+def test_changes_from_another_process():
+    storage.save_projects(make_projects())
+    recommendations.recommend(5)
+    other_process("""
+        from ia_manager.services import storage
+        with storage.transaction() as projects:
+            project, task = projects.find_task(2)
+            project.update_task(task, status="done")
+            projects.find_task(4)[1].planned_start = "2025-05-01T08:00"
+    """)
+    assert recommendations.recommend(5) == _expected(5)
+    assert recommendations.recommend(5)[0].task_id == 4
@@ -0,0 +1,30 @@
+import pytest
+
+from ia_manager.services import scenarios
+
+
+def test_from_list():
+    found = scenarios.from_list([
+        {"name": "later", "shift_deadlines": {"1": 14}},
+        {"name": "weekends", "availability": {"Saturday": ["10:00-16:00"]}, "hours_per_day": 4},
+    ])
+    assert [s.name for s in found] == ["later", "weekends"]
+    assert found[0].shift_deadlines == {"1": 14}
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"name": "later"}, "Expected a list of scenarios, not an object"),
+    (["later"], "A scenario must be an object, not a string"),
+    ([{"shift_deadlines": {}}], "A scenario needs a name"),
+    ([{"name": "x", "hours": 4}], "Scenario x: unknown settings: hours"),
+    ([{"name": "x", "shift_deadlines": [1]}], "Scenario x: shift_deadlines must be an object of day counts"),
+    ([{"name": "x", "shift_deadlines": {"1": "2"}}], "Scenario x: shift_deadlines must be an object of day counts"),
+    ([{"name": "x", "hours_per_day": "4"}], "Scenario x: hours_per_day must be a number of hours"),
+    ([{"name": "x", "hours_per_day": True}], "Scenario x: hours_per_day must be a number of hours"),
+    ([{"name": "x", "availability": {"Monday": "09:00-12:00"}}], "Scenario x: availability must be"),
+    ([{"name": "x", "availability": {"Monday": ["9h-12h"]}}], "Scenario x: "),
+    ([{"name": "x", "drop_tasks": [1, "2"]}], "Scenario x: drop_tasks must be a list of task ids"),
+])
+def test_bad_scenarios(data, message):
+    with pytest.raises(ValueError, match="^" + message.replace("(", r"\(")):
+        scenarios.from_list(data)
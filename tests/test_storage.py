@@ -0,0 +1,191 @@
+import io
+import json
+import random
+import threading
+
+import pytest
+
+from conftest import configure, make_projects, other_process
+from ia_manager.models.task import Task
+from ia_manager.services import storage
+from ia_manager.services.storage import iter_json_array
+
+
+def _dump(projects) -> list:
+    return [p.to_dict() for p in projects]
+
+
+def test_round_trip(mode):
+    expected = _dump(make_projects())
+    assert _dump(storage.view_projects()) == expected
+    storage.get_repository().invalidate()
+    assert _dump(storage.load_projects()) == expected
+
+
+def test_transaction_saves_changes(mode):
+    with storage.transaction() as projects:
+        project, task = projects.find_task(3)
+        project.update_task(task, status="done", time_spent=120)
+        projects.add_task(project, Task(id=projects.next_task_id(), name="added"))
+        projects.rename_project(projects.find_project(2), "renamed")
+    storage.get_repository().invalidate()
+    projects = storage.view_projects()
+    project, task = projects.find_task(3)
+    assert (task.status, task.time_spent) == ("done", 120)
+    assert project.tasks[-1].name == "added"
+    assert project.counters.total == len(project.tasks)
+    assert projects.find_project(2).name == "renamed"
+
+
+def test_failed_transaction_changes_nothing(mode):
+    with pytest.raises(KeyError):
+        with storage.transaction() as projects:
+            project, task = projects.find_task(1)
+            task.name = "lost"
+            raise KeyError
+    assert storage.view_projects().find_task(1)[1].name == "task 1"
+
+
+def test_transaction_copies_only_edited_projects():
+    storage.save_projects(make_projects())
+    cached = storage.view_projects()
+    with storage.transaction() as projects:
+        projects.find_task(7)[1].name = "edited"
+    view = storage.view_projects()
+    assert view.find_task(7)[1].name == "edited"
+    assert cached.find_task(7)[1].name == "task 7"
+    # the projects that were not edited are shared with the previous cache
+    assert [p is c for p, c in zip(view, cached)] == [True, False, True, True]
+
+
+def test_journal_replay_and_compaction():
+    configure(journal=True)
+    storage.save_projects(make_projects())
+    repo = storage.get_repository()
+    snapshot = storage.PROJECTS_FILE.read_bytes()
+    for tid in range(1, 6):
+        with storage.transaction() as projects:
+            project, task = projects.find_task(tid)
+            project.update_task(task, time_spent=tid * 10)
+    assert storage.PROJECTS_FILE.read_bytes() == snapshot
+    assert len(storage.JOURNAL_FILE.read_text().splitlines()) == 5
+
+    expected = _dump(storage.view_projects())
+    repo.invalidate()
+    assert _dump(storage.view_projects()) == expected
+
+    repo.compact()
+    assert not storage.JOURNAL_FILE.exists()
+    repo.invalidate()
+    assert _dump(storage.view_projects()) == expected
+
+
+def test_journal_compacts_in_background():
+    configure(journal=True, journal_max_bytes=200)
+    storage.save_projects(make_projects())
+    with storage.transaction() as projects:
+        for tid in range(1, 10):
+            projects.find_task(tid)[1].name = f"renamed {tid}"
+    repo = storage.get_repository()
+    repo._compactor.join()
+    assert not storage.JOURNAL_FILE.exists()
+    repo.invalidate()
+    assert [t.name for t in storage.view_projects()[0].tasks] == [f"renamed {tid}" for tid in range(1, 6)]
+
+
+def test_sees_changes_from_another_process(mode):
+    projects = storage.view_projects()
+    assert projects.find_task(2)[1].name == "task 2"
+    other_process("""
+        from ia_manager.services import storage
+        with storage.transaction() as projects:
+            projects.find_task(2)[1].name = "from elsewhere"
+            projects.remove_project(projects.find_project(4))
+    """)
+    projects = storage.view_projects()
+    assert projects.find_task(2)[1].name == "from elsewhere"
+    assert [p.id for p in projects] == [1, 2, 3]
+
+
+def test_lazy_tasks_read_after_another_process_saved():
+    configure(lazy=True)
+    storage.save_projects(make_projects())
+    storage.get_repository().invalidate()
+    view = storage.view_projects()
+    assert not any(p.loaded for p in view)
+    other_process("""
+        from ia_manager.models.task import Task
+        from ia_manager.services import storage
+        with storage.transaction() as projects:
+            project = projects.find_project(2)
+            projects.rename_project(project, "a much longer name than before")
+            projects.add_task(project, Task(id=projects.next_task_id(), name="added elsewhere"))
+            projects.remove_project(projects.find_project(1))
+    """)
+    assert view[0].tasks == []
+    assert view[1].tasks[-1].name == "added elsewhere"
+    assert [t.name for t in view[2].tasks] == [f"task {tid}" for tid in range(11, 16)]
+
+
+def test_concurrent_writers_do_not_lose_updates():
+    storage.save_projects(make_projects(1, 1))
+    code = """
+        from ia_manager.services import storage
+        for _ in range(20):
+            with storage.transaction() as projects:
+                project, task = projects.find_task(1)
+                project.update_task(task, time_spent=task.time_spent + 1)
+    """
+    workers = [threading.Thread(target=other_process, args=(code,)) for _ in range(3)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert storage.view_projects().find_task(1)[1].time_spent == 60
+
+
+def test_session_writes_once_and_keeps_earlier_steps():
+    storage.save_projects(make_projects())
+    version = storage.data_version()
+    with storage.session():
+        with storage.transaction() as projects:
+            projects.find_task(1)[1].name = "first step"
+        with pytest.raises(KeyError):
+            with storage.transaction() as projects:
+                projects.find_task(2)[1].name = "failed step"
+                raise KeyError
+        assert storage.view_projects().find_task(2)[1].name == "task 2"
+        assert storage.data_version() == version
+    projects = storage.view_projects()
+    assert projects.find_task(1)[1].name == "first step"
+    assert projects.find_task(2)[1].name == "task 2"
+
+
+def test_failed_session_discards_everything():
+    storage.save_projects(make_projects())
+    with pytest.raises(KeyError):
+        with storage.session():
+            with storage.transaction() as projects:
+                projects.find_task(1)[1].name = "lost"
+            raise KeyError
+    assert storage.view_projects().find_task(1)[1].name == "task 1"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_iter_json_array_splits_on_elements(chunk_size):
+    rng = random.Random(chunk_size)
+    values = [12345, 678, -1.5e-7, True, None, "é" * 3, {"tasks": [1, 2]}, [], 10 ** 20]
+    for _ in range(20):
+        rng.shuffle(values)
+        raw = json.dumps(values, indent=rng.choice([None, 1])).encode("utf-8")
+        found = list(iter_json_array(io.BytesIO(raw), chunk_size))
+        assert [v for _offset, _length, v in found] == values
+        for offset, length, value in found:
+            assert json.loads(raw[offset:offset + length]) == value
+
+
+def test_iter_json_array_rejects_other_values():
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.BytesIO(b'{"a": 1}')))
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.BytesIO(b"[1, 2"), 2))